@@ -1,11 +1,23 @@
 import os
+import startup
+
+# Chronométrage des imports (STARTUP_REPORT=1) : à activer avant les imports de l'application
+startup.install_import_timer()
 from ui import build_ui
+from metrics import start_metrics_server
 
 if __name__ == "__main__":
     # Lecture de l'option de partage public Gradio via variable d'env
     share_env = os.getenv("GRADIO_SHARE", "False").lower()
     share = share_env in ("1", "true", "yes")
 
+    startup.mark("imports")
+
+    # Endpoint Prometheus (/metrics), désactivé avec METRICS_PORT=0
+    start_metrics_server()
+
     # Construire et lancer l'application
     app = build_ui()
+    startup.mark("interface")
+    startup.report()
     app.launch(server_port=7860, share=share)
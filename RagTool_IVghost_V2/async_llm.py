@@ -0,0 +1,333 @@
+# async_llm.py
+
+import time
+import asyncio
+import threading
+import contextvars
+from collections import deque
+from contextlib import asynccontextmanager
+from concurrent.futures import TimeoutError as FutureTimeout
+import httpx
+import http_client
+import ollama_pool
+import metrics
+from logging_utils import log, current_cancel
+import response_cache as rcache
+from llm_client import (
+    _build_request, _parse_response, _build_vision_request, _parse_vision_response, _cache_key, observe_call,
+    _stream_line, _empty_response_message,
+)
+
+_loop = None
+_loop_lock = threading.Lock()
+_client = None
+_CANCELLED = object()
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    """Boucle asyncio unique du serveur, exécutée dans un thread dédié."""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="async-llm", daemon=True).start()
+        return _loop
+
+
+async def _in_context(context: contextvars.Context, coro):
+    """Exécute coro avec les variables de contexte de l'appelant (span parent, jeton d'annulation)."""
+    for var, value in context.items():
+        var.set(value)
+    return await coro
+
+
+def submit(coro):
+    """Planifie une coroutine sur la boucle partagée et retourne un concurrent.futures.Future."""
+    return asyncio.run_coroutine_threadsafe(_in_context(contextvars.copy_context(), coro), get_loop())
+
+
+async def run(coro):
+    """Attend une coroutine exécutée sur la boucle partagée, depuis n'importe quelle autre boucle."""
+    return await asyncio.wrap_future(submit(coro))
+
+
+def _get_client() -> httpx.AsyncClient:
+    """Client HTTP asynchrone partagé (pool de connexions keep-alive), créé dans la boucle."""
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=256, max_keepalive_connections=32),
+            transport=httpx.AsyncHTTPTransport(retries=http_client.MAX_RETRIES),
+        )
+    return _client
+
+
+async def _post(url: str, provider: str, limit_key: str = None, **kwargs) -> httpx.Response:
+    """
+    POST asynchrone avec limitation de débit et backoff sur 429/5xx ; le plafond de requêtes
+    en vol est celui d'http_client (commun aux appels synchrones et asynchrones).
+    """
+    connect, read = http_client.PROVIDER_TIMEOUTS.get(provider, http_client.DEFAULT_TIMEOUT)
+    kwargs.setdefault("timeout", httpx.Timeout(read, connect=connect))
+    bucket = http_client.buckets.get(provider)
+    queued = time.time()
+    async with http_client.limiter(provider, limit_key):
+        for attempt in range(http_client.MAX_RETRIES + 1):
+            while bucket is not None:
+                wait = bucket.try_acquire()
+                if not wait:
+                    break
+                await asyncio.sleep(wait)
+            if not attempt:
+                metrics.observe_queue_wait(provider, time.time() - queued)
+            response = await _get_client().post(url, **kwargs)
+            if response.status_code not in http_client.RETRY_STATUSES or attempt == http_client.MAX_RETRIES:
+                return response
+            retry_after = response.headers.get("Retry-After", "")
+            delay = float(retry_after) if retry_after.isdigit() else http_client.BACKOFF_FACTOR * 2 ** attempt
+            log(f"⚠️ {provider} : statut {response.status_code}, nouvel essai dans {delay:.1f}s.")
+            await asyncio.sleep(delay)
+    return response
+
+
+async def _route_post(url: str, provider: str, model: str = None, **kwargs) -> httpx.Response:
+    """_post avec répartition entre serveurs Ollama et bascule sur erreur réseau."""
+    if provider != ollama_pool.OLLAMA_PROVIDER:
+        return await _post(url, provider, **kwargs)
+    pool = ollama_pool.pool
+    last_error = None
+    for endpoint in pool.candidates(model):
+        with pool.track(endpoint, model):
+            try:
+                return await _post(endpoint.url_for(url), provider, limit_key=endpoint.base_url, **kwargs)
+            except (httpx.ConnectError, httpx.ConnectTimeout) as e:
+                pool.mark_down(endpoint, e)
+                last_error = e
+    raise last_error or RuntimeError("Aucun serveur Ollama configuré")
+
+
+@asynccontextmanager
+async def _open_stream(url: str, provider: str, limit_key: str = None, **kwargs):
+    """
+    Requête asynchrone en streaming : la place dans le plafond de requêtes en vol est tenue
+    jusqu'à la fin de la lecture. Annuler la tâche ferme la connexion (le serveur arrête).
+    """
+    connect, read = http_client.PROVIDER_TIMEOUTS.get(provider, http_client.DEFAULT_TIMEOUT)
+    kwargs.setdefault("timeout", httpx.Timeout(read, connect=connect))
+    bucket = http_client.buckets.get(provider)
+    queued = time.time()
+    async with http_client.limiter(provider, limit_key):
+        while bucket is not None:
+            wait = bucket.try_acquire()
+            if not wait:
+                break
+            await asyncio.sleep(wait)
+        metrics.observe_queue_wait(provider, time.time() - queued)
+        async with _get_client().stream("POST", url, **kwargs) as response:
+            yield response
+
+
+@asynccontextmanager
+async def _route_stream(url: str, provider: str, model: str = None, **kwargs):
+    """_open_stream avec répartition entre serveurs Ollama (bascule possible avant la réponse)."""
+    if provider != ollama_pool.OLLAMA_PROVIDER:
+        async with _open_stream(url, provider, **kwargs) as response:
+            yield response
+        return
+    pool = ollama_pool.pool
+    last_error = None
+    for endpoint in pool.candidates(model):
+        with pool.track(endpoint, model):
+            ctx = _open_stream(endpoint.url_for(url), provider, limit_key=endpoint.base_url, **kwargs)
+            try:
+                response = await ctx.__aenter__()
+            except (httpx.ConnectError, httpx.ConnectTimeout) as e:
+                pool.mark_down(endpoint, e)
+                last_error = e
+                continue
+            try:
+                yield response
+            finally:
+                await ctx.__aexit__(None, None, None)
+            return
+    raise last_error or RuntimeError("Aucun serveur Ollama configuré")
+
+
+async def aquery_llm(prompt: str, model: str, provider: str, api_key: str, use_cache: bool = True) -> str:
+    """Version asynchrone de llm_client.query_llm (à exécuter sur la boucle partagée)."""
+    log(f"[{time.strftime('%H:%M:%S')}] 🔄 Envoi asynchrone du prompt au LLM ({provider})...")
+    request = _build_request(prompt, model, provider, api_key)
+    if request is None:
+        return "❌ Fournisseur IA non pris en charge."
+    url, payload, headers = request
+
+    cache_key = _cache_key(provider, url, payload, use_cache)
+    if cache_key:
+        cached = await asyncio.to_thread(rcache.response_cache.get, cache_key)
+        if cached is not None:
+            log("📦 Réponse LLM servie depuis le cache.")
+            return cached
+
+    with metrics.span("llm", provider=provider, model=model, mode="async"):
+        start_time = time.time()
+        try:
+            response = await _route_post(url, provider, model, json=payload, headers=headers)
+        except Exception as e:
+            log(f"❌ Exception lors de l’appel LLM : {e}")
+            observe_call(provider, model, prompt, "", status="error")
+            return f"❌ Erreur lors de l'interrogation de l'IA : {e}"
+
+        if response.status_code != 200:
+            try:
+                err = response.json()
+            except ValueError:
+                err = response.text
+            log(f"❌ Erreur API {provider} : {response.status_code} - {err}")
+            observe_call(provider, model, prompt, "", status=f"http_{response.status_code}")
+            return f"❌ Erreur API ({response.status_code}) : {err}"
+
+        data = response.json()
+        result = _parse_response(data, provider)
+        duration = time.time() - start_time
+        observe_call(provider, model, prompt, result, data, ttft=duration, elapsed=duration)
+    if cache_key and rcache.is_cacheable(result):
+        await asyncio.to_thread(rcache.response_cache.put, cache_key, result)
+    return result
+
+
+async def aquery_llm_stream(prompt: str, model: str, provider: str, api_key: str, use_cache: bool = True):
+    """
+    Version asynchrone de llm_client.query_llm_stream (générateur asynchrone, à exécuter sur
+    la boucle partagée). Annuler la tâche qui le consomme ferme la connexion, y compris
+    avant le premier token ou pendant l'attente d'une place chez le fournisseur.
+    """
+    log(f"[{time.strftime('%H:%M:%S')}] 🔄 Envoi asynchrone du prompt au LLM en streaming ({provider})...")
+    start_time = time.time()
+    request = _build_request(prompt, model, provider, api_key, stream=True)
+    if request is None:
+        yield "❌ Fournisseur IA non pris en charge."
+        return
+    url, payload, headers = request
+
+    cache_key = _cache_key(provider, url, payload, use_cache)
+    if cache_key:
+        cached = await asyncio.to_thread(rcache.response_cache.get, cache_key)
+        if cached is not None:
+            log("📦 Réponse LLM servie depuis le cache.")
+            yield cached
+            return
+
+    first_token = None
+    pieces = []
+    usage = {}
+    call = metrics.Span("llm", provider=provider, model=model, mode="async-stream")
+    status = "ok"
+    try:
+        async with _route_stream(url, provider, model, json=payload, headers=headers) as response:
+            if response.status_code != 200:
+                err = (await response.aread()).decode("utf-8", "replace")
+                log(f"❌ Erreur API {provider} : {response.status_code} - {err}")
+                status = f"http_{response.status_code}"
+                yield f"❌ Erreur API ({response.status_code}) : {err}"
+                return
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                piece, done = _stream_line(line, provider, usage)
+                if piece:
+                    if first_token is None:
+                        first_token = time.time() - start_time
+                        log(f"⚡ Premier token reçu en {first_token:.2f}s.")
+                    pieces.append(piece)
+                    yield piece
+                if done:
+                    break
+    except Exception as e:
+        log(f"❌ Exception lors de l’appel LLM (streaming) : {e}")
+        status = "error"
+        yield f"❌ Erreur lors de l'interrogation de l'IA : {e}"
+        return
+    except (asyncio.CancelledError, GeneratorExit):
+        status = "cancelled"  # tâche annulée ou génération abandonnée par le consommateur
+        raise
+    finally:
+        observe_call(provider, model, prompt, "".join(pieces), usage, first_token,
+                     time.time() - start_time, status, call)
+        call.end(status)
+
+    result = "".join(pieces).strip()
+    if not result:
+        log("⚠️ Réponse vide du LLM (streaming).")
+        yield _empty_response_message(provider)
+        return
+    if cache_key and rcache.is_cacheable(result):
+        await asyncio.to_thread(rcache.response_cache.put, cache_key, result)
+
+
+async def aquery_llm_vision(prompt: str, file_bytes: bytes, model: str, provider: str, api_key: str) -> str:
+    """Version asynchrone de llm_client.query_llm_vision."""
+    log(f"[{time.strftime('%H:%M:%S')}] 🧠 Envoi asynchrone d'une image vers un modèle Vision ({provider})...")
+    try:
+        request = _build_vision_request(prompt, file_bytes, model, provider, api_key)
+        if request is None:
+            return "❌ Fournisseur vision non pris en charge."
+        url, kwargs = request
+        with metrics.span("vision", provider=provider, model=model):
+            response = await _route_post(url, provider, model, **kwargs)
+        if response.status_code != 200:
+            log(f"❌ Erreur Vision API {provider} : {response.status_code} - {response.text}")
+            return f"❌ Erreur Vision API ({response.status_code}) : {response.text}"
+        return _parse_vision_response(response.json())
+    except Exception as e:
+        log(f"❌ Exception Vision : {e}")
+        return f"❌ Erreur lors de l'appel au modèle vision : {e}"
+
+
+def _wait_result(future, cancel):
+    """
+    Résultat de `future` en surveillant `cancel` : si le jeton est levé pendant l'attente,
+    la coroutine est annulée (requête HTTP en cours abandonnée) et _CANCELLED est retourné.
+    """
+    while True:
+        try:
+            return future.result(timeout=0.2)
+        except FutureTimeout:
+            if cancel.is_set():
+                future.cancel()
+                return _CANCELLED
+
+
+def map_ordered_async(items, coro_fn, workers: int, cancel=None):
+    """
+    Équivalent de pipeline.map_ordered sans thread par tâche : chaque élément devient une
+    coroutine sur la boucle partagée (au plus `workers` en cours, 2 par worker soumises),
+    résultats dans l'ordre. La concurrence vers chaque backend reste bornée pour tout le serveur.
+    """
+    cancel = cancel or current_cancel()
+    limiter = asyncio.Semaphore(workers)
+
+    async def limited(item):
+        async with limiter:
+            return await coro_fn(item)
+
+    pending = deque()
+    try:
+        for item in items:
+            if cancel.is_set():
+                break
+            pending.append(submit(limited(item)))
+            while pending and (len(pending) >= workers * 2 or pending[0].done()):
+                result = _wait_result(pending[0], cancel)
+                if result is _CANCELLED:
+                    return
+                pending.popleft()
+                yield result
+        while pending and not cancel.is_set():
+            result = _wait_result(pending[0], cancel)
+            if result is _CANCELLED:
+                return
+            pending.popleft()
+            yield result
+    finally:
+        for future in pending:
+            future.cancel()
@@ -0,0 +1,185 @@
+# batch.py
+"""
+Analyse complète d'un dossier de documents, sans interface (traitement de nuit).
+
+    python batch.py contrats/ -o resultats.jsonl --model llama3
+
+Chaque document terminé est ajouté au fichier JSONL (écriture synchronisée sur disque) :
+ce fichier sert de point de reprise, un document déjà traité avec succès (même hash de
+contenu) est ignoré au lancement suivant. Les résumés de chunks étant aussi en cache
+disque, un document interrompu reprend sans rappeler le LLM sur les sections déjà faites.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from file_utils import extract_content
+from utils import iter_chunks
+from doc_cache import file_hash, log_cache_stats
+from chunking import count_tokens
+import budget
+from pipeline import tree_reduce, get_concurrency
+from async_llm import map_ordered_async
+from llm_client import query_llm
+from document import (
+    SUMMARY_CHUNK_SIZE, SUMMARY_ERROR, SUMMARY_INSTRUCTIONS, SUMMARY_OUTPUT_TOKENS,
+    asummarize_chunk, amerge_summaries, _synthesis_prompt,
+)
+from response_cache import log_stats as log_llm_cache_stats
+from logging_utils import log, stop_event
+
+SUPPORTED_EXTENSIONS = (".pdf", ".docx", ".csv", ".xlsx")
+
+
+def find_documents(root: str, extensions=SUPPORTED_EXTENSIONS) -> list:
+    """Liste triée des fichiers pris en charge sous `root` (récursif)."""
+    found = []
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            if name.lower().endswith(extensions):
+                found.append(os.path.join(dirpath, name))
+    return sorted(found)
+
+
+def load_checkpoint(output_path: str) -> set:
+    """Hashs des documents déjà traités avec succès dans un fichier de résultats existant."""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # dernière ligne tronquée par un arrêt brutal
+            if record.get("status") == "ok":
+                done.add(record["hash"])
+    return done
+
+
+def analyze_file(path: str, content_hash: str, provider: str, model: str, api_key: str, workers: int) -> dict:
+    """Extraction → chunks → résumés asynchrones → réduction → synthèse, pour un document."""
+    start = time.time()
+    text = extract_content(path)
+    if not text.strip():
+        raise ValueError("aucun texte extrait")
+    chunks = list(iter_chunks([text], max_tokens=SUMMARY_CHUNK_SIZE))
+
+    summaries = list(map_ordered_async(
+        chunks, lambda chunk: asummarize_chunk(chunk, provider, model, api_key), workers
+    ))
+    if stop_event.is_set():
+        raise InterruptedError("opération annulée")
+    # Une section non résumée fausserait la synthèse : enregistré en erreur, le document
+    # sera retraité en relançant la même commande (point de reprise JSONL)
+    failed = summaries.count(SUMMARY_ERROR)
+    if failed:
+        raise RuntimeError(f"{failed}/{len(summaries)} section(s) non résumée(s)")
+    # Groupes de résumés fusionnés : ce que le contexte du modèle peut recevoir en un appel
+    reduce_tokens = budget.plan_analysis(SUMMARY_INSTRUCTIONS, SUMMARY_OUTPUT_TOKENS, model, provider).chunk_tokens
+    reduced = tree_reduce(
+        summaries, lambda t: amerge_summaries(t, provider, model, api_key),
+        workers, reduce_tokens, mapper=map_ordered_async,
+    )
+    summary = query_llm(_synthesis_prompt("\n\n".join(reduced)), model, provider, api_key)
+    if summary.startswith(("❌", "⚠️")):
+        raise RuntimeError(summary)
+
+    return {
+        "path": path,
+        "hash": content_hash,
+        "status": "ok",
+        "chunks": len(chunks),
+        "input_tokens": count_tokens(text),
+        "output_tokens": sum(count_tokens(s) for s in summaries) + count_tokens(summary),
+        "seconds": round(time.time() - start, 2),
+        "summary": summary,
+    }
+
+
+def run_batch(root: str, output_path: str, provider: str, model: str, api_key: str = "",
+              jobs: int = 2, workers: int = None, extensions=SUPPORTED_EXTENSIONS) -> dict:
+    """
+    Traite tous les documents d'un dossier : `jobs` documents en parallèle, chacun avec au plus
+    `workers` résumés simultanés (plafond global par fournisseur appliqué en plus).
+    Retourne les statistiques du lot.
+    """
+    workers = workers or get_concurrency(provider)
+    done = load_checkpoint(output_path)
+    pending = []
+    for path in find_documents(root, extensions):
+        content_hash = file_hash(path)
+        if content_hash not in done:
+            pending.append((path, content_hash))
+            done.add(content_hash)  # doublons de contenu traités une seule fois
+    log(f"📂 {len(pending)} document(s) à traiter ({len(done) - len(pending)} déjà faits).")
+
+    stats = {"ok": 0, "errors": 0, "input_tokens": 0, "output_tokens": 0}
+    start = time.time()
+    with open(output_path, "a", encoding="utf-8") as out, ThreadPoolExecutor(max_workers=jobs) as pool:
+        futures = {
+            pool.submit(analyze_file, path, h, provider, model, api_key, workers): (path, h)
+            for path, h in pending
+        }
+        try:
+            for future in as_completed(futures):
+                path, content_hash = futures[future]
+                try:
+                    record = future.result()
+                    stats["ok"] += 1
+                    stats["input_tokens"] += record["input_tokens"]
+                    stats["output_tokens"] += record["output_tokens"]
+                    log(f"✅ {path} ({record['chunks']} chunks, {record['seconds']}s)")
+                except Exception as e:
+                    if stop_event.is_set():
+                        continue
+                    record = {"path": path, "hash": content_hash, "status": "error", "error": str(e)}
+                    stats["errors"] += 1
+                    log(f"❌ {path} : {e}")
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+                os.fsync(out.fileno())
+        except KeyboardInterrupt:
+            log("🛑 Interruption : arrêt après les documents en cours...")
+            stop_event.set()
+            for future in futures:
+                future.cancel()
+
+    elapsed = time.time() - start
+    stats["seconds"] = round(elapsed, 2)
+    stats["docs_per_min"] = round(stats["ok"] / elapsed * 60, 2) if elapsed else 0.0
+    stats["tokens_per_sec"] = round((stats["input_tokens"] + stats["output_tokens"]) / elapsed, 1) if elapsed else 0.0
+    log(f"📊 Lot terminé : {stats['ok']} document(s), {stats['errors']} erreur(s) en {stats['seconds']}s — "
+        f"{stats['docs_per_min']} docs/min, {stats['tokens_per_sec']} tokens/s.")
+    log_cache_stats()
+    log_llm_cache_stats()
+    return stats
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Analyse juridique complète d'un dossier de documents.")
+    parser.add_argument("directory", help="dossier à parcourir (récursivement)")
+    parser.add_argument("-o", "--output", default="resultats.jsonl", help="fichier JSONL de résultats (et de reprise)")
+    parser.add_argument("--provider", default="Ollama (local)", help="fournisseur IA")
+    parser.add_argument("--model", required=True, help="nom du modèle")
+    parser.add_argument("--api-key", default=os.getenv("LLM_API_KEY", ""), help="clé API (défaut : $LLM_API_KEY)")
+    parser.add_argument("--jobs", type=int, default=2, help="documents traités en parallèle")
+    parser.add_argument("--workers", type=int, default=None, help="résumés simultanés par document")
+    parser.add_argument("--ext", nargs="+", default=list(SUPPORTED_EXTENSIONS), help="extensions à traiter")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.directory):
+        parser.error(f"dossier introuvable : {args.directory}")
+    stats = run_batch(
+        args.directory, args.output, args.provider, args.model, args.api_key,
+        jobs=args.jobs, workers=args.workers, extensions=tuple(e.lower() for e in args.ext),
+    )
+    return 1 if stats["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,455 @@
+# benchmark.py
+"""
+Banc de performance du pipeline, sans modèle réel.
+
+Un faux serveur LLM local (API Ollama et compatible OpenAI, latence et débit de tokens
+configurables) remplace les modèles, et un corpus synthétique (PDF, DOCX, CSV de tailles
+variées) est généré dans un dossier temporaire. Mesures :
+- extraction PDF (pages/s) et DOCX ;
+- débit de chunk_text ;
+- latence de bout en bout d'analyze_document (question et analyse complète) à plusieurs
+  niveaux de concurrence ;
+- temps de generate_nutrition_plan (tableau puis commentaire).
+
+Les résultats sont écrits en JSON ; --compare affiche l'écart avec un résultat précédent.
+
+Exemple :
+    python benchmark.py -o bench.json --concurrency 1 4 --compare bench_precedent.json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import hashlib
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+from statistics import median
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BENCH_MODEL = "bench-model"
+EMBED_DIM = 64
+
+_WORDS = (
+    "le prestataire client contrat obligation paiement livraison délai résiliation pénalité "
+    "garantie responsabilité confidentialité données personnelles sous-traitance assurance "
+    "force majeure préavis facture montant durée reconduction litige tribunal compétent "
+    "propriété intellectuelle licence maintenance service niveau disponibilité indemnité"
+).split()
+_TITLES = ("Objet", "Durée", "Prix et paiement", "Obligations du prestataire", "Responsabilité",
+           "Confidentialité", "Résiliation", "Force majeure", "Litiges", "Dispositions générales")
+_FOODS = (("Poulet", "viandes"), ("Saumon", "poissons"), ("Riz", "céréales"), ("Lentilles", "légumineuses"),
+          ("Brocoli", "légumes"), ("Pomme", "fruits"), ("Amandes", "oléagineux"), ("Yaourt", "produits laitiers"),
+          ("Tofu", "légumineuses"), ("Pâtes", "céréales"), ("Oeuf", "oeufs"), ("Avocat", "fruits"))
+
+
+# === Faux serveur LLM ===
+class _QuietHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Connexions keep-alive fermées par le client : normal en fin de mesure
+        if not isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            super().handle_error(request, client_address)
+
+
+class StubLLMServer:
+    """
+    Serveur HTTP local imitant Ollama (/api/tags, /api/generate, /api/embed, /api/show) et
+    l'API OpenAI (/v1/chat/completions). Chaque génération attend `ttft` secondes puis émet
+    `response_tokens` tokens à `tokens_per_sec` ; au plus `parallel` générations simultanées,
+    comme OLLAMA_NUM_PARALLEL.
+    """
+
+    def __init__(self, ttft: float = 0.2, tokens_per_sec: float = 200.0, response_tokens: int = 60,
+                 parallel: int = 4, context_tokens: int = 8192, port: int = 0):
+        self.ttft = ttft
+        self.tokens_per_sec = tokens_per_sec
+        self.response_tokens = response_tokens
+        self.context_tokens = context_tokens
+        self.slots = threading.BoundedSemaphore(parallel)
+        self.requests = {}
+        self._lock = threading.Lock()
+        self.httpd = _QuietHTTPServer(("127.0.0.1", port), self._handler())
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def start(self) -> "StubLLMServer":
+        threading.Thread(target=self.httpd.serve_forever, name="stub-llm", daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def _count(self, path: str) -> None:
+        with self._lock:
+            self.requests[path] = self.requests.get(path, 0) + 1
+
+    def _words(self, prompt: str) -> list:
+        """Réponse déterministe (même prompt, même texte) de response_tokens mots."""
+        rng = random.Random(hashlib.sha256(prompt.encode("utf-8")).digest())
+        return [rng.choice(_WORDS) for _ in range(self.response_tokens)]
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _json(self, data: dict, status: int = 200):
+                body = json.dumps(data).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _chunk(self, data: bytes):
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                self.wfile.flush()
+
+            def do_GET(self):
+                server._count(self.path)
+                if self.path == "/api/tags":
+                    return self._json({"models": [{"name": BENCH_MODEL}]})
+                self._json({"error": "not found"}, 404)
+
+            def do_POST(self):
+                server._count(self.path)
+                length = int(self.headers.get("Content-Length") or 0)
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                if self.path == "/api/embed":
+                    return self._json({"embeddings": [server.embed(t) for t in payload.get("input", [])]})
+                if self.path == "/api/show":
+                    return self._json({"model_info": {"general.context_length": server.context_tokens}})
+                if self.path == "/api/generate":
+                    return self._generate(payload.get("prompt", ""), payload.get("stream", False), "ollama")
+                if self.path == "/v1/chat/completions":
+                    prompt = " ".join(m.get("content", "") for m in payload.get("messages", []))
+                    return self._generate(prompt, payload.get("stream", False), "openai")
+                self._json({"error": "not found"}, 404)
+
+            def _generate(self, prompt: str, streaming: bool, flavor: str):
+                words = server._words(prompt)
+                prompt_tokens = max(1, len(prompt) // 4)
+                with server.slots:
+                    time.sleep(server.ttft)
+                    started = time.time()
+                    delay = 1.0 / server.tokens_per_sec
+                    if not streaming:
+                        time.sleep(delay * len(words))
+                        text = " ".join(words)
+                        if flavor == "ollama":
+                            return self._json({
+                                "response": text, "done": True, "prompt_eval_count": prompt_tokens,
+                                "eval_count": len(words), "eval_duration": int((time.time() - started) * 1e9),
+                            })
+                        return self._json({
+                            "choices": [{"message": {"role": "assistant", "content": text}}],
+                            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(words)},
+                        })
+
+                    self.send_response(200)
+                    self.send_header("Transfer-Encoding", "chunked")
+                    self.end_headers()
+                    for word in words:
+                        time.sleep(delay)
+                        piece = word + " "
+                        if flavor == "ollama":
+                            self._chunk((json.dumps({"response": piece, "done": False}) + "\n").encode("utf-8"))
+                        else:
+                            data = {"choices": [{"delta": {"content": piece}}]}
+                            self._chunk(f"data: {json.dumps(data)}\n\n".encode("utf-8"))
+                    if flavor == "ollama":
+                        final = {"response": "", "done": True, "prompt_eval_count": prompt_tokens,
+                                 "eval_count": len(words), "eval_duration": int((time.time() - started) * 1e9)}
+                        self._chunk((json.dumps(final) + "\n").encode("utf-8"))
+                    else:
+                        self._chunk(b"data: [DONE]\n\n")
+                    self.wfile.write(b"0\r\n\r\n")
+
+        return Handler
+
+    @staticmethod
+    def embed(text: str) -> list:
+        """Vecteur déterministe : sac de mots haché (les textes proches restent proches)."""
+        vector = [0.0] * EMBED_DIM
+        for word in text.lower().split():
+            vector[int(hashlib.md5(word.encode("utf-8")).hexdigest(), 16) % EMBED_DIM] += 1.0
+        return vector
+
+
+# === Corpus synthétique ===
+def legal_text(pages: int, seed: int, words_per_page: int = 450) -> list:
+    """Pages de texte contractuel synthétique (articles numérotés)."""
+    rng = random.Random(seed)
+    result, article = [], 1
+    for _ in range(pages):
+        lines, count = [], 0
+        while count < words_per_page:
+            lines.append(f"Article {article} - {rng.choice(_TITLES)}")
+            for _ in range(rng.randint(2, 5)):
+                sentence = " ".join(rng.choice(_WORDS) for _ in range(rng.randint(12, 30)))
+                lines.append(sentence.capitalize() + ".")
+                count += len(sentence.split())
+            article += 1
+        result.append("\n".join(lines))
+    return result
+
+
+def make_pdf(path: str, pages: int, seed: int = 0) -> str:
+    from fpdf import FPDF
+
+    pdf = FPDF()
+    pdf.set_auto_page_break(False)
+    for text in legal_text(pages, seed):
+        pdf.add_page()
+        pdf.set_font("Arial", size=8)
+        pdf.multi_cell(0, 3.5, text.encode("latin-1", "replace").decode("latin-1"))
+    pdf.output(path, "F")
+    return path
+
+
+def make_docx(path: str, pages: int, seed: int = 0) -> str:
+    from docx import Document
+
+    doc = Document()
+    for text in legal_text(pages, seed):
+        for line in text.split("\n"):
+            doc.add_paragraph(line)
+    doc.save(path)
+    return path
+
+
+def make_food_csv(path: str, rows: int, seed: int = 0) -> str:
+    """Table d'aliments au format CIQUAL (séparateur ';', virgule décimale, cp1252)."""
+    rng = random.Random(seed)
+    lines = ["alim_grp_nom_fr;alim_nom_fr;Energie (kcal/100 g);Protéines (g/100 g);"
+             "Glucides (g/100 g);Lipides (g/100 g);Fibres alimentaires (g/100 g)"]
+    for i in range(rows):
+        name, group = rng.choice(_FOODS)
+        p, c, f = rng.uniform(0, 30), rng.uniform(0, 70), rng.uniform(0, 30)
+        values = (p * 4 + c * 4 + f * 9, p, c, f, rng.uniform(0, 10))
+        lines.append(f"{group};{name} {i};" + ";".join(f"{v:.2f}".replace(".", ",") for v in values))
+    with open(path, "w", encoding="cp1252", newline="") as out:
+        out.write("\r\n".join(lines))
+    return path
+
+
+# === Mesures ===
+def _timed(fn, *args):
+    start = time.perf_counter()
+    value = fn(*args)
+    return time.perf_counter() - start, value
+
+
+def _latency_stats(latencies: list, wall: float) -> dict:
+    ordered = sorted(latencies)
+    return {
+        "runs": len(ordered),
+        "p50_s": round(median(ordered), 4),
+        "p95_s": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 4),
+        "max_s": round(ordered[-1], 4),
+        "wall_s": round(wall, 4),
+        "docs_per_min": round(len(ordered) * 60 / wall, 2),
+    }
+
+
+def bench_extraction(corpus: str, pdf_sizes: list) -> dict:
+    from pdf_extract import iter_pdf_pages
+    from file_utils import _extract_content
+
+    results = {}
+    for pages in pdf_sizes:
+        path = make_pdf(os.path.join(corpus, f"extract_{pages}.pdf"), pages, seed=pages)
+        elapsed, texts = _timed(lambda: list(iter_pdf_pages(path)))
+        results[f"pdf_{pages}p"] = {"pages": len(texts), "seconds": round(elapsed, 4),
+                                    "pages_per_s": round(len(texts) / elapsed, 2)}
+    pages = max(pdf_sizes)
+    path = make_docx(os.path.join(corpus, f"extract_{pages}.docx"), pages, seed=pages)
+    elapsed, text = _timed(_extract_content, path)
+    results[f"docx_{pages}p"] = {"chars": len(text), "seconds": round(elapsed, 4),
+                                 "chars_per_s": round(len(text) / elapsed)}
+    return results
+
+
+def bench_chunking(pages: int, repeat: int = 3) -> dict:
+    from utils import chunk_text
+
+    text = "\n".join(legal_text(pages, seed=7))
+    results = {}
+    for size, overlap in ((400, 60), (1500, 0)):
+        best, chunks = min(_timed(chunk_text, text, size, overlap) for _ in range(repeat))
+        results[f"{size}_tokens"] = {"chunks": len(chunks), "seconds": round(best, 4),
+                                     "mb_per_s": round(len(text.encode("utf-8")) / best / 1e6, 2),
+                                     "chunks_per_s": round(len(chunks) / best)}
+    return results
+
+
+def bench_analysis(corpus: str, pages: int, levels: list, full_analysis: bool) -> dict:
+    """
+    Latence de bout en bout à chaque niveau de concurrence. Chaque exécution porte sur un
+    document distinct (contenu différent) pour mesurer le chemin à froid, sans cache.
+    """
+    from document import analyze_document
+
+    mode = "full" if full_analysis else "question"
+    results = {}
+    for level in levels:
+        paths = [make_pdf(os.path.join(corpus, f"{mode}_{level}_{i}.pdf"), pages, seed=1000 * level + i)
+                 for i in range(level)]
+
+        def run(path):
+            elapsed, answer = _timed(
+                analyze_document, path, "Quelles sont les conditions de résiliation ?", BENCH_MODEL,
+                full_analysis, "Ollama (local)", "",
+            )
+            if answer.startswith("❌"):
+                raise RuntimeError(answer)
+            return elapsed
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=level) as executor:
+            latencies = list(executor.map(run, paths))
+        results[f"concurrency_{level}"] = _latency_stats(latencies, time.perf_counter() - start)
+    return results
+
+
+def bench_nutrition(corpus: str, rows: int) -> dict:
+    from types import SimpleNamespace
+    from nutrition import generate_nutrition_plan_stream
+
+    path = make_food_csv(os.path.join(corpus, f"aliments_{rows}.csv"), rows)
+    results = {}
+    for label in ("cold", "warm"):  # second passage : table d'aliments déjà chargée
+        start = time.perf_counter()
+        first = None
+        for output in generate_nutrition_plan_stream(
+                SimpleNamespace(name=path), 140, 250, 70, 2200, "Standard", BENCH_MODEL, 4):
+            if first is None and "|" in output:
+                first = time.perf_counter() - start
+        if output.startswith("❌"):
+            raise RuntimeError(output)
+        results[label] = {"table_s": round(first or 0.0, 4), "total_s": round(time.perf_counter() - start, 4)}
+    results["rows"] = rows
+    return results
+
+
+# === Résultats ===
+def _git_version() -> str:
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or "inconnue"
+    except (OSError, subprocess.SubprocessError):
+        return "inconnue"
+
+
+def _flatten(data: dict, prefix: str = "") -> dict:
+    flat = {}
+    for key, value in data.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(_flatten(value, name))
+        elif isinstance(value, (int, float)):
+            flat[name] = value
+    return flat
+
+
+def compare(previous: dict, current: dict) -> list:
+    """Lignes 'mesure : avant -> après (écart %)' pour les mesures communes."""
+    old, new = _flatten(previous.get("results", {})), _flatten(current.get("results", {}))
+    lines = []
+    for name in sorted(old.keys() & new.keys()):
+        before, after = old[name], new[name]
+        change = f"{(after - before) / before * 100:+.1f}%" if before else "n/a"
+        lines.append(f"{name} : {before:g} -> {after:g} ({change})")
+    return lines
+
+
+def run_benchmarks(args) -> dict:
+    corpus = tempfile.mkdtemp(prefix="rag_bench_")
+    server = StubLLMServer(args.ttft, args.tokens_per_sec, args.response_tokens, args.stub_parallel).start()
+    # Configuration lue à l'import des modules : à fixer avant le premier import du pipeline
+    os.environ.update({
+        "OLLAMA_HOSTS": server.url,
+        "RAG_CACHE_DIR": os.path.join(corpus, "cache"),
+        "LLM_CACHE": "0",
+        "EMBED_BACKEND": "ollama",
+        "METRICS_PORT": "0",
+    })
+    config = {k: v for k, v in vars(args).items() if k not in ("output", "compare")}
+    report = {
+        "version": _git_version(),
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "config": config,
+        "results": {},
+    }
+    steps = (
+        ("extraction", lambda: bench_extraction(corpus, args.pdf_pages)),
+        ("chunking", lambda: bench_chunking(max(args.pdf_pages))),
+        ("analysis_question", lambda: bench_analysis(corpus, args.doc_pages, args.concurrency, False)),
+        ("analysis_full", lambda: bench_analysis(corpus, args.doc_pages, args.concurrency, True)),
+        ("nutrition", lambda: bench_nutrition(corpus, args.food_rows)),
+    )
+    try:
+        for name, step in steps:
+            if args.only and name not in args.only:
+                continue
+            print(f"⏱️  {name}...", flush=True)
+            report["results"][name] = step()
+    finally:
+        report["stub_requests"] = dict(server.requests)
+        server.stop()
+        shutil.rmtree(corpus, ignore_errors=True)
+    return report
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Banc de performance du pipeline RAG (faux serveur LLM).")
+    parser.add_argument("-o", "--output", default="benchmark.json", help="fichier JSON de résultats")
+    parser.add_argument("--compare", help="résultat précédent (JSON) à comparer")
+    parser.add_argument("--only", nargs="+", help="étapes à exécuter (extraction, chunking, analysis_question, "
+                                                  "analysis_full, nutrition)")
+    parser.add_argument("--pdf-pages", type=int, nargs="+", default=[10, 100], help="tailles des PDF d'extraction")
+    parser.add_argument("--doc-pages", type=int, default=20, help="pages des documents analysés")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4], help="analyses simultanées")
+    parser.add_argument("--food-rows", type=int, default=3000, help="lignes de la table d'aliments")
+    parser.add_argument("--ttft", type=float, default=0.2, help="latence avant le premier token (s)")
+    parser.add_argument("--tokens-per-sec", type=float, default=200.0, help="débit de génération du faux serveur")
+    parser.add_argument("--response-tokens", type=int, default=60, help="tokens par réponse")
+    parser.add_argument("--stub-parallel", type=int, default=4, help="générations simultanées du faux serveur")
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(args)
+    with open(args.output, "w", encoding="utf-8") as out:
+        json.dump(report, out, ensure_ascii=False, indent=2)
+    print(f"✅ Résultats écrits dans {args.output}")
+    for name, value in sorted(_flatten(report["results"]).items()):
+        print(f"  {name} : {value:g}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            previous = json.load(f)
+        print(f"📊 Comparaison avec {previous.get('version', '?')} ({previous.get('date', '?')}) :")
+        for line in compare(previous, report):
+            print(f"  {line}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
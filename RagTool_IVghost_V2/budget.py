@@ -0,0 +1,134 @@
+# budget.py
+
+import os
+import re
+import threading
+import metrics
+import ollama_pool
+from logging_utils import log
+from chunking import count_tokens, context_chunk_budget, DEFAULT_CONTEXT_TOKENS
+
+# === Fenêtres de contexte ===
+# Fournisseurs externes : limites configurées (tokens)
+PROVIDER_CONTEXT_TOKENS = {
+    "OpenAI": int(os.getenv("OPENAI_CONTEXT_TOKENS", "128000")),
+    "Anthropic": int(os.getenv("ANTHROPIC_CONTEXT_TOKENS", "100000")),
+    "Perplexity": int(os.getenv("PERPLEXITY_CONTEXT_TOKENS", "127000")),
+}
+OLLAMA_SHOW_URL = "http://localhost:11434/api/show"
+# Tokens réservés à la réponse d'une question ou d'une synthèse
+ANSWER_OUTPUT_TOKENS = int(os.getenv("ANSWER_OUTPUT_TOKENS", "1000"))
+# Bornes du nombre d'extraits en mode recherche
+MIN_TOP_K = 1
+MAX_TOP_K = int(os.getenv("MAX_TOP_K", "20"))
+
+_NUM_CTX_RE = re.compile(r"^\s*num_ctx\s+(\d+)", re.MULTILINE)
+_context_windows = {}  # {(fournisseur, modèle): tokens}
+_lock = threading.Lock()
+
+
+def _ollama_context(model: str) -> int:
+    """
+    Contexte effectif d'un modèle Ollama : num_ctx de ses paramètres s'il est fixé, sinon
+    MODEL_CONTEXT_TOKENS (à aligner sur OLLAMA_CONTEXT_LENGTH du serveur), borné par la
+    longueur d'entraînement du modèle.
+    """
+    response = ollama_pool.pool.post(OLLAMA_SHOW_URL, model, json={"model": model})
+    response.raise_for_status()
+    data = response.json()
+    match = _NUM_CTX_RE.search(data.get("parameters") or "")
+    context = int(match.group(1)) if match else DEFAULT_CONTEXT_TOKENS
+    trained = [v for k, v in (data.get("model_info") or {}).items() if k.endswith(".context_length")]
+    return min(context, int(trained[0])) if trained else context
+
+
+def get_context_window(model: str, provider: str) -> int:
+    """Fenêtre de contexte (tokens) du modèle, interrogée une fois par modèle."""
+    key = (provider, model)
+    with _lock:
+        if key in _context_windows:
+            return _context_windows[key]
+    context = PROVIDER_CONTEXT_TOKENS.get(provider, DEFAULT_CONTEXT_TOKENS)
+    if provider == ollama_pool.OLLAMA_PROVIDER and model:
+        try:
+            context = _ollama_context(model)
+        except Exception as e:
+            log(f"⚠️ Métadonnées de {model} indisponibles ({e}), contexte supposé : {DEFAULT_CONTEXT_TOKENS} tokens.")
+            return DEFAULT_CONTEXT_TOKENS  # non mémorisé : nouvel essai au prochain appel
+    with _lock:
+        _context_windows[key] = context
+    log(f"📐 Contexte de {model} ({provider}) : {context} tokens.")
+    return context
+
+
+def known_context_window(model: str, provider: str):
+    """Fenêtre déjà connue (sans requête réseau), ou None."""
+    with _lock:
+        return _context_windows.get((provider, model))
+
+
+class PromptPlan:
+    """Stratégie retenue pour une requête et son coût estimé."""
+
+    def __init__(self, strategy: str, context_tokens: int, input_tokens: int, calls: int,
+                 top_k: int = None, chunk_tokens: int = None):
+        self.strategy = strategy  # single_shot, top_k ou map_reduce
+        self.context_tokens = context_tokens
+        self.input_tokens = input_tokens
+        self.calls = calls
+        self.top_k = top_k
+        self.chunk_tokens = chunk_tokens
+
+    def log(self, task: str) -> "PromptPlan":
+        details = []
+        if self.top_k is not None:
+            details.append(f"k={self.top_k}")
+        if self.chunk_tokens is not None:
+            details.append(f"chunks de {self.chunk_tokens} tokens")
+        suffix = f" ({', '.join(details)})" if details else ""
+        if self.calls:
+            cost = f"~{self.input_tokens} tokens en entrée, {self.calls} appel(s) LLM estimé(s)"
+        else:
+            cost = "taille du document inconnue (extraction en flux)"
+        log(f"🧮 {task} : stratégie {self.strategy}{suffix}, contexte {self.context_tokens} tokens, {cost}.")
+        metrics.annotate(strategy=self.strategy, est_input_tokens=self.input_tokens, est_calls=self.calls)
+        return self
+
+
+def plan_question(question: str, document_tokens: int, chunk_tokens: int, model: str, provider: str,
+                  overhead_tokens: int = 50) -> PromptPlan:
+    """
+    Question sur un document : autant d'extraits que le budget le permet (au plus MAX_TOP_K),
+    ou le document entier (aucun embedding ni recherche) s'il n'est pas plus long que ces
+    extraits. Une grande fenêtre de contexte (fournisseurs payants) ne suffit donc pas à
+    envoyer tout le document à chaque question.
+    """
+    context = get_context_window(model, provider)
+    fixed = count_tokens(question) + overhead_tokens
+    available = context_chunk_budget(context, fixed, ANSWER_OUTPUT_TOKENS)
+    top_k = max(MIN_TOP_K, min(MAX_TOP_K, available // max(chunk_tokens, 1)))
+    retrieval_tokens = top_k * chunk_tokens
+    if document_tokens <= min(available, retrieval_tokens):
+        return PromptPlan("single_shot", context, fixed + document_tokens, 1)
+    return PromptPlan("top_k", context, fixed + retrieval_tokens, 1, top_k=top_k)
+
+
+def plan_analysis(instructions: str, output_tokens: int, model: str, provider: str,
+                  document_tokens: int = None) -> PromptPlan:
+    """
+    Analyse complète : un seul appel si le document tient dans le contexte, sinon résumés
+    de chunks aussi gros que le contexte le permet, puis réduction et synthèse.
+    Sans taille connue (extraction en flux), le plan est map_reduce ; l'appelant passe en
+    single_shot si le flux ne produit qu'un chunk.
+    """
+    context = get_context_window(model, provider)
+    chunk = context_chunk_budget(context, count_tokens(instructions), output_tokens)
+    if document_tokens is not None and document_tokens <= chunk:
+        return PromptPlan("single_shot", context, document_tokens + count_tokens(instructions), 1)
+    calls = -(-document_tokens // chunk) + 1 if document_tokens is not None else 0
+    return PromptPlan("map_reduce", context, document_tokens or 0, calls, chunk_tokens=chunk)
+
+
+def fits(prompt: str, model: str, provider: str, output_tokens: int = ANSWER_OUTPUT_TOKENS) -> bool:
+    """Le prompt et la réponse attendue tiennent-ils dans le contexte ?"""
+    return count_tokens(prompt) + output_tokens <= get_context_window(model, provider)
@@ -0,0 +1,187 @@
+# chunking.py
+
+import os
+import re
+
+# Fenêtre de contexte supposée du modèle quand elle n'est pas connue (en tokens)
+DEFAULT_CONTEXT_TOKENS = int(os.getenv("MODEL_CONTEXT_TOKENS", "4096"))
+# Tokenizer : "approx" (heuristique sans dépendance) ou "tiktoken" (si installé)
+TOKENIZER = os.getenv("TOKENIZER", "approx").lower()
+
+# Heuristique proche d'un BPE : un mot compte pour un token par tranche de 4 caractères
+_TOKEN_RE = re.compile(r"\w{1,4}|[^\w\s]", re.UNICODE)
+# Titres de structure : articles, chapitres, sections... et numérotations "1.2 Titre"
+_HEADING_RE = re.compile(
+    r"^\s*(?:(?:article|art\.|chapitre|titre|section|annexe)\s+(?:\d+|[IVXLC]+\b|premier|unique)"
+    r"|préambule\b"
+    r"|\d+(?:\.\d+)+\.?\s+[A-ZÀ-Ý]"
+    r"|\d+[.)]\s+[A-ZÀ-Ý]"
+    r"|[IVXLC]+[.)-]\s+[A-ZÀ-Ý])",
+    re.IGNORECASE,
+)
+_SENTENCE_RE = re.compile(r"(?<=[.!?;:])\s+")
+_CLAUSE_RE = re.compile(r"(?<=,)\s+")
+
+_tokenizer = None
+
+
+def approx_token_count(text: str) -> int:
+    """Estimation du nombre de tokens sans tokenizer externe."""
+    return len(_TOKEN_RE.findall(text))
+
+
+def get_tokenizer():
+    """Retourne la fonction de comptage de tokens configurée (texte -> int)."""
+    global _tokenizer
+    if _tokenizer is None:
+        _tokenizer = approx_token_count
+        if TOKENIZER == "tiktoken":
+            try:
+                import tiktoken
+                encoding = tiktoken.get_encoding("cl100k_base")
+                _tokenizer = lambda text: len(encoding.encode(text, disallowed_special=()))
+            except ImportError:
+                pass
+    return _tokenizer
+
+
+def count_tokens(text: str) -> int:
+    """Compte les tokens d'un texte avec le tokenizer configuré."""
+    return get_tokenizer()(text)
+
+
+def context_chunk_budget(context_tokens: int, prompt_tokens: int, output_tokens: int, margin: float = 0.9) -> int:
+    """Taille de chunk (en tokens) qui remplit la fenêtre de contexte, prompt et réponse déduits."""
+    return max(64, int((context_tokens - prompt_tokens - output_tokens) * margin))
+
+
+def is_heading(line: str) -> bool:
+    """Indique si une ligne ressemble à un titre (article, chapitre, section numérotée...)."""
+    return len(line) < 120 and bool(_HEADING_RE.match(line))
+
+
+def iter_blocks(pages, max_tokens: int = None, count=None):
+    """
+    Découpe un flux de pages en blocs structurels (titre ou paragraphe), sans
+    matérialiser le texte complet. Un paragraphe peut chevaucher deux pages ; avec
+    max_tokens, il est aussi clos avant de dépasser ce budget (texte PDF sans lignes
+    vides), pour que les blocs sortent au fil des pages.
+    Renvoie des couples (texte, est_un_titre).
+    """
+    count = count or get_tokenizer()
+    paragraph, paragraph_tokens = [], 0
+    for page in pages:
+        for line in page.splitlines():
+            stripped = line.strip()
+            if not stripped:
+                if paragraph:
+                    yield " ".join(paragraph), False
+                    paragraph, paragraph_tokens = [], 0
+            elif is_heading(stripped):
+                if paragraph:
+                    yield " ".join(paragraph), False
+                    paragraph, paragraph_tokens = [], 0
+                yield stripped, True
+            else:
+                n = count(stripped) if max_tokens else 0
+                if paragraph and max_tokens and paragraph_tokens + n > max_tokens:
+                    yield " ".join(paragraph), False
+                    paragraph, paragraph_tokens = [], 0
+                paragraph.append(stripped)
+                paragraph_tokens += n
+    if paragraph:
+        yield " ".join(paragraph), False
+
+
+def _split_oversized(text: str, max_tokens: int, count, level: int = 0) -> list:
+    """Redécoupe un bloc trop long : phrases, puis propositions, puis mots."""
+    splitters = (_SENTENCE_RE, _CLAUSE_RE)
+    while level < len(splitters):
+        parts = [p for p in splitters[level].split(text) if p]
+        level += 1
+        if len(parts) > 1:
+            out = []
+            for part in parts:
+                if count(part) <= max_tokens:
+                    out.append(part)
+                else:
+                    out.extend(_split_oversized(part, max_tokens, count, level))
+            return out
+
+    out, window, window_tokens = [], [], 0
+    for word in text.split():
+        n = count(word) + 1
+        if window and window_tokens + n > max_tokens:
+            out.append(" ".join(window))
+            window, window_tokens = [], 0
+        window.append(word)
+        window_tokens += n
+    if window:
+        out.append(" ".join(window))
+    return out
+
+
+def _tail_text(text: str, max_tokens: int, count) -> str:
+    """Fin d'un bloc d'au plus max_tokens tokens : phrases entières si possible, sinon mots."""
+    if max_tokens <= 0:
+        return ""
+    for parts in (_SENTENCE_RE.split(text), text.split()):
+        tail, tail_tokens = [], 0
+        for part in reversed([p for p in parts if p]):
+            n = count(part) + 1
+            if tail_tokens + n > max_tokens:
+                break
+            tail.insert(0, part)
+            tail_tokens += n
+        if tail:
+            return " ".join(tail)
+    return ""
+
+
+def iter_token_chunks(pages, max_tokens: int = 800, overlap: int = 0, count=None, min_fill: float = 0.5):
+    """
+    Générateur de chunks d'au plus max_tokens tokens à partir d'un flux de pages.
+    - les coupures se font aux frontières de titres, paragraphes, phrases puis mots ;
+    - un titre ouvre un nouveau chunk si le chunk courant est rempli à min_fill ;
+    - les `overlap` derniers tokens d'un chunk sont repris au début du suivant.
+    """
+    count = count or get_tokenizer()
+    current = []  # [(texte, tokens)]
+    current_tokens = 0
+    fresh = False  # le chunk courant contient-il autre chose que le recouvrement ?
+
+    def flush():
+        nonlocal current, current_tokens, fresh
+        chunk = "\n".join(text for text, _ in current)
+        tail, tail_tokens = [], 0
+        for text, n in reversed(current):
+            if tail_tokens + n > overlap:
+                # Bloc plus long que le recouvrement : on en reprend la fin
+                part = _tail_text(text, overlap - tail_tokens, count)
+                if part:
+                    tail.insert(0, (part, count(part)))
+                    tail_tokens += tail[0][1]
+                break
+            tail.insert(0, (text, n))
+            tail_tokens += n
+        current, current_tokens, fresh = tail, tail_tokens, False
+        return chunk
+
+    for text, heading in iter_blocks(pages, max_tokens, count):
+        n = count(text)
+        pieces = [(text, n)] if n <= max_tokens else [
+            (p, count(p)) for p in _split_oversized(text, max_tokens, count)
+        ]
+        if heading and fresh and current_tokens >= min_fill * max_tokens:
+            yield flush()
+        for piece, n in pieces:
+            if fresh and current_tokens + n > max_tokens:
+                yield flush()
+            # Le recouvrement ne doit jamais faire dépasser le budget
+            while current and current_tokens + n > max_tokens:
+                current_tokens -= current.pop(0)[1]
+            current.append((piece, n))
+            current_tokens += n
+            fresh = True
+    if fresh:
+        yield flush()
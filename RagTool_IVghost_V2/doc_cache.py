@@ -0,0 +1,216 @@
+# doc_cache.py
+
+import os
+import json
+import hashlib
+import threading
+import numpy as np
+import metrics
+from logging_utils import log, current_cancel
+
+# === Configuration du cache disque ===
+CACHE_DIR = os.getenv("RAG_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".rag_cache"))
+CACHE_MAX_BYTES = int(os.getenv("RAG_CACHE_MAX_MB", "1024")) * 1024 * 1024
+# À incrémenter dès que l'extraction ou le découpage change de comportement
+EXTRACTOR_VERSION = "4"
+
+
+def file_hash(file_path: str) -> str:
+    """Calcule l'empreinte SHA-256 du contenu d'un fichier (lecture par blocs)."""
+    h = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def text_hash(text: str) -> str:
+    """Empreinte SHA-256 d'un texte."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class DocumentCache:
+    """
+    Cache disque adressé par contenu : texte extrait, chunks, embeddings et résumés.
+    Chaque entrée est un fichier ; l'éviction LRU se base sur la date d'accès (mtime).
+    """
+
+    def __init__(self, root: str = CACHE_DIR, max_bytes: int = CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._sizes = None  # {chemin: taille}, chargé au premier accès
+
+    # --- Clés ---
+    @staticmethod
+    def make_key(namespace: str, content_hash: str, **params) -> str:
+        """Construit une clé à partir du hash de contenu, de la version et des paramètres."""
+        raw = json.dumps(
+            {"ns": namespace, "hash": content_hash, "v": EXTRACTOR_VERSION, "params": params},
+            sort_keys=True,
+        )
+        return f"{namespace}-{hashlib.sha256(raw.encode('utf-8')).hexdigest()}"
+
+    def _path(self, key: str, ext: str) -> str:
+        digest = key.rsplit("-", 1)[-1]
+        return os.path.join(self.root, digest[:2], f"{key}{ext}")
+
+    def _load_sizes(self) -> None:
+        if self._sizes is not None:
+            return
+        self._sizes = {}
+        if not os.path.isdir(self.root):
+            return
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                try:
+                    self._sizes[path] = os.path.getsize(path)
+                except OSError:
+                    pass
+
+    # --- Lecture / écriture ---
+    def _read(self, key: str, ext: str, loader):
+        path = self._path(key, ext)
+        namespace = key.rsplit("-", 1)[0]
+        with self._lock:
+            self._load_sizes()
+            if path not in self._sizes:
+                self.misses += 1
+                metrics.count_cache("document", False, namespace)
+                return None
+        try:
+            value = loader(path)
+            os.utime(path)  # marque l'entrée comme récemment utilisée
+        except (OSError, ValueError) as e:
+            log(f"⚠️ Entrée de cache illisible ({os.path.basename(path)}) : {e}")
+            with self._lock:
+                self._sizes.pop(path, None)
+                self.misses += 1
+            metrics.count_cache("document", False, namespace)
+            return None
+        with self._lock:
+            self.hits += 1
+        metrics.count_cache("document", True, namespace)
+        return value
+
+    def _write(self, key: str, ext: str, writer) -> None:
+        path = self._path(key, ext)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            writer(tmp)
+            os.replace(tmp, path)
+            size = os.path.getsize(path)
+        except OSError as e:
+            log(f"⚠️ Écriture cache impossible : {e}")
+            return
+        with self._lock:
+            self._load_sizes()
+            self._sizes[path] = size
+            self._evict()
+
+    def get_json(self, key: str):
+        def loader(path):
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        return self._read(key, ".json", loader)
+
+    def put_json(self, key: str, value) -> None:
+        def writer(path):
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(value, f, ensure_ascii=False)
+        self._write(key, ".json", writer)
+
+    def get_array(self, key: str):
+        return self._read(key, ".npy", lambda path: np.load(path, allow_pickle=False))
+
+    def put_array(self, key: str, value) -> None:
+        def writer(path):
+            with open(path, "wb") as f:
+                np.save(f, np.asarray(value, dtype=np.float32))
+        self._write(key, ".npy", writer)
+
+    def get_arrays(self, key: str):
+        """Lit un ensemble de tableaux nommés (.npz), dtypes conservés."""
+        def loader(path):
+            with np.load(path, allow_pickle=False) as data:
+                return {name: data[name] for name in data.files}
+        return self._read(key, ".npz", loader)
+
+    def put_arrays(self, key: str, arrays: dict) -> None:
+        def writer(path):
+            with open(path, "wb") as f:
+                np.savez(f, **arrays)
+        self._write(key, ".npz", writer)
+
+    # --- Éviction / statistiques ---
+    def _evict(self) -> None:
+        """Supprime les entrées les moins récemment utilisées au-delà de max_bytes (lock tenu)."""
+        total = sum(self._sizes.values())
+        if total <= self.max_bytes:
+            return
+
+        def last_used(path):
+            try:
+                return os.path.getmtime(path)
+            except OSError:
+                return 0
+
+        for path in sorted(self._sizes, key=last_used):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= self._sizes.pop(path)
+        log(f"🧹 Cache réduit à {total / 1024 / 1024:.1f} Mo.")
+
+    def stats(self) -> dict:
+        """Retourne les compteurs du cache : hits, misses, octets et nombre d'entrées."""
+        with self._lock:
+            self._load_sizes()
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "bytes": sum(self._sizes.values()),
+                "entries": len(self._sizes),
+            }
+
+
+# Instance partagée par toute l'application
+document_cache = DocumentCache()
+
+
+def cached(namespace: str, content_hash: str, compute, array: bool = False, **params):
+    """
+    Retourne la valeur en cache pour (namespace, hash, paramètres), ou la calcule via
+    compute() et la stocke. array=True pour les matrices NumPy (embeddings).
+    """
+    key = document_cache.make_key(namespace, content_hash, **params)
+    value = document_cache.get_array(key) if array else document_cache.get_json(key)
+    if value is not None:
+        return value
+    value = compute()
+    if value is not None and len(value) and not current_cancel().is_set():
+        if array:
+            document_cache.put_array(key, value)
+        else:
+            document_cache.put_json(key, value)
+    return value
+
+
+def cached_extraction(file_path: str, extractor, name: str, content_hash: str = None) -> str:
+    """Retourne le texte extrait d'un fichier, depuis le cache si le contenu est connu."""
+    content_hash = content_hash or file_hash(file_path)
+    return cached("text", content_hash, lambda: extractor(file_path), extractor=name)
+
+
+def log_cache_stats() -> None:
+    """Journalise l'état du cache documentaire."""
+    s = document_cache.stats()
+    log(f"📦 Cache documents : {s['hits']} hits, {s['misses']} misses, "
+        f"{s['entries']} entrées, {s['bytes'] / 1024 / 1024:.1f} Mo.")
@@ -1,34 +1,334 @@
 # document.py
 
+import os
 import time
+import queue
+import asyncio
 import logging
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import contextlib
+import itertools
+import threading
+import contextvars
+from collections import OrderedDict
 
-from utils import chunk_text, extract_text_from_pdf
-from llm_client import query_llm
+from utils import chunk_text, iter_chunks, extract_text_from_pdf
+from llm_client import query_llm, query_llm_stream, embed_texts, get_session, EMBED_BACKEND, EMBED_MODEL
+from retrieval import build_index, retrieve, search, HybridIndex, PREFILTER_THRESHOLD
+import rerank
+import budget
+from lexical import BM25Index
+from doc_cache import (
+    cached, cached_extraction, document_cache, file_hash, text_hash, log_cache_stats,
+)
+from ocr import iter_pages_with_ocr
+from chunking import context_chunk_budget, count_tokens, DEFAULT_CONTEXT_TOKENS
+from pipeline import stream, tree_reduce, get_concurrency
+from async_llm import aquery_llm, aquery_llm_stream, map_ordered_async, submit
+from logging_utils import CancelToken, current_cancel
+from scheduler import current_user
+from response_cache import log_stats as log_llm_cache_stats
 
 logger = logging.getLogger(__name__)
 
+SUMMARY_INSTRUCTIONS = (
+    "Voici un extrait de contrat. Résume les points clés en identifiant :\n"
+    "- Les obligations des parties\n"
+    "- Les clauses à risques\n"
+    "- Les engagements réciproques\n\n"
+    "Sois synthétique, mais rigoureux et utile juridiquement.\n\n"
+)
+# Tokens réservés à la réponse d'un résumé de chunk
+SUMMARY_OUTPUT_TOKENS = 1000
+# Résumé de remplacement d'une section en échec (jamais mis en cache)
+SUMMARY_ERROR = "[Erreur pendant le résumé de cette section]"
+
+# Taille des chunks (en tokens) : petits et recouvrants pour la recherche en mode question,
+# aussi gros que le contexte le permet pour limiter le nombre d'appels en analyse complète
+QUESTION_CHUNK_SIZE = 400
+QUESTION_CHUNK_OVERLAP = 60
+SUMMARY_CHUNK_SIZE = context_chunk_budget(
+    DEFAULT_CONTEXT_TOKENS, count_tokens(SUMMARY_INSTRUCTIONS), SUMMARY_OUTPUT_TOKENS
+)
+# Mode question progressif (PDF pas encore extrait) : réponse provisoire dès EARLY_ANSWER_PAGES
+# pages, affinée à chaque doublement du nombre de pages extraites ; EARLY_ANSWER_MODEL est un
+# modèle Ollama rapide dédié à ces réponses (vide : modèle choisi)
+PROGRESSIVE_QUESTIONS = os.getenv("PROGRESSIVE_QUESTIONS", "1").lower() in ("1", "true", "yes")
+EARLY_ANSWER_PAGES = int(os.getenv("EARLY_ANSWER_PAGES", "5"))
+EARLY_ANSWER_MODEL = os.getenv("EARLY_ANSWER_MODEL", "")
+# Index vectoriels déjà chargés en mémoire, par hash de contenu
+_INDEX_MEMO_SIZE = 8
+_index_memo = OrderedDict()
+
+
+def get_chunks(content_hash: str, text: str) -> list:
+    """Chunks du mode question (petits, recouvrants), via le cache disque."""
+    return cached(
+        "chunks", content_hash,
+        lambda: chunk_text(text, max_tokens=QUESTION_CHUNK_SIZE, overlap=QUESTION_CHUNK_OVERLAP),
+        size=QUESTION_CHUNK_SIZE, overlap=QUESTION_CHUNK_OVERLAP,
+    )
+
+
+def get_embeddings(content_hash: str, chunks: list):
+    """Embeddings des chunks du mode question, via le cache disque."""
+    return cached(
+        "embeddings", content_hash,
+        lambda: embed_texts(chunks),
+        array=True, size=QUESTION_CHUNK_SIZE, overlap=QUESTION_CHUNK_OVERLAP,
+        backend=EMBED_BACKEND, model=EMBED_MODEL,
+    )
+
+
+def get_lexical_index(content_hash: str, chunks: list) -> BM25Index:
+    """Index BM25 des chunks, persisté dans le cache disque (tableaux .npz)."""
+    key = document_cache.make_key("bm25", content_hash, size=QUESTION_CHUNK_SIZE, overlap=QUESTION_CHUNK_OVERLAP)
+    arrays = document_cache.get_arrays(key)
+    if arrays is not None:
+        return BM25Index.from_arrays(arrays)
+    lexical = BM25Index.build(chunks)
+    if not current_cancel().is_set():
+        document_cache.put_arrays(key, lexical.to_arrays())
+    return lexical
+
+
+def get_document_index(content_hash: str, text: str):
+    """
+    Retourne l'index hybride (BM25 + vectoriel) du document ; chunks, index BM25 et
+    embeddings passent par le cache disque. Au-delà de PREFILTER_THRESHOLD chunks, les
+    chunks ne sont pas tous embeddés : seuls les candidats BM25 le sont à la requête.
+    """
+    if content_hash in _index_memo:
+        _index_memo.move_to_end(content_hash)
+        return _index_memo[content_hash]
+
+    chunks = get_chunks(content_hash, text)
+    lexical = get_lexical_index(content_hash, chunks)
+    vector = None
+    if len(chunks) <= PREFILTER_THRESHOLD:
+        vector = build_index(chunks, get_embeddings(content_hash, chunks))
+    # Embeddings calculés à la requête (préfiltrage BM25), conservés chunk par chunk
+    vectors_key = document_cache.make_key(
+        "chunk_vectors", content_hash, size=QUESTION_CHUNK_SIZE, overlap=QUESTION_CHUNK_OVERLAP,
+        backend=EMBED_BACKEND, model=EMBED_MODEL,
+    )
+    index = HybridIndex(chunks, lexical, vector, cache_key=vectors_key)
+    _index_memo[content_hash] = index
+    if len(_index_memo) > _INDEX_MEMO_SIZE:
+        _index_memo.popitem(last=False)
+    return index
+
+
+def _checked_summary(result: str):
+    """Filtre les réponses d'erreur de query_llm pour qu'elles ne soient pas mises en cache."""
+    if not result or result.startswith(("❌", "⚠️")):
+        logger.error(f"Résumé d’un chunk en échec : {result}")
+        return None
+    return result
+
+
+def _summary_prompt(chunk: str) -> str:
+    # Instructions fixes en tête, chunk en fin de prompt
+    return f"{SUMMARY_INSTRUCTIONS}---\n{chunk}\n---"
+
 
 def summarize_chunk(chunk: str, provider: str, model: str, api_key: str) -> str:
     """Résume un chunk de texte en ciblant obligations, risques et engagements."""
-    prompt = (
-        "Voici un extrait de contrat. Résume les points clés en identifiant :\n"
-        "- Les obligations des parties\n"
-        "- Les clauses à risques\n"
-        "- Les engagements réciproques\n\n"
-        "Sois synthétique, mais rigoureux et utile juridiquement.\n\n"
-        f"---\n{chunk}\n---"
-    )
+    prompt = _summary_prompt(chunk)
     try:
-        return query_llm(prompt, model, provider, api_key)
+        return cached(
+            "summary", text_hash(prompt),
+            lambda: _checked_summary(query_llm(prompt, model, provider, api_key)),
+            provider=provider, model=model,
+        ) or SUMMARY_ERROR
     except Exception as e:
         logger.error(f"Erreur lors du résumé d’un chunk : {e}")
-        return "[Erreur pendant le résumé de cette section]"
+        return SUMMARY_ERROR
 
 
-def analyze_document(file, question, model, full_analysis, provider, api_key, *args):
+async def asummarize_chunk(chunk: str, provider: str, model: str, api_key: str) -> str:
+    """Version asynchrone de summarize_chunk, exécutée sur la boucle partagée d'async_llm."""
+    prompt = _summary_prompt(chunk)
+    key = document_cache.make_key("summary", text_hash(prompt), provider=provider, model=model)
+    try:
+        summary = await asyncio.to_thread(document_cache.get_json, key)
+        if summary is None:
+            summary = _checked_summary(await aquery_llm(prompt, model, provider, api_key))
+            if summary:
+                await asyncio.to_thread(document_cache.put_json, key, summary)
+    except Exception as e:
+        logger.error(f"Erreur lors du résumé d’un chunk : {e}")
+        return SUMMARY_ERROR
+    return summary or SUMMARY_ERROR
+
+
+async def amerge_summaries(text: str, provider: str, model: str, api_key: str) -> str:
+    """Fusionne plusieurs résumés consécutifs en un seul (étape de réduction intermédiaire)."""
+    prompt = (
+        "Voici des résumés consécutifs de sections d’un contrat. Fusionne-les en un seul "
+        "résumé, sans perdre les obligations, clauses à risques et engagements :\n\n"
+        f"{text}"
+    )
+    return await aquery_llm(prompt, model, provider, api_key)
+
+
+def _synthesis_prompt(combined_summary: str, source: str = "des résumés ci-dessous") -> str:
+    return (
+        f"À partir {source} d’un contrat, réalise une synthèse claire :\n"
+        "- Liste les obligations principales pour chaque partie\n"
+        "- Identifie les clauses à risques ou ambiguës\n"
+        "- Reformule les engagements mutuels\n\n"
+        f"{combined_summary}"
+    )
+
+
+def _stream_summary_chunks(file_path: str, content_hash: str, chunk_size: int = SUMMARY_CHUNK_SIZE):
+    """
+    Chunks de l'analyse complète : depuis le cache si possible, sinon découpés au fil
+    de l'extraction des pages (texte et chunks sont mis en cache en fin de flux).
     """
+    chunks_key = document_cache.make_key("chunks", content_hash, size=chunk_size)
+    chunks = document_cache.get_json(chunks_key)
+    if chunks is not None:
+        yield from chunks
+        return
+
+    text_key = document_cache.make_key("text", content_hash, extractor="pdf")
+    text = document_cache.get_json(text_key)
+    pages_seen = []
+
+    def pages():
+        source = [text] if text is not None else stream(iter_pages_with_ocr(file_path))
+        for page in source:
+            pages_seen.append(page)
+            yield page
+
+    chunks = []
+    for chunk in iter_chunks(pages(), max_tokens=chunk_size):
+        chunks.append(chunk)
+        yield chunk
+
+    if not current_cancel().is_set() and chunks:
+        if text is None:
+            document_cache.put_json(text_key, "\n".join(pages_seen))
+        document_cache.put_json(chunks_key, chunks)
+
+
+def _draft_prompt(text: str, pages: int, question: str, model: str, provider: str) -> str:
+    """
+    Prompt d'une réponse provisoire sur les premières pages : texte entier s'il tient dans
+    le contexte, sinon extraits retenus par un index BM25 (pas d'embeddings à recalculer).
+    """
+    intro = f"Voici le début d'un document (pages 1 à {pages}, la suite est en cours de lecture)"
+    plan = budget.plan_question(question, count_tokens(text), QUESTION_CHUNK_SIZE, model, provider)
+    plan.log(f"Réponse provisoire ({pages} pages)")
+    if plan.strategy == "single_shot":
+        return f"{intro} :\n{text}\n\nQuestion : {question}"
+    chunks = chunk_text(text, max_tokens=QUESTION_CHUNK_SIZE, overlap=QUESTION_CHUNK_OVERLAP)
+    hits = BM25Index.build(chunks).search(question, plan.top_k) or [(i, 0.0) for i in range(plan.top_k)]
+    context = "\n\n".join(f"[Extrait {n + 1}]\n{chunks[i]}" for n, (i, _) in enumerate(sorted(hits)) if i < len(chunks))
+    return f"{intro}, extraits pertinents :\n{context}\n\nQuestion : {question}"
+
+
+class _Draft:
+    """
+    Réponse provisoire générée sur la boucle asynchrone ; ses fragments sont déposés dans
+    `events`. cancel() (réponse dépassée ou tâche annulée) annule la coroutine : la connexion
+    est fermée aussitôt, même avant le premier token, et le serveur cesse de générer.
+    """
+
+    def __init__(self, text: str, pages: int, question: str, model: str, provider: str, api_key: str, events):
+        self.pages = pages
+        self.model = model
+        self._future = submit(self._run(text, question, provider, api_key, events))
+
+    async def _run(self, text, question, provider, api_key, events):
+        try:
+            prompt = await asyncio.to_thread(_draft_prompt, text, self.pages, question, self.model, provider)
+        except Exception as e:
+            logger.error(f"Réponse provisoire impossible : {e}")
+            return
+        answer = ""
+        async with contextlib.aclosing(aquery_llm_stream(prompt, self.model, provider, api_key)) as pieces:
+            async for piece in pieces:
+                answer += piece
+                events.put(("draft", (self, answer)))
+
+    def cancel(self) -> None:
+        if self._future.cancel():
+            logger.info(f"✂️ Réponse provisoire ({self.pages} pages) dépassée, génération arrêtée.")
+
+
+def _progressive_extraction(file_path: str, content_hash: str, question: str, model: str,
+                            provider: str, api_key: str):
+    """
+    Extrait le PDF en affichant des réponses provisoires : la première dès EARLY_ANSWER_PAGES
+    pages, puis une nouvelle à chaque doublement du nombre de pages, la précédente étant
+    annulée. Générateur de messages ; retourne le texte complet (mis en cache), ou None si
+    l'opération a été annulée.
+    """
+    cancel = current_cancel()
+    reading = CancelToken(parent=cancel)  # arrête l'extraction si le flux est abandonné
+    draft_model = EARLY_ANSWER_MODEL if EARLY_ANSWER_MODEL and provider == "Ollama (local)" else model
+    events = queue.Queue()
+
+    def read_pages():
+        try:
+            for page in iter_pages_with_ocr(file_path, reading):
+                events.put(("page", page))
+        except Exception as e:
+            events.put(("error", e))
+        finally:
+            events.put(("done", None))
+
+    threading.Thread(target=contextvars.copy_context().run, args=(read_pages,),
+                     name="progressive-extraction", daemon=True).start()
+
+    pages = []
+    draft = None
+    shown = None
+    milestone = EARLY_ANSWER_PAGES
+    try:
+        while True:
+            if cancel.is_set():
+                return None
+            try:
+                kind, value = events.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            if kind == "done":
+                break
+            if kind == "error":
+                raise value
+            if kind == "page":
+                pages.append(value)
+                if len(pages) >= milestone:
+                    if draft is not None:
+                        draft.cancel()
+                    logger.info(f"⚡ Réponse provisoire sur {len(pages)} pages ({draft_model})...")
+                    draft = _Draft("\n".join(pages), len(pages), question, draft_model, provider, api_key, events)
+                    milestone *= 2
+                elif shown is None:
+                    yield f"⏳ Extraction du document : {len(pages)} page(s)..."
+            elif kind == "draft" and value[0] is draft:
+                shown = (f"⏳ Réponse provisoire (pages 1 à {draft.pages}, affinée au fil de "
+                         f"l'extraction) :\n\n{value[1]}")
+                yield shown
+    finally:
+        reading.set()
+        if draft is not None:
+            draft.cancel()
+
+    text = "\n".join(pages)
+    document_cache.put_json(document_cache.make_key("text", content_hash, extractor="pdf"), text)
+    if shown is not None:
+        yield f"{shown}\n\n⏳ Document extrait ({len(pages)} pages), réponse définitive en cours..."
+    return text
+
+
+def analyze_document_stream(file, question, model, full_analysis, provider, api_key, *args):
+    """
+    Variante en streaming de analyze_document (handler Gradio générateur) : renvoie le
+    texte affiché au fil de l'eau (progression puis réponse du LLM token par token).
     - file: le chemin ou objet fichier à analyser
     - question: texte de la question (utilisé si full_analysis=False)
     - model: nom du modèle LLM
@@ -40,52 +340,141 @@ def analyze_document(file, question, model, full_analysis, provider, api_key, *a
     start = time.time()
     logger.info(f"[{time.strftime('%H:%M:%S')}] 🔍 Début de l'analyse du document...")
 
-    # 1. Extraction du texte
-    text = extract_text_from_pdf(file)
+    content_hash = file_hash(file)
 
-    # 2. Si on veut juste répondre à une question
+    # 1. Si on veut juste répondre à une question
     if not full_analysis:
         if not question:
-            return "❌ Veuillez fournir une question pour l'analyse."
-        prompt = f"Voici un document :\n{text}\n\nQuestion : {question}"
+            yield "❌ Veuillez fournir une question pour l'analyse."
+            return
+        yield "⏳ Recherche des passages pertinents..."
+        # Extraction du texte (ou récupération depuis le cache disque) ; un PDF pas encore
+        # extrait reçoit des réponses provisoires pendant l'extraction
+        text = document_cache.get_json(document_cache.make_key("text", content_hash, extractor="pdf"))
+        if text is None and PROGRESSIVE_QUESTIONS and file.lower().endswith(".pdf"):
+            text = yield from _progressive_extraction(file, content_hash, question, model, provider, api_key)
+            if text is None:
+                yield "❌ Opération annulée."
+                return
+        elif text is None:
+            text = cached_extraction(file, extract_text_from_pdf, "pdf", content_hash)
+        if not text.strip():
+            yield "❌ Aucun texte n'a pu être extrait du document."
+            return
+        # Document entier s'il tient dans le contexte du modèle, sinon recherche d'extraits
+        plan = budget.plan_question(question, count_tokens(text), QUESTION_CHUNK_SIZE, model, provider)
+        plan.log("Question")
+        # Document en tête, question en fin de prompt : le préfixe commun est maximal
+        session = None
+        if plan.strategy == "single_shot":
+            prompt = f"Voici un document :\n{text}\n\nQuestion : {question}"
+            # Questions suivantes sur le même document : reprise de l'échange (sans renvoyer le texte)
+            session = get_session(f"{current_user()}:{content_hash}", model, provider)
+            if session is not None:
+                prompt = session.prompt(prompt, f"Autre question sur le même document : {question}")
+        else:
+            try:
+                index = get_document_index(content_hash, text)
+                if rerank.is_enabled():
+                    # Plus de candidats, renotés puis réduits au budget de tokens
+                    hits = search(index, question, top_k=max(rerank.RERANK_CANDIDATES, plan.top_k))
+                    candidates = [index.chunks[i] for i, _ in hits]
+                    kept = rerank.rerank(question, candidates, budget=plan.top_k * QUESTION_CHUNK_SIZE)
+                    excerpts = [index.chunks[i] for i in sorted(hits[j][0] for j in kept)]
+                else:
+                    excerpts = retrieve(index, question, top_k=plan.top_k)
+            except Exception as e:
+                logger.error(f"Erreur lors de la recherche d'extraits : {e}")
+                yield f"❌ Erreur d'indexation du document (modèle d'embedding disponible ?) : {e}"
+                return
+            context = "\n\n".join(f"[Extrait {i + 1}]\n{c}" for i, c in enumerate(excerpts))
+            prompt = f"Voici des extraits pertinents d'un document :\n{context}\n\nQuestion : {question}"
         logger.info("🔄 Envoi du prompt question au LLM...")
-        result = query_llm(prompt, model, provider, api_key)
+        result = ""
+        for piece in query_llm_stream(prompt, model, provider, api_key, session=session):
+            result += piece
+            yield result
         elapsed = round(time.time() - start, 2)
         logger.info(f"✅ Analyse terminée en {elapsed}s.")
-        return result
+        log_cache_stats()
+        log_llm_cache_stats()
+        return
+
+    # 2. Analyse complète : un seul appel si le document tient dans le contexte du modèle,
+    # sinon extraction → chunking → résumés → réduction en flux, avec des chunks aussi gros
+    # que le contexte le permet.
+    cached_text = document_cache.get_json(document_cache.make_key("text", content_hash, extractor="pdf"))
+    plan = budget.plan_analysis(
+        SUMMARY_INSTRUCTIONS, SUMMARY_OUTPUT_TOKENS, model, provider,
+        count_tokens(cached_text) if cached_text is not None else None,
+    )
+    if plan.strategy == "single_shot":
+        plan.log("Analyse complète")
+        final_prompt = _synthesis_prompt(cached_text, source="du texte ci-dessous")
+    else:
+        yield "⏳ Extraction et résumé des sections du document..."
+        chunk_stream = stream(_stream_summary_chunks(file, content_hash, plan.chunk_tokens))
+        # Taille inconnue avant extraction : un flux d'un seul chunk est synthétisé directement
+        head = list(itertools.islice(chunk_stream, 2))
+        if len(head) == 1:
+            budget.PromptPlan("single_shot", plan.context_tokens, count_tokens(head[0]), 1).log("Analyse complète")
+            final_prompt = _synthesis_prompt(head[0], source="du texte ci-dessous")
+        else:
+            plan.log("Analyse complète")
+            combined_summary = yield from _map_reduce_summaries(
+                itertools.chain(head, chunk_stream), provider, model, api_key, plan.chunk_tokens
+            )
+            if combined_summary is None:
+                yield "❌ Opération annulée."
+                return
+            final_prompt = _synthesis_prompt(combined_summary)
+
+    # 3. Synthèse finale
+    logger.info("🔄 Envoi du prompt de synthèse finale au LLM...")
+    result = ""
+    for piece in query_llm_stream(final_prompt, model, provider, api_key):
+        result += piece
+        yield result
+
+    elapsed = round(time.time() - start, 2)
+    logger.info(f"✅ Analyse complète terminée en {elapsed}s.")
+    log_cache_stats()
+    log_llm_cache_stats()
 
-    # 3. Analyse complète en mode chunk + synthèse
-    logger.info("🔀 Chunking du document pour résumé parallèle...")
-    chunks = chunk_text(text, max_tokens=600)
 
+def _map_reduce_summaries(chunk_stream, provider, model, api_key, reduce_tokens: int):
+    """
+    Résume les chunks puis fusionne les résumés par groupes d'au plus `reduce_tokens` tokens
+    (générateur de messages de progression) ; retourne le résumé combiné, ou None si
+    l'opération a été annulée. Les résumés sont des
+    coroutines multiplexées sur la boucle partagée d'async_llm, la concurrence vers le
+    fournisseur étant bornée pour tout le serveur.
+    """
+    workers = get_concurrency(provider)
+    logger.info(f"🔀 Pipeline extraction/chunking/résumés asynchrones ({workers} appels simultanés)...")
     summaries = []
-    with ThreadPoolExecutor(max_workers=4) as executor:
-        futures = {
-            executor.submit(summarize_chunk, chunk, provider, model, api_key): idx
-            for idx, chunk in enumerate(chunks)
-        }
-        for future in as_completed(futures):
-            idx = futures[future]
-            logger.info(f"🔖 Résumé chunk {idx + 1}/{len(chunks)}")
-            try:
-                summaries.append(future.result())
-            except Exception as e:
-                summaries.append("[Erreur dans ce chunk]")
-                logger.error(f"Erreur chunk {idx + 1}: {e}")
+    summary_stream = map_ordered_async(
+        chunk_stream, lambda chunk: asummarize_chunk(chunk, provider, model, api_key), workers
+    )
+    for idx, summary in enumerate(summary_stream):
+        logger.info(f"🔖 Résumé chunk {idx + 1}")
+        summaries.append(summary)
+        yield f"⏳ {idx + 1} section(s) résumée(s)..."
 
-    combined_summary = "\n\n".join(summaries)
+    if current_cancel().is_set():
+        return None
 
-    # 4. Synthèse finale
-    final_prompt = (
-        "À partir des résumés ci-dessous d’un contrat, réalise une synthèse claire :\n"
-        "- Liste les obligations principales pour chaque partie\n"
-        "- Identifie les clauses à risques ou ambiguës\n"
-        "- Reformule les engagements mutuels\n\n"
-        f"{combined_summary}"
+    yield f"⏳ Fusion des {len(summaries)} résumés..."
+    summaries = tree_reduce(
+        summaries, lambda text: amerge_summaries(text, provider, model, api_key),
+        workers, reduce_tokens, mapper=map_ordered_async,
     )
-    logger.info("🔄 Envoi du prompt de synthèse finale au LLM...")
-    result = query_llm(final_prompt, model, provider, api_key)
+    return "\n\n".join(summaries)
 
-    elapsed = round(time.time() - start, 2)
-    logger.info(f"✅ Analyse complète terminée en {elapsed}s.")
-    return result
+
+def analyze_document(file, question, model, full_analysis, provider, api_key, *args):
+    """Analyse un document et retourne la réponse complète (voir analyze_document_stream)."""
+    result = ""
+    for result in analyze_document_stream(file, question, model, full_analysis, provider, api_key):
+        pass
+    return result.strip()
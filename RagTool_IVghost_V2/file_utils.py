@@ -1,59 +1,63 @@
+import os
 import time
 import pandas as pd
 import json
-from PyPDF2 import PdfReader
 from docx import Document
-from logging_utils import log, stop_event
+import metrics
+from logging_utils import log, current_cancel
+from doc_cache import cached_extraction
+from pdf_extract import iter_pdf_pages
+from ocr import iter_pages_with_ocr, needs_ocr
+from tabular import iter_csv_chunks, table_to_text, to_number
 
 
 def extract_content(file_path: str) -> str:
+    """Extrait le contenu texte des fichiers PDF, DOCX, CSV ou XLSX (avec cache disque)."""
+    return cached_extraction(file_path, _extract_content, "extract_content")
+
+
+def _extract_content(file_path: str) -> str:
     """Extrait le contenu texte des fichiers PDF, DOCX, CSV ou XLSX."""
     lines = []
     start = time.time()
     log(f"🔄 Début de l'extraction : {file_path}")
 
-    if stop_event.is_set():
+    if current_cancel().is_set():
         log("🛑 Extraction annulée avant début.")
         return ""
 
-    try:
-        if file_path.endswith('.pdf'):
-            log("📄 Lecture PDF...")
-            reader = PdfReader(file_path)
-            for i, page in enumerate(reader.pages):
-                if stop_event.is_set():
-                    log("🛑 Extraction PDF interrompue.")
-                    break
-                text = page.extract_text() or ''
-                lines.append(text)
-                log(f"✅ Page {i+1} extraite.")
-
-        elif file_path.endswith('.docx'):
-            log("📄 Lecture DOCX...")
-            doc = Document(file_path)
-            for i, para in enumerate(doc.paragraphs):
-                if stop_event.is_set():
-                    log("🛑 Extraction DOCX interrompue.")
-                    break
-                lines.append(para.text)
-                log(f"✅ Paragraphe {i+1}.")
-
-        elif file_path.endswith('.csv'):
-            log("📊 Lecture CSV via load_csv_safely...")
-            df = load_csv_safely(file_path)
-            lines.append(df.to_string())
-
-        elif file_path.endswith('.xlsx'):
-            log("📊 Lecture Excel...")
-            df = pd.read_excel(file_path)
-            lines.append(df.to_string())
-
-        else:
-            log(f"❌ Format non supporté : {file_path}")
-
-    except Exception as e:
-        log(f"❌ Erreur extraction {e}")
-
+    with metrics.span("extraction", format=os.path.splitext(file_path)[1].lower()) as attrs:
+        try:
+            if file_path.endswith('.pdf'):
+                log("📄 Lecture PDF...")
+                for i, text in enumerate(iter_pages_with_ocr(file_path)):
+                    lines.append(text)
+                    log(f"✅ Page {i+1} extraite.")
+
+            elif file_path.endswith('.docx'):
+                log("📄 Lecture DOCX...")
+                doc = Document(file_path)
+                for i, para in enumerate(doc.paragraphs):
+                    if current_cancel().is_set():
+                        log("🛑 Extraction DOCX interrompue.")
+                        break
+                    lines.append(para.text)
+                    log(f"✅ Paragraphe {i+1}.")
+
+            elif file_path.endswith(('.csv', '.xlsx')):
+                # Schéma + statistiques + premières lignes, lus par blocs (mémoire bornée)
+                log("📊 Lecture tableur par blocs...")
+                lines.append(table_to_text(file_path))
+
+            else:
+                log(f"❌ Format non supporté : {file_path}")
+
+        except Exception as e:
+            # Pas de texte partiel : il serait mis en cache comme texte du document
+            log(f"❌ Erreur extraction {e}")
+            raise
+
+        attrs["chars"] = sum(len(line) for line in lines)
     total = time.time() - start
     log(f"✅ Extraction terminée en {total:.2f}s.")
     return "\n".join(lines)
@@ -61,48 +65,33 @@ def extract_content(file_path: str) -> str:
 
 def is_pdf_image_based(file_path: str) -> bool:
     """Détecte si un PDF ne contient pas de texte (images uniquement)."""
-    reader = PdfReader(file_path)
-    for page in reader.pages:
-        if page.extract_text() and page.extract_text().strip():
-            return False
-    return True
+    return all(needs_ocr(text) for text in iter_pdf_pages(file_path))
 
 
 def load_csv_safely(file_path: str) -> pd.DataFrame:
-    """Charge un CSV en détectant le séparateur et gère les erreurs d'encodage/format."""
-    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-        header = f.readline()
-
-    seps = [',', ';', '\t', '|']
-    sep = max(seps, key=lambda s: header.count(s))
-    print(f"Séparateur détecté : {repr(sep)}")
-
-    try:
-        df = pd.read_csv(file_path, sep=sep, engine='python', on_bad_lines='warn')
-    except UnicodeDecodeError:
-        print("Encodage différent, réessai ISO-8859-1...")
-        df = pd.read_csv(file_path, sep=sep, engine='python', encoding='ISO-8859-1', on_bad_lines='warn')
-
-    print(f"Chargé : {df.shape[0]}x{df.shape[1]}")
+    """Charge un CSV (séparateur et encodage détectés sur un échantillon, parseur C par blocs)."""
+    chunks = list(iter_csv_chunks(file_path))
+    df = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
+    log(f"Chargé : {df.shape[0]}x{df.shape[1]}")
     return df
 
 
 def clean_nutrition_data(json_path: str) -> pd.DataFrame:
     """Nettoie les données nutritionnelles d'un JSON en assurant des types cohérents."""
     with open(json_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-
-    for item in data:
-        for k, v in item.items():
-            if isinstance(v, str):
-                v = v.strip().replace(',', '.')
-                try:
-                    item[k] = float(v) if v else None
-                except ValueError:
-                    pass
-        # Champs nutritionnels clés
-        for key in ['Energie (kcal/100 g)', 'Protéines (g/100 g)', 'Glucides (g/100 g)',
-                    'Lipides (g/100 g)', 'Fibres alimentaires (g/100 g)']:
-            item[key] = item.get(key) or 0
-
-    return pd.DataFrame(data)
+        df = pd.DataFrame(json.load(f))
+
+    # Champs nutritionnels clés (toujours présents, numériques)
+    keys = ['Energie (kcal/100 g)', 'Protéines (g/100 g)', 'Glucides (g/100 g)',
+            'Lipides (g/100 g)', 'Fibres alimentaires (g/100 g)']
+    for key in keys:
+        df[key] = to_number(df[key]) if key in df else 0.0
+
+    # Autres colonnes : conversion numérique seulement si toutes les valeurs s'y prêtent
+    for col in df.columns.difference(keys):
+        if df[col].dtype == object or pd.api.types.is_string_dtype(df[col]):
+            text = df[col].astype(str).str.strip().str.replace(',', '.', regex=False)
+            numbers = pd.to_numeric(text, errors='coerce')
+            if numbers.notna().all():
+                df[col] = numbers
+    return df
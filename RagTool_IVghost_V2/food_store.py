@@ -0,0 +1,183 @@
+# food_store.py
+
+import re
+import time
+import numpy as np
+import pandas as pd
+from collections import OrderedDict
+from logging_utils import log
+from doc_cache import document_cache, file_hash
+from file_utils import load_csv_safely, clean_nutrition_data
+from tabular import iter_table_chunks, to_number
+
+# Ordre des colonnes de la matrice nutritionnelle (valeurs pour 100 g)
+MACROS = ("kcal", "proteines", "glucides", "lipides", "fibres")
+# Repérage des colonnes dans les tables usuelles (CIQUAL, exports maison) : préfixes insensibles à la casse
+_MACRO_COLUMNS = {
+    "kcal": r"^(energie|énergie|energy|calories|kcal).*kcal|^kcal|^calories",
+    "proteines": r"^(prot[ée]ines?|proteins?)",
+    "glucides": r"^(glucides|carbs|carbohydrates?)",
+    "lipides": r"^(lipides|fats?|mati[èe]res grasses)",
+    "fibres": r"^(fibres|fibers?)",
+}
+_NAME_COLUMNS = ("alim_nom_fr", "nom", "aliment", "name", "food")
+_GROUP_COLUMNS = ("alim_grp_nom_fr", "alim_ssgrp_nom_fr", "groupe", "catégorie", "categorie", "group", "category")
+
+# Exclusions par régime (mots-clés recherchés dans le nom et le groupe de l'aliment)
+_MEAT_FISH = (
+    r"viande|boeuf|bœuf|veau|porc|agneau|mouton|poulet|dinde|canard|lapin|jambon|saucisse|saucisson|"
+    r"lardon|bacon|charcuterie|pâté|rillette|abats|foie|poisson|thon|saumon|cabillaud|sardine|"
+    r"maquereau|crevette|moule|huître|crustac|fruits de mer|gélatine|anchois"
+)
+_ANIMAL = _MEAT_FISH + r"|lait|fromage|yaourt|yogourt|crème|beurre|oeuf|œuf|miel|lactos|caséine|petit-suisse"
+DIET_EXCLUSIONS = {
+    "Végétarien": re.compile(_MEAT_FISH, re.IGNORECASE),
+    "Vegan": re.compile(_ANIMAL, re.IGNORECASE),
+}
+# Glucides maximum pour 100 g en régime cétogène
+KETO_MAX_CARBS = 10.0
+# Nombre de candidats envoyés au solveur / au LLM
+DEFAULT_CANDIDATES = 30
+
+_STORE_MEMO_SIZE = 4
+_store_memo = OrderedDict()
+
+
+def _find_column(columns, pattern: str = None, names: tuple = ()):
+    for col in columns:
+        label = str(col).strip().lower()
+        if label in names or (pattern and re.search(pattern, label)):
+            return col
+    return None
+
+
+class FoodStore:
+    """Table d'aliments en colonnes : noms, groupes et matrice (n, 5) des valeurs pour 100 g."""
+
+    def __init__(self, names: np.ndarray, groups: np.ndarray, matrix: np.ndarray):
+        self.names = names
+        self.groups = groups
+        self.matrix = matrix.astype(np.float32)
+        self._search_text = pd.Series(names, dtype=str) + " " + pd.Series(groups, dtype=str)
+        self._diet_masks = {}
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame) -> "FoodStore":
+        """Repère les colonnes utiles et nettoie les valeurs de façon vectorisée."""
+        name_col = _find_column(df.columns, names=_NAME_COLUMNS) or df.columns[0]
+        group_col = _find_column(df.columns, names=_GROUP_COLUMNS)
+        columns = {m: _find_column(df.columns, pattern) for m, pattern in _MACRO_COLUMNS.items()}
+        missing = [m for m in ("proteines", "glucides", "lipides") if columns[m] is None]
+        if missing:
+            raise ValueError(f"Colonnes nutritionnelles introuvables : {', '.join(missing)}")
+
+        matrix = np.column_stack([
+            to_number(df[columns[m]]).to_numpy() if columns[m] is not None else np.zeros(len(df))
+            for m in MACROS
+        ])
+        # Énergie absente ou nulle : recalculée à partir des macros (Atwater)
+        energy = matrix[:, 1] * 4 + matrix[:, 2] * 4 + matrix[:, 3] * 9
+        matrix[:, 0] = np.where(matrix[:, 0] > 0, matrix[:, 0], energy)
+
+        names = df[name_col].astype(str).str.strip().to_numpy()
+        groups = df[group_col].fillna("").astype(str).to_numpy() if group_col is not None else np.full(len(df), "")
+        keep = (names != "") & (names != "nan") & (matrix[:, 0] > 0)
+        return cls(names[keep], groups[keep], matrix[keep])
+
+    # --- Sélection ---
+    def diet_mask(self, diet_type: str) -> np.ndarray:
+        """Masque booléen des aliments compatibles avec le régime (calculé une fois par régime)."""
+        if diet_type in self._diet_masks:
+            return self._diet_masks[diet_type]
+        mask = np.ones(len(self), dtype=bool)
+        pattern = DIET_EXCLUSIONS.get(diet_type)
+        if pattern is not None:
+            mask &= ~self._search_text.str.contains(pattern, regex=True).to_numpy()
+        if diet_type == "Cétogène":
+            mask &= self.matrix[:, 2] <= KETO_MAX_CARBS
+        self._diet_masks[diet_type] = mask
+        return mask
+
+    def candidates(self, protein: float, carbs: float, fats: float, diet_type: str = "Standard",
+                   k: int = DEFAULT_CANDIDATES) -> np.ndarray:
+        """
+        Indices des aliments les plus pertinents pour une cible (g de protéines, glucides, lipides) :
+        moitié par proximité de la répartition énergétique (cosinus), le reste parmi les
+        meilleures sources de chaque macronutriment (pour pouvoir compléter les portions).
+        """
+        mask = self.diet_mask(diet_type)
+        idx = np.flatnonzero(mask)
+        if len(idx) <= k:
+            return idx
+
+        # Répartition énergétique protéines / glucides / lipides
+        shares = self.matrix[idx, 1:4] * np.array([4, 4, 9], dtype=np.float32)
+        shares /= np.maximum(np.linalg.norm(shares, axis=1, keepdims=True), 1e-6)
+        target = np.array([protein * 4, carbs * 4, fats * 9], dtype=np.float32)
+        target /= max(np.linalg.norm(target), 1e-6)
+        similarity = shares @ target
+
+        selected = list(idx[np.argsort(-similarity)[:k // 2]])
+        per_macro = max(1, (k - len(selected)) // 3)
+        for col in (1, 2, 3):
+            if (col == 2 and carbs <= 0) or (col == 3 and fats <= 0) or (col == 1 and protein <= 0):
+                continue
+            density = self.matrix[idx, col] / np.maximum(self.matrix[idx, 0], 1.0)
+            added = 0
+            for i in idx[np.argsort(-density)]:
+                if added >= per_macro:
+                    break
+                if i not in selected:
+                    selected.append(i)
+                    added += 1
+        return np.array(selected[:k])
+
+    def records(self, indices) -> list:
+        """Aliments sélectionnés au format liste de dicts (valeurs pour 100 g)."""
+        return [
+            {"aliment": self.names[i], **{m: round(float(v), 1) for m, v in zip(MACROS, self.matrix[i])}}
+            for i in indices
+        ]
+
+
+def _read_table(path: str) -> pd.DataFrame:
+    if path.endswith(".csv"):
+        return load_csv_safely(path)
+    if path.endswith(".json"):
+        return clean_nutrition_data(path)
+    if path.endswith(".xlsx"):
+        return pd.concat(list(iter_table_chunks(path)), ignore_index=True)
+    raise ValueError("Format de fichier non supporté.")
+
+
+def load_food_store(path: str) -> FoodStore:
+    """
+    Charge la table d'aliments : mémoire, puis cache disque (tableaux NumPy + noms en JSON),
+    sinon lecture et nettoyage du fichier. Le fichier n'est donc analysé qu'une fois.
+    """
+    content_hash = file_hash(path)
+    if content_hash in _store_memo:
+        _store_memo.move_to_end(content_hash)
+        return _store_memo[content_hash]
+
+    start = time.time()
+    matrix_key = document_cache.make_key("foods_matrix", content_hash)
+    labels_key = document_cache.make_key("foods_labels", content_hash)
+    matrix = document_cache.get_array(matrix_key)
+    labels = document_cache.get_json(labels_key)
+    if matrix is not None and labels is not None:
+        store = FoodStore(np.array(labels["names"], dtype=object), np.array(labels["groups"], dtype=object), matrix)
+    else:
+        store = FoodStore.from_dataframe(_read_table(path))
+        if len(store):
+            document_cache.put_array(matrix_key, store.matrix)
+            document_cache.put_json(labels_key, {"names": list(store.names), "groups": list(store.groups)})
+    log(f"🍎 {len(store)} aliments disponibles ({time.time() - start:.3f}s).")
+
+    _store_memo[content_hash] = store
+    if len(_store_memo) > _STORE_MEMO_SIZE:
+        _store_memo.popitem(last=False)
+    return store
@@ -0,0 +1,257 @@
+# http_client.py
+
+import os
+import time
+import asyncio
+import threading
+from collections import deque
+from contextlib import contextmanager
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import metrics
+from logging_utils import log
+
+# === Timeouts (connexion, lecture) en secondes, par fournisseur ===
+PROVIDER_TIMEOUTS = {
+    "Ollama (local)": (5, float(os.getenv("OLLAMA_TIMEOUT", "600"))),
+    "OpenAI": (5, 60),
+    "Anthropic": (5, 60),
+    "Perplexity": (5, 60),
+}
+DEFAULT_TIMEOUT = (5, 60)
+
+# === Limitation de débit : (requêtes/seconde, rafale max) par fournisseur ===
+PROVIDER_RATE_LIMITS = {
+    "OpenAI": (float(os.getenv("OPENAI_RPS", "5")), 10),
+    "Anthropic": (float(os.getenv("ANTHROPIC_RPS", "2")), 5),
+    "Perplexity": (float(os.getenv("PERPLEXITY_RPS", "2")), 5),
+}
+
+# === Nombre maximal de requêtes en vol par fournisseur (tous utilisateurs confondus) ===
+# Ollama : plafond par serveur du pool (chaque serveur ajouté augmente le débit total)
+PROVIDER_MAX_IN_FLIGHT = {
+    "Ollama (local)": int(os.getenv("OLLAMA_MAX_IN_FLIGHT", "8")),
+    "OpenAI": int(os.getenv("OPENAI_MAX_IN_FLIGHT", "16")),
+    "Anthropic": int(os.getenv("ANTHROPIC_MAX_IN_FLIGHT", "8")),
+    "Perplexity": int(os.getenv("PERPLEXITY_MAX_IN_FLIGHT", "8")),
+}
+DEFAULT_MAX_IN_FLIGHT = 8
+
+# === Réessais : backoff exponentiel sur 429/5xx (respecte Retry-After) ===
+MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "3"))
+BACKOFF_FACTOR = float(os.getenv("HTTP_BACKOFF_FACTOR", "1.0"))
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class TokenBucket:
+    """Seau à jetons : autorise `rate` requêtes/s en moyenne, avec une rafale de `burst`."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> float:
+        """Prend un jeton si possible et retourne 0, sinon le délai d'attente estimé (s)."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self) -> None:
+        """Bloque jusqu'à ce qu'un jeton soit disponible."""
+        while True:
+            wait = self.try_acquire()
+            if not wait:
+                return
+            time.sleep(wait)
+
+
+def _wake(future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class InFlightLimiter:
+    """
+    Plafond de requêtes en vol commun aux appels synchrones (threads) et asynchrones
+    (boucle d'async_llm) : `with limiter:` ou `async with limiter:`. À chaque libération,
+    un thread et une coroutine en attente sont réveillés ; le perdant se remet en attente.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+        self._cond = threading.Condition()
+        self._waiters = deque()  # (boucle, future) des coroutines en attente
+
+    def _try_take(self) -> bool:
+        if self.active < self.limit:
+            self.active += 1
+            return True
+        return False
+
+    def _wake_one(self) -> None:
+        while self._waiters:
+            loop, future = self._waiters.popleft()
+            if not future.done():
+                loop.call_soon_threadsafe(_wake, future)
+                return
+
+    def acquire(self) -> None:
+        with self._cond:
+            while not self._try_take():
+                self._cond.wait()
+
+    async def acquire_async(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._cond:
+                if self._try_take():
+                    return
+                future = loop.create_future()
+                waiter = (loop, future)
+                self._waiters.append(waiter)
+            try:
+                await future
+            except asyncio.CancelledError:
+                with self._cond:
+                    if waiter in self._waiters:
+                        self._waiters.remove(waiter)
+                    else:
+                        self._wake_one()  # réveil reçu mais inutilisé : transmis au suivant
+                raise
+
+    def release(self) -> None:
+        with self._cond:
+            self.active -= 1
+            self._cond.notify()
+            self._wake_one()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    async def __aenter__(self):
+        await self.acquire_async()
+        return self
+
+    async def __aexit__(self, *exc):
+        self.release()
+
+
+def _build_session() -> requests.Session:
+    """
+    Session partagée : connexions keep-alive réutilisées et réessais des erreurs de connexion.
+    Les réessais sur 429/5xx sont faits par _send, pour repasser par la limitation de débit.
+    """
+    retry = Retry(
+        total=MAX_RETRIES,
+        connect=MAX_RETRIES,
+        read=0,  # une lecture interrompue n'est pas rejouée (génération potentiellement longue)
+        status=0,
+        allowed_methods=frozenset({"GET", "POST"}),
+        backoff_factor=BACKOFF_FACTOR,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=8, pool_maxsize=32, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+session = _build_session()
+# Session sans réessais pour les sondes de disponibilité (réponse rapide si le serveur est absent)
+probe_session = requests.Session()
+buckets = {p: TokenBucket(rate, burst) for p, (rate, burst) in PROVIDER_RATE_LIMITS.items()}
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def limiter(provider: str, key: str = None) -> InFlightLimiter:
+    """
+    Plafond de requêtes en vol, partagé par http_client et async_llm : un par fournisseur,
+    ou par `key` (serveur Ollama) pour que chaque serveur ait ses propres emplacements.
+    """
+    name = (provider, key)
+    with _limiters_lock:
+        if name not in _limiters:
+            limit = PROVIDER_MAX_IN_FLIGHT.get(provider, DEFAULT_MAX_IN_FLIGHT)
+            _limiters[name] = InFlightLimiter(limit)
+        return _limiters[name]
+
+
+def _send(method: str, url: str, provider: str, queued: float, **kwargs) -> requests.Response:
+    """
+    Envoie la requête (plafond de concurrence déjà tenu) avec backoff sur 429/5xx : chaque
+    essai reprend un jeton du seau du fournisseur, les réessais restent donc limités en débit.
+    """
+    bucket = buckets.get(provider)
+    for attempt in range(MAX_RETRIES + 1):
+        if bucket is not None:
+            bucket.acquire()
+        if not attempt:
+            metrics.observe_queue_wait(provider, time.time() - queued)
+        response = session.request(method, url, **kwargs)
+        if response.status_code not in RETRY_STATUSES or attempt == MAX_RETRIES:
+            return response
+        retry_after = response.headers.get("Retry-After", "")
+        delay = float(retry_after) if retry_after.isdigit() else BACKOFF_FACTOR * 2 ** attempt
+        log(f"⚠️ {provider} : statut {response.status_code}, nouvel essai dans {delay:.1f}s.")
+        response.close()
+        time.sleep(delay)
+
+
+def request(method: str, url: str, provider: str, limit_key: str = None, **kwargs) -> requests.Response:
+    """
+    Envoie une requête HTTP via la session partagée, en appliquant le timeout,
+    la limitation de débit et le plafond de concurrence du fournisseur (ou du
+    serveur `limit_key`).
+    """
+    kwargs.setdefault("timeout", PROVIDER_TIMEOUTS.get(provider, DEFAULT_TIMEOUT))
+    queued = time.time()
+    with limiter(provider, limit_key):
+        response = _send(method, url, provider, queued, **kwargs)
+    if response.status_code in RETRY_STATUSES:
+        log(f"⚠️ {provider} : statut {response.status_code} après {MAX_RETRIES} réessais.")
+    return response
+
+
+@contextmanager
+def stream(url: str, provider: str, method: str = "POST", limit_key: str = None, **kwargs):
+    """
+    Requête en streaming (réponse lue au fil de l'eau) : le plafond de concurrence
+    du fournisseur reste tenu jusqu'à la fin de la lecture.
+    """
+    kwargs.setdefault("timeout", PROVIDER_TIMEOUTS.get(provider, DEFAULT_TIMEOUT))
+    queued = time.time()
+    with limiter(provider, limit_key):
+        response = _send(method, url, provider, queued, stream=True, **kwargs)
+        try:
+            yield response
+        finally:
+            response.close()
+
+
+def post(url: str, provider: str, **kwargs) -> requests.Response:
+    return request("POST", url, provider, **kwargs)
+
+
+def get(url: str, provider: str, **kwargs) -> requests.Response:
+    return request("GET", url, provider, **kwargs)
+
+
+def probe(url: str, timeout: float = 2) -> requests.Response:
+    """GET rapide sans réessai ni limitation, pour vérifier qu'un serveur répond."""
+    return probe_session.get(url, timeout=timeout)
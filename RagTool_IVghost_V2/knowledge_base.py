@@ -0,0 +1,341 @@
+# knowledge_base.py
+
+import os
+import re
+import time
+import sqlite3
+import threading
+import numpy as np
+import metrics
+from logging_utils import log
+from doc_cache import file_hash
+from file_utils import extract_content
+from document import get_chunks, get_embeddings, QUESTION_CHUNK_SIZE
+from llm_client import embed_texts, query_llm_stream, EMBED_BACKEND, EMBED_MODEL
+from lexical import rrf_fuse
+from retrieval import DEFAULT_TOP_K, FUSION_CANDIDATES
+import rerank
+import budget
+
+# === Configuration de la base de connaissances ===
+KB_DIR = os.getenv("KB_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".knowledge_base"))
+# Lignes de la matrice lues par bloc lors d'une recherche (mémoire bornée)
+SEARCH_BLOCK_ROWS = 65536
+# Compactage de la matrice quand la proportion de chunks supprimés dépasse ce seuil
+COMPACT_RATIO = 0.25
+
+_FTS_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+class KnowledgeBase:
+    """
+    Base de documents persistante : métadonnées et textes dans SQLite (avec index plein
+    texte FTS5), embeddings normalisés dans une matrice float32 mappée en mémoire
+    (une ligne par chunk, ajout en fin de fichier). Les suppressions marquent les lignes ;
+    la matrice est compactée quand elles deviennent trop nombreuses.
+    """
+
+    def __init__(self, root: str = KB_DIR):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self.matrix_path = os.path.join(root, "embeddings.f32")
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(os.path.join(root, "kb.sqlite"), check_same_thread=False)
+        self._db.executescript(
+            "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);"
+            "CREATE TABLE IF NOT EXISTS documents ("
+            " hash TEXT PRIMARY KEY, name TEXT, added REAL, chunks INTEGER);"
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            " id INTEGER PRIMARY KEY, doc_hash TEXT, position INTEGER, text TEXT, deleted INTEGER DEFAULT 0);"
+            "CREATE INDEX IF NOT EXISTS idx_chunks_doc ON chunks(doc_hash);"
+        )
+        try:
+            self._db.execute("CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(text)")
+            self.fts = True
+        except sqlite3.OperationalError:
+            self.fts = False  # SQLite compilé sans FTS5 : recherche vectorielle seule
+        self.dim = int(self._meta("dim") or 0)
+        rows = self._db.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+        self._alive = np.ones(rows, dtype=bool)
+        for (i,) in self._db.execute("SELECT id FROM chunks WHERE deleted = 1"):
+            self._alive[i] = False
+        self._matrix = None
+
+    # --- Métadonnées ---
+    def _meta(self, key: str):
+        row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key: str, value) -> None:
+        self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def _check_embedder(self, dim: int) -> None:
+        """La base n'accepte qu'un seul modèle d'embedding (les vecteurs doivent être comparables)."""
+        embedder = f"{EMBED_BACKEND}:{EMBED_MODEL}"
+        if not self.dim:
+            self.dim = dim
+            self._set_meta("dim", dim)
+            self._set_meta("embedder", embedder)
+        elif dim != self.dim or self._meta("embedder") != embedder:
+            raise RuntimeError(
+                f"Modèle d'embedding incompatible avec la base ({self._meta('embedder')}, dim {self.dim})"
+            )
+
+    # --- Matrice ---
+    def _get_matrix(self):
+        """Matrice mappée en mémoire (rouverte si des lignes ont été ajoutées)."""
+        rows = len(self._alive)
+        if not rows or not self.dim:
+            return None
+        if self._matrix is None or self._matrix.shape[0] != rows:
+            self._matrix = np.memmap(self.matrix_path, dtype=np.float32, mode="r", shape=(rows, self.dim))
+        return self._matrix
+
+    def _append_vectors(self, vectors: np.ndarray) -> None:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        with open(self.matrix_path, "ab") as f:
+            f.write((vectors / norms).astype(np.float32).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+    # --- Documents ---
+    def documents(self) -> list:
+        """[(hash, nom, nombre de chunks)] des documents de la base, du plus récent au plus ancien."""
+        with self._lock:
+            return self._db.execute("SELECT hash, name, chunks FROM documents ORDER BY added DESC").fetchall()
+
+    def __len__(self) -> int:
+        return int(self._alive.sum())
+
+    def add_document(self, file_path: str, name: str = None) -> bool:
+        """
+        Ajoute un document (extraction, chunks et embeddings via le cache disque).
+        Un contenu déjà présent est ignoré ; un document du même nom au contenu différent
+        est remplacé. Retourne True si la base a été modifiée.
+        """
+        name = name or os.path.basename(file_path)
+        content_hash = file_hash(file_path)
+        with self._lock:
+            if self._db.execute("SELECT 1 FROM documents WHERE hash = ?", (content_hash,)).fetchone():
+                log(f"📚 {name} déjà présent dans la base.")
+                return False
+
+        text = extract_content(file_path)
+        if not text.strip():
+            raise ValueError(f"Aucun texte extrait de {name}")
+        chunks = get_chunks(content_hash, text)
+        vectors = np.asarray(get_embeddings(content_hash, chunks), dtype=np.float32)
+
+        with self._lock:
+            for (old_hash,) in self._db.execute("SELECT hash FROM documents WHERE name = ?", (name,)).fetchall():
+                self.delete_document(old_hash, compact=False)
+            self._check_embedder(vectors.shape[1])
+            first = len(self._alive)
+            # La matrice est écrite avant la transaction SQLite : une ligne orpheline en fin de
+            # fichier (arrêt brutal) est écrasée au prochain ajout
+            self._truncate_matrix(first)
+            self._append_vectors(vectors)
+            with self._db:
+                rows = [(first + i, content_hash, i, chunk) for i, chunk in enumerate(chunks)]
+                self._db.executemany("INSERT INTO chunks (id, doc_hash, position, text) VALUES (?, ?, ?, ?)", rows)
+                if self.fts:
+                    self._db.executemany("INSERT INTO chunks_fts (rowid, text) VALUES (?, ?)",
+                                         [(r[0], r[3]) for r in rows])
+                self._db.execute("INSERT INTO documents (hash, name, added, chunks) VALUES (?, ?, ?, ?)",
+                                 (content_hash, name, time.time(), len(chunks)))
+            self._alive = np.concatenate([self._alive, np.ones(len(chunks), dtype=bool)])
+        log(f"📚 {name} ajouté à la base ({len(chunks)} chunks).")
+        return True
+
+    def _truncate_matrix(self, rows: int) -> None:
+        size = rows * self.dim * 4
+        if os.path.exists(self.matrix_path) and os.path.getsize(self.matrix_path) > size:
+            self._matrix = None
+            with open(self.matrix_path, "r+b") as f:
+                f.truncate(size)
+
+    def delete_document(self, content_hash: str, compact: bool = True) -> bool:
+        """Retire un document : ses lignes sont marquées supprimées, sans réécrire la matrice."""
+        with self._lock:
+            ids = [i for (i,) in self._db.execute(
+                "SELECT id FROM chunks WHERE doc_hash = ? AND deleted = 0", (content_hash,))]
+            with self._db:
+                self._db.execute("UPDATE chunks SET deleted = 1 WHERE doc_hash = ?", (content_hash,))
+                if self.fts and ids:
+                    self._db.executemany("DELETE FROM chunks_fts WHERE rowid = ?", [(i,) for i in ids])
+                removed = self._db.execute("DELETE FROM documents WHERE hash = ?", (content_hash,)).rowcount
+            self._alive[ids] = False
+            if compact and len(self._alive) and 1 - self._alive.mean() > COMPACT_RATIO:
+                self.compact()
+        return bool(removed)
+
+    def compact(self) -> None:
+        """Réécrit la matrice et renumérote les chunks sans les lignes supprimées."""
+        with self._lock:
+            start = time.time()
+            matrix = self._get_matrix()
+            keep = np.flatnonzero(self._alive)
+            tmp = f"{self.matrix_path}.tmp"
+            with open(tmp, "wb") as f:
+                for block in range(0, len(keep), SEARCH_BLOCK_ROWS):
+                    f.write(np.asarray(matrix[keep[block:block + SEARCH_BLOCK_ROWS]]).tobytes())
+            # Plus aucune référence au memmap : sous Windows, le fichier ne peut pas être remplacé sinon
+            del matrix
+            self._matrix = None
+            # Renumérotation validée seulement après le remplacement de la matrice : en cas
+            # d'échec, les identifiants restent ceux des lignes de l'ancienne matrice
+            try:
+                self._db.execute("DELETE FROM chunks WHERE deleted = 1")
+                # Renumérotation en deux temps pour ne pas heurter la clé primaire
+                self._db.execute("UPDATE chunks SET id = -id - 1")
+                self._db.executemany("UPDATE chunks SET id = ? WHERE id = ?",
+                                     [(new, -int(old) - 1) for new, old in enumerate(keep)])
+                if self.fts:
+                    self._db.execute("DELETE FROM chunks_fts")
+                    self._db.execute("INSERT INTO chunks_fts (rowid, text) SELECT id, text FROM chunks")
+                os.replace(tmp, self.matrix_path)
+            except Exception:
+                self._db.rollback()
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+                raise
+            self._db.commit()
+            self._alive = np.ones(len(keep), dtype=bool)
+            log(f"🧹 Base compactée : {len(keep)} chunks en {time.time() - start:.2f}s.")
+
+    # --- Recherche ---
+    def _vector_search(self, query_vector, top_k: int) -> list:
+        matrix = self._get_matrix()
+        if matrix is None:
+            return []
+        query = np.asarray(query_vector, dtype=np.float32)
+        query /= max(float(np.linalg.norm(query)), 1e-12)
+        best_ids, best_scores = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        for start in range(0, matrix.shape[0], SEARCH_BLOCK_ROWS):
+            scores = np.asarray(matrix[start:start + SEARCH_BLOCK_ROWS]) @ query
+            scores[~self._alive[start:start + len(scores)]] = -np.inf
+            ids = np.arange(start, start + len(scores))
+            best_ids = np.concatenate([best_ids, ids])
+            best_scores = np.concatenate([best_scores, scores])
+            if len(best_scores) > top_k:
+                keep = np.argpartition(-best_scores, top_k - 1)[:top_k]
+                best_ids, best_scores = best_ids[keep], best_scores[keep]
+        order = np.argsort(-best_scores)
+        return [(int(best_ids[i]), float(best_scores[i])) for i in order if np.isfinite(best_scores[i])]
+
+    def _lexical_search(self, question: str, top_k: int) -> list:
+        terms = _FTS_TOKEN_RE.findall(question.lower())
+        if not self.fts or not terms:
+            return []
+        query = " OR ".join(f'"{t}"' for t in terms)
+        rows = self._db.execute(
+            "SELECT rowid, bm25(chunks_fts) FROM chunks_fts WHERE chunks_fts MATCH ? ORDER BY bm25(chunks_fts) LIMIT ?",
+            (query, top_k),
+        ).fetchall()
+        return [(int(i), -score) for i, score in rows]
+
+    def search(self, question: str, top_k: int = DEFAULT_TOP_K) -> list:
+        """
+        Chunks les plus pertinents de toute la base (fusion RRF des rangs vectoriels et FTS5).
+        Retourne des dicts {name, hash, position, text, score}.
+        """
+        start = time.time()
+        with metrics.span("retrieval", source="knowledge_base", chunks=len(self), top_k=top_k) as attrs:
+            query_vector = embed_texts([question])[0]
+            with self._lock:
+                hits = rrf_fuse([
+                    self._vector_search(query_vector, FUSION_CANDIDATES),
+                    self._lexical_search(question, FUSION_CANDIDATES),
+                ], top_k)
+                results = []
+                for i, score in hits:
+                    row = self._db.execute(
+                        "SELECT d.name, c.doc_hash, c.position, c.text FROM chunks c "
+                        "JOIN documents d ON d.hash = c.doc_hash WHERE c.id = ?", (i,)
+                    ).fetchone()
+                    if row:
+                        results.append({"name": row[0], "hash": row[1], "position": row[2], "text": row[3], "score": score})
+            attrs["hits"] = len(results)
+        log(f"🔎 Base : {len(results)} extraits sur {len(self)} chunks en {time.time() - start:.3f}s.")
+        return results
+
+
+_kb = None
+_kb_lock = threading.Lock()
+
+
+def get_knowledge_base() -> KnowledgeBase:
+    """Base partagée, ouverte au premier usage."""
+    global _kb
+    with _kb_lock:
+        if _kb is None:
+            _kb = KnowledgeBase()
+        return _kb
+
+
+# === Handlers de l'interface ===
+def kb_document_choices() -> list:
+    return [f"{name} ({chunks} chunks) — {h[:12]}" for h, name, chunks in get_knowledge_base().documents()]
+
+
+def kb_add_files(files):
+    """Ajoute les fichiers téléversés à la base ; renvoie un compte rendu et la liste des documents."""
+    kb = get_knowledge_base()
+    lines = []
+    for file in files or []:
+        path = getattr(file, "name", file)
+        name = os.path.basename(path)
+        try:
+            added = kb.add_document(path, name)
+            lines.append(f"✅ {name} ajouté." if added else f"ℹ️ {name} déjà présent.")
+        except Exception as e:
+            log(f"❌ Ajout de {name} à la base impossible : {e}")
+            lines.append(f"❌ {name} : {e}")
+    lines.append(f"📚 {len(kb.documents())} document(s), {len(kb)} chunks dans la base.")
+    return "\n".join(lines), kb_document_choices()
+
+
+def kb_remove(choice: str):
+    """Retire le document choisi dans la liste."""
+    kb = get_knowledge_base()
+    if choice:
+        prefix = choice.rsplit("— ", 1)[-1]
+        for h, name, _ in kb.documents():
+            if h.startswith(prefix):
+                kb.delete_document(h)
+                return f"🗑️ {name} retiré de la base.", kb_document_choices()
+    return "❌ Aucun document sélectionné.", kb_document_choices()
+
+
+def kb_ask_stream(question: str, model: str, provider: str, api_key: str, *args):
+    """Répond à une question à partir de toute la base (handler Gradio générateur)."""
+    if not question:
+        yield "❌ Veuillez fournir une question."
+        return
+    kb = get_knowledge_base()
+    if not len(kb):
+        yield "❌ La base de connaissances est vide."
+        return
+    # Autant d'extraits que le contexte du modèle le permet (chunks d'au plus QUESTION_CHUNK_SIZE
+    # tokens) ; si toute la base tient dans le contexte, tous ses chunks sont envoyés
+    plan = budget.plan_question(question, len(kb) * QUESTION_CHUNK_SIZE, QUESTION_CHUNK_SIZE, model, provider)
+    top_k = plan.top_k or len(kb)
+    plan.log("Base de connaissances")
+    try:
+        if rerank.is_enabled():
+            hits = kb.search(question, top_k=max(rerank.RERANK_CANDIDATES, top_k))
+            kept = rerank.rerank(question, [h["text"] for h in hits], budget=top_k * QUESTION_CHUNK_SIZE)
+            hits = [hits[j] for j in sorted(kept)]
+        else:
+            hits = kb.search(question, top_k=top_k)
+    except Exception as e:
+        log(f"❌ Recherche dans la base impossible : {e}")
+        yield f"❌ Recherche impossible (modèle d'embedding disponible ?) : {e}"
+        return
+    context = "\n\n".join(f"[Extrait {i + 1} — {h['name']}]\n{h['text']}" for i, h in enumerate(hits))
+    prompt = f"Voici des extraits pertinents de plusieurs documents :\n{context}\n\nQuestion : {question}"
+    result = ""
+    for piece in query_llm_stream(prompt, model, provider, api_key):
+        result += piece
+        yield result
@@ -0,0 +1,156 @@
+# lexical.py
+
+import re
+import unicodedata
+from functools import lru_cache
+import numpy as np
+
+# Paramètres BM25 classiques
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+# Mots vides français (sans accents, comme les tokens après normalisation)
+STOPWORDS = frozenset("""
+a afin ai aie aient ainsi alors au aucun aucune aussi autre autres aux avait avant avec avoir
+ce ceci cela celle celles celui ces cet cette ceux chaque ci comme dans de des deja depuis dont
+du elle elles en encore entre est et etaient etait ete etre eu eux fait il ils je la le les leur
+leurs lui ma mais me meme mes moi mon ne ni nos notre nous on ont or ou par pas peu peut plus pour
+qu quand que quel quelle quelles quels qui sa sans se selon ses si son sont sous sur ta te tes
+toi ton tous tout toute toutes tu un une unes uns vos votre vous y l d s c n j m t
+""".split())
+# Suffixes retirés par le raciniseur léger, du plus long au plus court
+_SUFFIXES = (
+    "issements", "issement", "atrices", "ateurs", "ations", "atrice", "ateur", "ation",
+    "ements", "ement", "ments", "ment", "ances", "ance", "ences", "ence", "ites", "ite",
+    "euses", "euse", "eux", "ives", "ive", "ifs", "if", "ions", "ion", "ees", "ee", "es", "er", "e", "s", "x",
+)
+
+
+def strip_accents(text: str) -> str:
+    decomposed = unicodedata.normalize("NFKD", text)
+    if decomposed.isascii():
+        return decomposed
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+@lru_cache(maxsize=100000)
+def stem(word: str) -> str:
+    """Racinisation légère du français : retire le suffixe le plus long en gardant 3 lettres au moins."""
+    if word.isdigit():
+        return word
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)]
+    return word
+
+
+def tokenize(text: str) -> list:
+    """
+    Tokens lexicaux : minuscules sans accents, mots vides retirés, racines.
+    Un nombre précédé d'un mot donne aussi un token composé ("article 12" -> "articl_12")
+    pour que les numéros de clauses soient discriminants.
+    """
+    words = _WORD_RE.findall(strip_accents(text.lower()))
+    tokens = []
+    previous = None
+    for word in words:
+        if word in STOPWORDS:
+            previous = None
+            continue
+        if word.isdigit() and previous is not None:
+            tokens.append(f"{previous}_{word}")
+        token = stem(word)
+        tokens.append(token)
+        previous = None if word.isdigit() else token
+    return tokens
+
+
+class BM25Index:
+    """
+    Index inversé BM25 compact : postings au format CSR (indptr / chunk / tf) en tableaux NumPy,
+    vocabulaire trié pour la recherche dichotomique des termes.
+    """
+
+    def __init__(self, vocab: np.ndarray, indptr: np.ndarray, doc_ids: np.ndarray, tfs: np.ndarray,
+                 doc_lengths: np.ndarray):
+        self.vocab = vocab
+        self.indptr = indptr
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+        self.doc_lengths = doc_lengths
+        n = len(doc_lengths)
+        df = np.diff(indptr).astype(np.float32)
+        self.idf = np.log1p((n - df + 0.5) / (df + 0.5)).astype(np.float32)
+        avg = float(doc_lengths.mean()) if n else 1.0
+        self._norm = (BM25_K1 * (1 - BM25_B + BM25_B * doc_lengths / max(avg, 1.0))).astype(np.float32)
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    @classmethod
+    def build(cls, chunks: list) -> "BM25Index":
+        postings = {}  # {terme: {chunk: tf}}
+        lengths = np.zeros(len(chunks), dtype=np.float32)
+        for i, chunk in enumerate(chunks):
+            tokens = tokenize(chunk)
+            lengths[i] = len(tokens)
+            for token in tokens:
+                entry = postings.setdefault(token, {})
+                entry[i] = entry.get(i, 0) + 1
+
+        vocab = sorted(postings)
+        indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+        doc_ids, tfs = [], []
+        for t, term in enumerate(vocab):
+            entry = postings[term]
+            doc_ids.extend(entry.keys())
+            tfs.extend(entry.values())
+            indptr[t + 1] = len(doc_ids)
+        return cls(
+            np.array(vocab, dtype=str), indptr,
+            np.array(doc_ids, dtype=np.int32), np.array(tfs, dtype=np.float32), lengths,
+        )
+
+    def to_arrays(self) -> dict:
+        """Tableaux à persister (np.savez, sans pickle)."""
+        return {"vocab": self.vocab, "indptr": self.indptr, "doc_ids": self.doc_ids,
+                "tfs": self.tfs, "doc_lengths": self.doc_lengths}
+
+    @classmethod
+    def from_arrays(cls, arrays: dict) -> "BM25Index":
+        return cls(arrays["vocab"], arrays["indptr"], arrays["doc_ids"], arrays["tfs"], arrays["doc_lengths"])
+
+    def _term_id(self, term: str) -> int:
+        pos = int(np.searchsorted(self.vocab, term))
+        return pos if pos < len(self.vocab) and self.vocab[pos] == term else -1
+
+    def scores(self, query: str) -> np.ndarray:
+        """Score BM25 de chaque chunk pour la requête."""
+        scores = np.zeros(len(self), dtype=np.float32)
+        for term in set(tokenize(query)):
+            t = self._term_id(term)
+            if t < 0:
+                continue
+            start, end = self.indptr[t], self.indptr[t + 1]
+            docs, tf = self.doc_ids[start:end], self.tfs[start:end]
+            scores[docs] += self.idf[t] * tf * (BM25_K1 + 1) / (tf + self._norm[docs])
+        return scores
+
+    def search(self, query: str, top_k: int) -> list:
+        """Retourne les (indice, score) des top_k chunks de score non nul, triés par score."""
+        scores = self.scores(query)
+        hits = np.flatnonzero(scores)
+        if len(hits) > top_k:
+            hits = hits[np.argpartition(-scores[hits], top_k - 1)[:top_k]]
+        hits = hits[np.argsort(-scores[hits])]
+        return [(int(i), float(scores[i])) for i in hits]
+
+
+def rrf_fuse(rankings: list, top_k: int, k: int = 60) -> list:
+    """Fusion par rang réciproque (RRF) de plusieurs classements [(indice, score)]."""
+    fused = {}
+    for ranking in rankings:
+        for rank, (i, _) in enumerate(ranking):
+            fused[i] = fused.get(i, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(fused.items(), key=lambda kv: -kv[1])[:top_k]
@@ -1,24 +1,70 @@
 # llm_client.py
 
+import os
+import json
 import time
-import requests
+import base64
+import threading
+from collections import OrderedDict
+import http_client
+import ollama_pool
+import metrics
+import budget
+import response_cache as rcache
+from chunking import count_tokens
 from logging_utils import log
 
 # === Configuration Ollama ===
+# URLs logiques : ollama_pool les réécrit vers le serveur choisi (OLLAMA_HOSTS)
 OLLAMA_URL = "http://localhost:11434/api/generate"
 OLLAMA_MODELS_URL = "http://localhost:11434/api/tags"
+OLLAMA_EMBED_URL = "http://localhost:11434/api/embed"
 
-def query_llm(prompt: str, model: str, provider: str, api_key: str) -> str:
+# === Configuration embeddings ===
+# EMBED_BACKEND : "ollama" (endpoint /api/embed) ou "local" (sentence-transformers sur CPU)
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "ollama").lower()
+EMBED_MODEL = os.getenv("EMBED_MODEL", "nomic-embed-text")
+EMBED_BATCH_SIZE = 32
+
+# === Sessions Ollama ===
+# Durée de maintien des modèles en mémoire après un appel (durée Ollama : "30m", "2h" ; -1 : toujours)
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+# Échanges suivis (par utilisateur et document) et durée d'inactivité avant oubli (s)
+SESSION_MAX = int(os.getenv("LLM_SESSION_MAX", "32"))
+SESSION_TTL = float(os.getenv("LLM_SESSION_TTL", "1800"))
+
+_local_embedder = None
+_sessions = OrderedDict()  # {(clé, modèle): LLMSession}
+_sessions_lock = threading.Lock()
+
+
+def _keep_alive():
+    """keep_alive au format attendu par Ollama : entier (secondes, -1) ou durée ("30m")."""
+    try:
+        return int(OLLAMA_KEEP_ALIVE)
+    except ValueError:
+        return OLLAMA_KEEP_ALIVE
+
+
+def _ollama_payload(model: str, **fields) -> dict:
     """
-    Envoie un prompt texte à un modèle LLM (Ollama local ou externe) et retourne la réponse.
+    Payload Ollama commun : keep_alive pour garder le modèle chargé entre deux rafales, et
+    num_ctx aligné sur la fenêtre utilisée par budget (mêmes options à chaque appel : le
+    serveur ne recharge pas le modèle et ne tronque pas les prompts dimensionnés par budget).
     """
-    log(f"[{time.strftime('%H:%M:%S')}] 🔄 Envoi du prompt au LLM ({provider})...")
-    start_time = time.time()
+    payload = {"model": model, **fields, "keep_alive": _keep_alive()}
+    context = budget.known_context_window(model, ollama_pool.OLLAMA_PROVIDER)
+    if context:
+        payload["options"] = {"num_ctx": context}
+    return payload
 
+
+def _build_request(prompt: str, model: str, provider: str, api_key: str, stream: bool = False):
+    """Construit (url, payload, headers) pour un fournisseur, ou None s'il n'est pas pris en charge."""
     # Préparation de la requête
     if provider == "Ollama (local)":
         url = OLLAMA_URL
-        payload = {"model": model, "prompt": prompt, "stream": False}
+        payload = _ollama_payload(model, prompt=prompt, stream=stream)
         headers = {}
     elif provider == "OpenAI":
         if "gpt" in model.lower():
@@ -27,7 +73,8 @@ def query_llm(prompt: str, model: str, provider: str, api_key: str) -> str:
                 "model": model,
                 "messages": [{"role": "user", "content": prompt}],
                 "max_tokens": 1000,
-                "temperature": 0.7
+                "temperature": 0.7,
+                "stream": stream
             }
         else:
             url = "https://api.openai.com/v1/completions"
@@ -35,7 +82,8 @@ def query_llm(prompt: str, model: str, provider: str, api_key: str) -> str:
                 "model": model,
                 "prompt": prompt,
                 "max_tokens": 1000,
-                "temperature": 0.7
+                "temperature": 0.7,
+                "stream": stream
             }
         headers = {"Authorization": f"Bearer {api_key}"}
     elif provider == "Anthropic":
@@ -43,7 +91,8 @@ def query_llm(prompt: str, model: str, provider: str, api_key: str) -> str:
         payload = {
             "model": model,
             "prompt": f"\n\nHuman: {prompt}\n\nAssistant:",
-            "max_tokens_to_sample": 1000
+            "max_tokens_to_sample": 1000,
+            "stream": stream
         }
         headers = {"x-api-key": api_key, "Content-Type": "application/json"}
     elif provider == "Perplexity":
@@ -52,47 +101,36 @@ def query_llm(prompt: str, model: str, provider: str, api_key: str) -> str:
             "model": model,
             "messages": [{"role": "user", "content": prompt}],
             "max_tokens": 1000,
-            "temperature": 0.7
+            "temperature": 0.7,
+            "stream": stream
         }
         headers = {"Authorization": f"Bearer {api_key}"}
     else:
-        return "❌ Fournisseur IA non pris en charge."
+        return None
+    return url, payload, headers
 
-    # Envoi de la requête (sans timeout pour Ollama local)
-    try:
-        if provider == "Ollama (local)":
-            response = requests.post(url, json=payload, headers=headers)
-        else:
-            response = requests.post(url, json=payload, headers=headers, timeout=60)
-        duration = time.time() - start_time
-    except Exception as e:
-        log(f"❌ Exception lors de l’appel LLM : {e}")
-        return f"❌ Erreur lors de l'interrogation de l'IA : {e}"
 
-    # Vérification HTTP
-    if response.status_code != 200:
-        try:
-            err = response.json()
-        except:
-            err = response.text
-        log(f"❌ Erreur API {provider} : {response.status_code} - {err}")
-        return f"❌ Erreur API ({response.status_code}) : {err}"
+def _empty_response_message(provider: str) -> str:
+    if provider == "Ollama (local)":
+        return "⚠️ Le modèle Ollama n'a pas renvoyé de réponse."
+    return "⚠️ Le modèle n'a pas renvoyé de réponse."
 
-    data = response.json()
 
+def _parse_response(data: dict, provider: str) -> str:
+    """Extrait le texte de la réponse JSON (non streamée) d'un fournisseur."""
     # --- Ollama local utilise le champ "response" ---
     if provider == "Ollama (local)":
         result = data.get("response", "").strip()
         if not result:
             log("⚠️ Réponse vide du modèle Ollama.")
-            return "⚠️ Le modèle Ollama n'a pas renvoyé de réponse."
+            return _empty_response_message(provider)
         return result
 
     # --- Autres providers : on cherche dans "choices" ---
     choices = data.get("choices", [])
     if not choices:
         log("⚠️ Réponse vide du LLM.")
-        return "⚠️ Le modèle n'a pas renvoyé de réponse."
+        return _empty_response_message(provider)
 
     first = choices[0]
     # Chat format
@@ -106,31 +144,275 @@ def query_llm(prompt: str, model: str, provider: str, api_key: str) -> str:
     return "⚠️ Format de réponse inattendu du modèle."
 
 
+def _usage(data: dict, provider: str):
+    """(tokens en entrée, tokens générés, durée de génération en s) rapportés par le fournisseur."""
+    if provider == "Ollama (local)":
+        eval_ns = data.get("eval_duration")
+        return data.get("prompt_eval_count"), data.get("eval_count"), eval_ns / 1e9 if eval_ns else None
+    usage = data.get("usage") or {}
+    return (usage.get("prompt_tokens") or usage.get("input_tokens"),
+            usage.get("completion_tokens") or usage.get("output_tokens"), None)
+
+
+def observe_call(provider: str, model: str, prompt: str, result: str, data: dict = None,
+                 ttft: float = None, elapsed: float = None, status: str = "ok", span=None) -> None:
+    """
+    Enregistre les métriques d'un appel terminé. Sans compteurs du fournisseur, les tokens
+    sont estimés et le débit est calculé sur le temps écoulé depuis le premier token.
+    """
+    tokens_in, tokens_out, generation = _usage(data or {}, provider)
+    if status == "ok":
+        tokens_in = tokens_in or count_tokens(prompt)
+        tokens_out = tokens_out or count_tokens(result)
+        if generation is None and elapsed is not None:
+            generation = elapsed - (ttft or 0.0)
+    metrics.observe_llm(provider, model, status, ttft, tokens_in, tokens_out, generation,
+                        span.attributes if span else None)
+
+
+def _post(url: str, provider: str, model: str = None, **kwargs):
+    """POST via la session partagée ; les requêtes Ollama passent par le répartiteur de serveurs."""
+    if provider == ollama_pool.OLLAMA_PROVIDER:
+        return ollama_pool.pool.post(url, model, **kwargs)
+    return http_client.post(url, provider, **kwargs)
+
+
+def _stream(url: str, provider: str, model: str = None, **kwargs):
+    """Équivalent de _post pour les réponses en streaming (gestionnaire de contexte)."""
+    if provider == ollama_pool.OLLAMA_PROVIDER:
+        return ollama_pool.pool.stream(url, model, **kwargs)
+    return http_client.stream(url, provider, **kwargs)
+
+
+def _cache_key(provider: str, url: str, payload: dict, use_cache: bool):
+    """Clé du cache de réponses, ou None si le cache est contourné."""
+    if not (use_cache and rcache.ENABLED):
+        return None
+    return rcache.make_key(provider, url, payload)
+
+
+def query_llm(prompt: str, model: str, provider: str, api_key: str, use_cache: bool = True) -> str:
+    """
+    Envoie un prompt texte à un modèle LLM (Ollama local ou externe) et retourne la réponse.
+    use_cache=False contourne le cache des réponses (prompt, modèle, paramètres).
+    """
+    log(f"[{time.strftime('%H:%M:%S')}] 🔄 Envoi du prompt au LLM ({provider})...")
+    start_time = time.time()
+
+    # Préparation de la requête
+    request = _build_request(prompt, model, provider, api_key)
+    if request is None:
+        return "❌ Fournisseur IA non pris en charge."
+    url, payload, headers = request
+
+    cache_key = _cache_key(provider, url, payload, use_cache)
+    if cache_key:
+        cached = rcache.response_cache.get(cache_key)
+        if cached is not None:
+            log("📦 Réponse LLM servie depuis le cache.")
+            return cached
+
+    with metrics.span("llm", provider=provider, model=model, mode="sync"):
+        # Envoi de la requête (session partagée : keep-alive, réessais, limitation de débit)
+        try:
+            response = _post(url, provider, model, json=payload, headers=headers)
+            duration = time.time() - start_time
+        except Exception as e:
+            log(f"❌ Exception lors de l’appel LLM : {e}")
+            observe_call(provider, model, prompt, "", status="error")
+            return f"❌ Erreur lors de l'interrogation de l'IA : {e}"
+
+        # Vérification HTTP
+        if response.status_code != 200:
+            try:
+                err = response.json()
+            except:
+                err = response.text
+            log(f"❌ Erreur API {provider} : {response.status_code} - {err}")
+            observe_call(provider, model, prompt, "", status=f"http_{response.status_code}")
+            return f"❌ Erreur API ({response.status_code}) : {err}"
+
+        data = response.json()
+        result = _parse_response(data, provider)
+        # Sans streaming, le premier token n'est connu qu'avec la réponse complète
+        observe_call(provider, model, prompt, result, data, ttft=duration, elapsed=duration)
+        if cache_key and rcache.is_cacheable(result):
+            rcache.response_cache.put(cache_key, result)
+        return result
+
+
+def _stream_line(line: str, provider: str, usage: dict):
+    """
+    Analyse une ligne d'une réponse en streaming (NDJSON Ollama ou SSE) : retourne
+    (fragment de texte ou None, True si le flux est terminé).
+    `usage` reçoit les compteurs de tokens envoyés avec les derniers messages.
+    """
+    if provider == "Ollama (local)":
+        data = json.loads(line)
+        if data.get("error"):
+            raise RuntimeError(data["error"])
+        if data.get("done"):
+            usage.update(data)
+        return data.get("response") or None, bool(data.get("done"))
+
+    # Server-Sent Events (OpenAI, Perplexity, Anthropic)
+    if not line.startswith("data:"):
+        return None, False
+    raw = line[len("data:"):].strip()
+    if raw == "[DONE]":
+        return None, True
+    data = json.loads(raw)
+    if data.get("usage"):
+        usage["usage"] = data["usage"]
+    if provider == "Anthropic":
+        return data.get("completion") or None, bool(data.get("stop_reason"))
+    pieces = [
+        (choice.get("delta") or {}).get("content") or choice.get("text") or ""
+        for choice in data.get("choices", [])
+    ]
+    return "".join(pieces) or None, False
+
+
+def _iter_stream_text(response, provider: str, usage: dict = None):
+    """
+    Extrait les fragments de texte d'une réponse en streaming (NDJSON Ollama ou SSE).
+    `usage` reçoit les compteurs de tokens envoyés avec les derniers messages.
+    """
+    usage = {} if usage is None else usage
+    for raw_line in response.iter_lines():
+        if not raw_line:
+            continue
+        piece, done = _stream_line(raw_line.decode("utf-8"), provider, usage)
+        if piece:
+            yield piece
+        if done:
+            return
+
+
+def query_llm_stream(prompt: str, model: str, provider: str, api_key: str, use_cache: bool = True,
+                     session: "LLMSession" = None):
+    """
+    Variante en streaming de query_llm : renvoie les fragments de texte au fil de la
+    génération. En cas d'erreur, un message d'erreur est renvoyé comme dernier fragment.
+    Une réponse présente dans le cache est renvoyée en un seul fragment.
+    Avec une session (Ollama), le prompt prolonge l'échange précédent (voir LLMSession).
+    """
+    log(f"[{time.strftime('%H:%M:%S')}] 🔄 Envoi du prompt au LLM en streaming ({provider})...")
+    start_time = time.time()
+
+    request = _build_request(prompt, model, provider, api_key, stream=True)
+    if request is None:
+        yield "❌ Fournisseur IA non pris en charge."
+        return
+    url, payload, headers = request
+    if session is not None and session.context:
+        # Suite d'un échange : réponse propre à la session, jamais servie par le cache
+        payload["context"] = session.context
+        use_cache = False
+
+    cache_key = _cache_key(provider, url, payload, use_cache)
+    if cache_key:
+        cached = rcache.response_cache.get(cache_key)
+        if cached is not None:
+            log("📦 Réponse LLM servie depuis le cache.")
+            yield cached
+            return
+
+    first_token = None
+    pieces = []
+    usage = {}
+    # Span détaché : le contexte ne doit pas rester positionné entre deux yield
+    call = metrics.Span("llm", provider=provider, model=model, mode="stream")
+    status = "ok"
+    try:
+        with _stream(url, provider, model, json=payload, headers=headers) as response:
+            if response.status_code != 200:
+                err = response.text
+                log(f"❌ Erreur API {provider} : {response.status_code} - {err}")
+                status = f"http_{response.status_code}"
+                yield f"❌ Erreur API ({response.status_code}) : {err}"
+                return
+            for piece in _iter_stream_text(response, provider, usage):
+                if first_token is None:
+                    first_token = time.time() - start_time
+                    log(f"⚡ Premier token reçu en {first_token:.2f}s.")
+                pieces.append(piece)
+                yield piece
+    except Exception as e:
+        log(f"❌ Exception lors de l’appel LLM (streaming) : {e}")
+        status = "error"
+        yield f"❌ Erreur lors de l'interrogation de l'IA : {e}"
+        return
+    except GeneratorExit:
+        status = "cancelled"  # le consommateur a abandonné la génération
+        raise
+    finally:
+        observe_call(provider, model, prompt, "".join(pieces), usage, first_token,
+                     time.time() - start_time, status, call)
+        call.end(status)
+        if session is not None:
+            session.update(usage.get("context") if status == "ok" else None, status)
+
+    result = "".join(pieces).strip()
+    if not result:
+        # Même message que query_llm : l'appelant ne reste pas sur son dernier message de progression
+        log("⚠️ Réponse vide du LLM (streaming).")
+        yield _empty_response_message(provider)
+        return
+    if cache_key and rcache.is_cacheable(result):
+        rcache.response_cache.put(cache_key, result)
+
+
+def _image_mime(data: bytes) -> str:
+    return "image/jpeg" if data[:3] == b"\xff\xd8\xff" else "image/png"
+
+
+def _build_vision_request(prompt: str, file_bytes: bytes, model: str, provider: str, api_key: str):
+    """Construit (url, arguments de requête) pour un appel vision, ou None si non pris en charge."""
+    encoded = base64.b64encode(file_bytes).decode("utf-8")
+    if provider == "Ollama (local)":
+        # Ollama attend le même endpoint /api/generate, images en base64 dans le JSON
+        payload = _ollama_payload(model, prompt=prompt, images=[encoded], stream=False)
+        return OLLAMA_URL, {"json": payload}
+    if provider == "OpenAI":
+        headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
+        payload = {
+            "model": model,
+            "messages": [{
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": prompt},
+                    {"type": "image_url", "image_url": {"url": f"data:{_image_mime(file_bytes)};base64,{encoded}"}},
+                ],
+            }],
+            "max_tokens": 1000
+        }
+        return "https://api.openai.com/v1/chat/completions", {"headers": headers, "json": payload}
+    return None
+
+
+def _parse_vision_response(data: dict) -> str:
+    """Extrait le texte d'une réponse vision (OpenAI chat ou Ollama)."""
+    # OpenAI chat vision
+    if "choices" in data and data["choices"]:
+        msg = data["choices"][0].get("message", {}).get("content")
+        return msg.strip() if msg else "⚠️ Réponse vision vide."
+    # Ollama local
+    return data.get("response", "⚠️ Réponse vision vide.").strip()
+
+
 def query_llm_vision(prompt: str, file_bytes: bytes, model: str, provider: str, api_key: str) -> str:
     """
     Envoie un fichier image/PDF image à un modèle vision et retourne la réponse.
     """
     log(f"[{time.strftime('%H:%M:%S')}] 🧠 Envoi d'une image vers un modèle Vision ({provider})...")
     try:
-        if provider == "Ollama (local)":
-            files = {"image": ("document.png", file_bytes, "image/png")}
-            # Ollama attend le même endpoint /api/generate
-            response = requests.post(OLLAMA_URL, data={"model": model, "prompt": prompt}, files=files)
-        elif provider == "OpenAI":
-            import base64
-            encoded = base64.b64encode(file_bytes).decode("utf-8")
-            headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
-            payload = {
-                "model": model,
-                "messages": [
-                    {"role": "user", "content": prompt},
-                    {"role": "user", "content": f"![image](data:image/png;base64,{encoded})"}
-                ],
-                "max_tokens": 1000
-            }
-            response = requests.post("https://api.openai.com/v1/chat/completions", headers=headers, json=payload, timeout=60)
-        else:
+        request = _build_vision_request(prompt, file_bytes, model, provider, api_key)
+        if request is None:
             return "❌ Fournisseur vision non pris en charge."
+        url, kwargs = request
+        with metrics.span("vision", provider=provider, model=model):
+            response = _post(url, provider, model, **kwargs)
 
         if response.status_code != 200:
             try:
@@ -140,14 +422,125 @@ def query_llm_vision(prompt: str, file_bytes: bytes, model: str, provider: str,
             log(f"❌ Erreur Vision API {provider} : {response.status_code} - {err}")
             return f"❌ Erreur Vision API ({response.status_code}) : {err}"
 
-        data = response.json()
-        # OpenAI chat vision
-        if "choices" in data and data["choices"]:
-            msg = data["choices"][0].get("message", {}).get("content")
-            return msg.strip() if msg else "⚠️ Réponse vision vide."
-        # Ollama local
-        return data.get("response", "⚠️ Réponse vision vide.").strip()
+        return _parse_vision_response(response.json())
 
     except Exception as e:
         log(f"❌ Exception Vision : {e}")
         return f"❌ Erreur lors de l'appel au modèle vision : {e}"
+
+
+def _get_local_embedder():
+    """Charge (une seule fois) le modèle sentence-transformers local."""
+    global _local_embedder
+    if _local_embedder is None:
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise RuntimeError(
+                "EMBED_BACKEND=local nécessite le paquet sentence-transformers"
+            ) from e
+        log(f"📦 Chargement du modèle d'embedding local {EMBED_MODEL}...")
+        _local_embedder = SentenceTransformer(EMBED_MODEL, device="cpu")
+    return _local_embedder
+
+
+def embed_texts(texts: list, model: str = None) -> list:
+    """
+    Calcule les embeddings d'une liste de textes et retourne une liste de vecteurs.
+    Lève une RuntimeError si le backend d'embedding est indisponible.
+    """
+    model = model or EMBED_MODEL
+    if not texts:
+        return []
+
+    with metrics.span("embedding", backend=EMBED_BACKEND, model=model, texts=len(texts)):
+        if EMBED_BACKEND == "local":
+            embedder = _get_local_embedder()
+            return embedder.encode(list(texts), batch_size=EMBED_BATCH_SIZE).tolist()
+
+        vectors = []
+        for i in range(0, len(texts), EMBED_BATCH_SIZE):
+            batch = list(texts[i:i + EMBED_BATCH_SIZE])
+            try:
+                response = _post(OLLAMA_EMBED_URL, "Ollama (local)", model,
+                                 json={"model": model, "input": batch, "keep_alive": _keep_alive()})
+            except Exception as e:
+                raise RuntimeError(f"Appel embeddings Ollama impossible : {e}") from e
+            if response.status_code != 200:
+                raise RuntimeError(f"Erreur embeddings Ollama ({response.status_code}) : {response.text}")
+            embeddings = response.json().get("embeddings", [])
+            if len(embeddings) != len(batch):
+                raise RuntimeError("Réponse embeddings Ollama incomplète.")
+            vectors.extend(embeddings)
+        return vectors
+
+
+class LLMSession:
+    """
+    Échange suivi avec un modèle Ollama sur un même document : le `context` renvoyé par
+    /api/generate est repris par la question suivante, qui n'envoie plus que la question.
+    Le serveur prolonge la séquence déjà traitée au lieu de retraiter tout le document.
+    """
+
+    def __init__(self, model: str):
+        self.model = model
+        self.context = None
+        self.turns = 0
+        self.used = time.time()
+
+    def prompt(self, full_prompt: str, followup_prompt: str, output_tokens: int = budget.ANSWER_OUTPUT_TOKENS) -> str:
+        """Prompt à envoyer : la suite de l'échange s'il tient encore dans le contexte, sinon le prompt complet."""
+        if self.context:
+            window = budget.known_context_window(self.model, ollama_pool.OLLAMA_PROVIDER)
+            if window and len(self.context) + count_tokens(followup_prompt) + output_tokens <= window:
+                log(f"♻️ Session reprise ({self.turns} échange(s), {len(self.context)} tokens déjà traités).")
+                return followup_prompt
+            log("♻️ Contexte de session plein : le document est renvoyé en entier.")
+            self.context = None
+        return full_prompt
+
+    def update(self, context, status: str) -> None:
+        """Retient le contexte de la dernière réponse complète ; une erreur clôt l'échange."""
+        self.used = time.time()
+        if context:
+            self.context = context
+            self.turns += 1
+        elif status != "cancelled":
+            self.context = None
+            self.turns = 0
+
+
+def get_session(key: str, model: str, provider: str):
+    """Session de (clé, modèle), créée au besoin ; None hors Ollama (pas de `context` réutilisable)."""
+    if provider != ollama_pool.OLLAMA_PROVIDER:
+        return None
+    now = time.time()
+    with _sessions_lock:
+        for old_key in [k for k, s in _sessions.items() if now - s.used > SESSION_TTL]:
+            del _sessions[old_key]
+        session = _sessions.get((key, model))
+        if session is None:
+            session = _sessions[(key, model)] = LLMSession(model)
+        _sessions.move_to_end((key, model))
+        while len(_sessions) > SESSION_MAX:
+            _sessions.popitem(last=False)
+        return session
+
+
+def preload_model(model: str, provider: str) -> str:
+    """
+    Charge le modèle en mémoire (requête sans prompt) pour que la première question ne
+    paie pas le chargement ; mêmes options que les appels suivants (pas de rechargement).
+    """
+    if provider != ollama_pool.OLLAMA_PROVIDER or not model:
+        return ""
+    start = time.time()
+    budget.get_context_window(model, provider)
+    try:
+        response = _post(OLLAMA_URL, provider, model, json=_ollama_payload(model))
+        response.raise_for_status()
+    except Exception as e:
+        log(f"⚠️ Préchargement de {model} impossible : {e}")
+        return f"⚠️ Préchargement de {model} impossible."
+    log(f"🔥 Modèle {model} chargé en {time.time() - start:.2f}s (keep_alive {OLLAMA_KEEP_ALIVE}).")
+    return f"🔥 {model} prêt."
@@ -1,11 +1,50 @@
+import sys
 import threading
 import time
-import torch
 import logging
+import contextvars
+from contextlib import contextmanager
 
 # Event global pour stopper les opérations
 stop_event = threading.Event()
 
+
+class CancelToken:
+    """
+    Jeton d'annulation d'une tâche : levé par son propre arrêt ou par l'arrêt global.
+    Un jeton enfant (`parent`) est aussi levé par l'annulation de son parent.
+    """
+
+    def __init__(self, parent=None):
+        self._event = threading.Event()
+        self._parent = parent
+
+    def set(self) -> None:
+        self._event.set()
+
+    def is_set(self) -> bool:
+        return (self._event.is_set() or stop_event.is_set()
+                or (self._parent is not None and self._parent.is_set()))
+
+
+# Jeton de la tâche en cours d'exécution (propagé aux threads des étapes du pipeline)
+_current_cancel = contextvars.ContextVar("current_cancel", default=None)
+
+
+def current_cancel():
+    """Jeton d'annulation de la tâche courante, ou stop_event hors tâche."""
+    return _current_cancel.get() or stop_event
+
+
+@contextmanager
+def cancel_scope(token: CancelToken):
+    """Rend `token` courant pour le code exécuté dans le bloc."""
+    reset = _current_cancel.set(token)
+    try:
+        yield token
+    finally:
+        _current_cancel.reset(reset)
+
 # Configuration du logging
 LOG_FILE = "nutricoach.log"
 logging.basicConfig(
@@ -31,8 +70,12 @@ def stop_operations() -> None:
     log(f"[{time.strftime('%H:%M:%S')}] 🛑 Demande d'arrêt reçue. Tentative de libération des ressources...")
 
     try:
-        # Libération mémoire GPU
-        if torch.cuda.is_available():
+        # Libération mémoire GPU : seulement si torch est déjà chargé (sans lui, rien n'est
+        # alloué sur le GPU par ce processus, et l'importer prendrait plusieurs secondes)
+        torch = sys.modules.get("torch")
+        if torch is None:
+            log(f"[{time.strftime('%H:%M:%S')}] ⚠️ torch non chargé, pas de mémoire GPU à libérer.")
+        elif torch.cuda.is_available():
             torch.cuda.empty_cache()
             log(f"[{time.strftime('%H:%M:%S')}] ✅ Mémoire GPU libérée.")
         else:
@@ -0,0 +1,124 @@
+# meal_planner.py
+
+import numpy as np
+from food_store import FoodStore
+
+DAYS = ("Lundi", "Mardi", "Mercredi", "Jeudi", "Vendredi", "Samedi", "Dimanche")
+# Nombre maximal d'aliments par repas et portion maximale d'un aliment (g)
+MAX_FOODS_PER_MEAL = 4
+MAX_PORTION_G = 400
+PORTION_STEP_G = 5
+# Poids relatifs des écarts (kcal, protéines, glucides, lipides) dans l'ajustement
+TARGET_WEIGHTS = np.array([1.0, 1.5, 1.0, 1.0])
+
+
+def nnls(A: np.ndarray, b: np.ndarray, max_iter: int = 100) -> np.ndarray:
+    """Moindres carrés non négatifs (Lawson-Hanson) : min ||Ax - b|| avec x >= 0."""
+    n = A.shape[1]
+    x = np.zeros(n)
+    passive = np.zeros(n, dtype=bool)
+    w = A.T @ (b - A @ x)
+    for _ in range(max_iter):
+        if passive.all() or w[~passive].max(initial=0) <= 1e-10:
+            break
+        passive[np.argmax(np.where(passive, -np.inf, w))] = True
+        while True:
+            z = np.zeros(n)
+            z[passive] = np.linalg.lstsq(A[:, passive], b, rcond=None)[0]
+            if (z[passive] > 0).all():
+                x = z
+                break
+            # Recul jusqu'à la frontière x >= 0, puis retrait des variables nulles
+            neg = passive & (z <= 0)
+            alpha = np.min(x[neg] / np.maximum(x[neg] - z[neg], 1e-12))
+            x = x + alpha * (z - x)
+            passive &= x > 1e-10
+        w = A.T @ (b - A @ x)
+    return x
+
+
+def _fit(A: np.ndarray, target: np.ndarray):
+    """Portions (en centaines de g) et erreur relative pondérée pour un ensemble d'aliments."""
+    scale = TARGET_WEIGHTS / np.maximum(target, 1.0)
+    x = np.minimum(nnls(A * scale[:, None], target * scale), MAX_PORTION_G / 100)
+    error = np.linalg.norm((A @ x - target) * scale)
+    return x, error
+
+
+def plan_meal(store: FoodStore, candidates: np.ndarray, target: np.ndarray, exclude: set = frozenset()) -> list:
+    """
+    Choisit (glouton) jusqu'à MAX_FOODS_PER_MEAL aliments parmi les candidats et leurs
+    portions (NNLS) pour approcher la cible [kcal, protéines, glucides, lipides] du repas.
+    Retourne [(indice aliment, grammes)].
+    """
+    pool = [i for i in candidates if i not in exclude] or list(candidates)
+    nutrients = store.matrix[:, :4].T  # (4, n) valeurs pour 100 g
+    chosen, best_error = [], np.linalg.norm(TARGET_WEIGHTS)
+    while len(chosen) < MAX_FOODS_PER_MEAL:
+        best = None
+        for i in pool:
+            if i in chosen:
+                continue
+            _, error = _fit(nutrients[:, chosen + [i]], target)
+            if best is None or error < best[1]:
+                best = (i, error)
+        # On s'arrête quand un aliment de plus n'améliore plus sensiblement l'ajustement
+        if best is None or best[1] > best_error * 0.97:
+            break
+        chosen.append(best[0])
+        best_error = best[1]
+
+    if not chosen:
+        return []
+    x, _ = _fit(nutrients[:, chosen], target)
+    grams = np.round(x * 100 / PORTION_STEP_G) * PORTION_STEP_G
+    return [(i, int(g)) for i, g in zip(chosen, grams) if g > 0]
+
+
+def plan_week(store: FoodStore, protein: float, carbs: float, fats: float, kcal: float,
+              meals: int, diet_type: str = "Standard", days: int = 7) -> list:
+    """
+    Plan de `days` jours × `meals` repas. Pour varier, un aliment n'est pas repris deux fois
+    le même jour ni au même repas que la veille. Retourne [[[(indice, grammes)]]] (jour, repas).
+    """
+    target = np.array([kcal, protein, carbs, fats]) / meals
+    candidates = store.candidates(target[1], target[2], target[3], diet_type)
+    plan = []
+    for day in range(days):
+        day_meals, used_today = [], set()
+        for meal in range(meals):
+            yesterday = {i for i, _ in plan[day - 1][meal]} if day else set()
+            portions = plan_meal(store, candidates, target, used_today | yesterday)
+            used_today.update(i for i, _ in portions)
+            day_meals.append(portions)
+        plan.append(day_meals)
+    return plan
+
+
+def meal_totals(store: FoodStore, portions: list) -> np.ndarray:
+    """Apports [kcal, protéines, glucides, lipides] d'une liste de portions."""
+    totals = np.zeros(4)
+    for i, grams in portions:
+        totals += store.matrix[i, :4] * grams / 100
+    return totals
+
+
+def plan_to_markdown(store: FoodStore, plan: list, daily_target: np.ndarray) -> str:
+    """Tableau markdown du plan, avec le total de chaque jour comparé à la cible."""
+    lines = [
+        "| Jour | Repas | Aliment | Quantité (g) | kcal | Protéines (g) | Glucides (g) | Lipides (g) |",
+        "|---|---|---|---|---|---|---|---|",
+    ]
+    for day, day_meals in enumerate(plan):
+        day_total = np.zeros(4)
+        for meal, portions in enumerate(day_meals):
+            for i, grams in portions:
+                k, p, c, f = store.matrix[i, :4] * grams / 100
+                lines.append(f"| {DAYS[day % 7]} | {meal + 1} | {store.names[i]} | {grams} | "
+                             f"{k:.0f} | {p:.1f} | {c:.1f} | {f:.1f} |")
+            day_total += meal_totals(store, portions)
+        k, p, c, f = day_total
+        tk, tp, tc, tf = daily_target
+        lines.append(f"| **{DAYS[day % 7]}** | **Total** | (cible {tk:.0f} kcal, {tp:.0f}/{tc:.0f}/{tf:.0f} g) | | "
+                     f"**{k:.0f}** | **{p:.1f}** | **{c:.1f}** | **{f:.1f}** |")
+    return "\n".join(lines)
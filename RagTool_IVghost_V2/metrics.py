@@ -0,0 +1,253 @@
+# metrics.py
+
+import os
+import json
+import time
+import uuid
+import threading
+import contextvars
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from logging_utils import log
+
+# === Configuration de l'instrumentation ===
+# Port de l'endpoint Prometheus (/metrics) ; 0 le désactive
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9464"))
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+# Fichier JSONL des spans (une ligne par étape) ; vide = pas d'export
+TRACE_FILE = os.getenv("TRACE_FILE", "")
+
+# Bornes des histogrammes (secondes, puis tokens/s)
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+RATE_BUCKETS = (1, 2, 5, 10, 20, 30, 50, 75, 100, 150, 250, 500)
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self.kind = "counter"
+        self.values = {}  # {(label, valeur)...: total}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, dict(key), value) for key, value in self.values.items()]
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets: tuple = DURATION_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.kind = "histogram"
+        self.buckets = buckets
+        self.values = {}  # {labels: [compteurs par borne..., somme, nombre]}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            entry = self.values.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[i] += 1
+            entry[-2] += value
+            entry[-1] += 1
+
+    def samples(self):
+        with self._lock:
+            items = [(dict(key), list(entry)) for key, entry in self.values.items()]
+        samples = []
+        for labels, entry in items:
+            for bound, count in zip(self.buckets, entry):
+                samples.append((f"{self.name}_bucket", {**labels, "le": f"{bound:g}"}, count))
+            samples.append((f"{self.name}_bucket", {**labels, "le": "+Inf"}, entry[-1]))
+            samples.append((f"{self.name}_sum", labels, entry[-2]))
+            samples.append((f"{self.name}_count", labels, entry[-1]))
+        return samples
+
+
+stage_seconds = Histogram("rag_stage_seconds", "Durée des étapes (extraction, chunking, embedding, recherche, LLM...)")
+llm_requests = Counter("rag_llm_requests_total", "Appels LLM par fournisseur, modèle et issue")
+llm_queue_wait = Histogram("rag_llm_queue_wait_seconds", "Attente avant l'envoi (plafond de concurrence, débit)")
+llm_ttft = Histogram("rag_llm_ttft_seconds", "Délai avant le premier token")
+llm_tokens = Counter("rag_llm_tokens_total", "Tokens envoyés (in) et générés (out)")
+llm_tokens_per_second = Histogram("rag_llm_tokens_per_second", "Débit de génération", RATE_BUCKETS)
+cache_requests = Counter("rag_cache_requests_total", "Accès aux caches (documents, réponses LLM)")
+REGISTRY = (stage_seconds, llm_requests, llm_queue_wait, llm_ttft, llm_tokens, llm_tokens_per_second, cache_requests)
+
+
+# === Spans ===
+_current_span = contextvars.ContextVar("current_span", default=None)
+_trace_lock = threading.Lock()
+
+
+class Span:
+    """
+    Étape mesurée : durée dans l'histogramme rag_stage_seconds et, si TRACE_FILE est défini,
+    une ligne JSON (trace, parent, durée, attributs) à la fin.
+    """
+
+    def __init__(self, stage: str, **attributes):
+        parent = _current_span.get()
+        self.stage = stage
+        self.trace = parent.trace if parent else uuid.uuid4().hex[:16]
+        self.id = uuid.uuid4().hex[:8]
+        self.parent = parent.id if parent else None
+        self.attributes = dict(attributes)
+        self.start = time.time()
+
+    def end(self, status: str = "ok") -> float:
+        duration = time.time() - self.start
+        stage_seconds.observe(duration, stage=self.stage)
+        if TRACE_FILE:
+            _export({
+                "trace": self.trace, "span": self.id, "parent": self.parent, "stage": self.stage,
+                "start": round(self.start, 6), "duration": round(duration, 6), "status": status,
+                "thread": threading.current_thread().name, **self.attributes,
+            })
+        return duration
+
+
+def current_span():
+    """Attributs du span en cours (dict), ou None hors instrumentation."""
+    current = _current_span.get()
+    return current.attributes if current else None
+
+
+def annotate(**attributes) -> None:
+    """Ajoute des attributs au span en cours (sans effet hors span)."""
+    attrs = current_span()
+    if attrs is not None:
+        attrs.update(attributes)
+
+
+@contextmanager
+def span(stage: str, **attributes):
+    """
+    Mesure le bloc comme une étape, qui devient le parent des spans ouverts à l'intérieur.
+    Le bloc reçoit le dict d'attributs pour le compléter (tokens, nombre de chunks...).
+    Dans un générateur, utiliser Span(...).end() : le contexte ne doit pas rester
+    positionné entre deux yield.
+    """
+    current = Span(stage, **attributes)
+    reset = _current_span.set(current)
+    status = "ok"
+    try:
+        yield current.attributes
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        _current_span.reset(reset)
+        current.end(status)
+
+
+def _export(record: dict) -> None:
+    try:
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with _trace_lock, open(TRACE_FILE, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+    except OSError as e:
+        log(f"⚠️ Export de trace impossible : {e}")
+
+
+# === Enregistrements spécialisés ===
+def observe_queue_wait(provider: str, seconds: float) -> None:
+    llm_queue_wait.observe(seconds, provider=provider)
+    attrs = current_span()
+    if attrs is not None:
+        attrs["queue_wait_s"] = round(attrs.get("queue_wait_s", 0.0) + seconds, 4)
+
+
+def observe_llm(provider: str, model: str, status: str = "ok", ttft: float = None, tokens_in: int = None,
+                tokens_out: int = None, generation_seconds: float = None, attributes: dict = None) -> None:
+    """
+    Compteurs d'un appel LLM terminé ; tokens/s calculés sur la seule phase de génération.
+    Les valeurs sont aussi ajoutées à `attributes` (par défaut, le span en cours).
+    """
+    model = model or ""
+    llm_requests.inc(provider=provider, model=model, status=status)
+    rate = None
+    if ttft is not None:
+        llm_ttft.observe(ttft, provider=provider, model=model)
+    if tokens_in:
+        llm_tokens.inc(tokens_in, provider=provider, model=model, direction="in")
+    if tokens_out:
+        llm_tokens.inc(tokens_out, provider=provider, model=model, direction="out")
+        if generation_seconds:
+            rate = tokens_out / generation_seconds
+            llm_tokens_per_second.observe(rate, provider=provider, model=model)
+    attributes = current_span() if attributes is None else attributes
+    if attributes is not None:
+        attributes.update(status=status, ttft_s=ttft and round(ttft, 4), tokens_in=tokens_in,
+                          tokens_out=tokens_out, tokens_per_s=rate and round(rate, 1))
+
+
+def count_cache(cache: str, hit: bool, namespace: str = "") -> None:
+    """Accès à un cache ; `namespace` distingue les types d'entrées (texte, chunks, embeddings...)."""
+    result = "hit" if hit else "miss"
+    cache_requests.inc(cache=cache, namespace=namespace, result=result)
+    annotate(**{f"cache_{namespace or cache}": result})
+
+
+# === Exposition Prometheus ===
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in sorted(labels.items())) + "}"
+
+
+def render() -> str:
+    """Toutes les métriques au format texte Prometheus."""
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for name, labels, value in metric.samples():
+            lines.append(f"{name}{_format_labels(labels)} {value:g}")
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass  # pas de ligne de log par scrape
+
+
+_server = None
+
+
+def start_metrics_server(port: int = METRICS_PORT, host: str = METRICS_HOST):
+    """Démarre (une seule fois) l'endpoint /metrics dans un thread ; retourne le serveur ou None."""
+    global _server
+    if _server is not None or not port:
+        return _server
+    try:
+        _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    except OSError as e:
+        log(f"⚠️ Endpoint de métriques indisponible sur {host}:{port} : {e}")
+        return None
+    _server.daemon_threads = True
+    threading.Thread(target=_server.serve_forever, name="metrics", daemon=True).start()
+    log(f"📈 Métriques Prometheus sur http://{host}:{port}/metrics")
+    return _server
@@ -1,121 +1,145 @@
 # nutrition.py
 
 import time
-import json
-import pandas as pd
-import requests
-from logging_utils import log, stop_event
-from file_utils import load_csv_safely, clean_nutrition_data
-from llm_client import query_llm, OLLAMA_URL
+import numpy as np
+import budget
+from logging_utils import log, current_cancel
+from food_store import load_food_store
+from meal_planner import plan_week, plan_to_markdown, meal_totals
+from llm_client import query_llm_stream
+from chunking import count_tokens
+
+# Tokens réservés au commentaire du plan par le LLM
+COMMENT_OUTPUT_TOKENS = 400
+
+# Répartition par défaut des calories entre macros (part, kcal par gramme)
+MACRO_SPLIT = {"protein": (0.3, 4), "carbs": (0.4, 4), "fats": (0.3, 9)}
+
 
 def calculate_missing_macros(protein, carbs, fats, kcal):
+    """
+    Complète les valeurs nutritionnelles non saisies ; les valeurs saisies sont conservées.
+    - sans objectif calorique : macros manquantes à 0, kcal calculées depuis les macros ;
+    - avec objectif calorique : le reste des calories est réparti entre les macros
+      manquantes selon MACRO_SPLIT.
+    """
     try:
-        p = float(protein) if protein not in [None, ""] else None
-        c = float(carbs)    if carbs    not in [None, ""] else None
-        f = float(fats)     if fats     not in [None, ""] else None
-        k = float(kcal)     if kcal     not in [None, ""] else None
-
-        # Si toutes les macros sont fournies
-        if all(v is not None for v in [p, c, f]):
-            return p, c, f, p*4 + c*4 + f*9
-
-        # Si kcal fourni seul ou partiellement
-        if k:
-            known = sum([p*4 if p else 0, c*4 if c else 0, f*9 if f else 0])
-            remaining = k - known
-            missing = sum(1 for v in [p, c, f] if v is None)
-
-            if missing == 1:
-                if p is None: p = remaining/4
-                elif c is None: c = remaining/4
-                else: f = remaining/9
-            elif missing == 2:
-                if p is not None:
-                    c = (remaining*0.6)/4
-                    f = (remaining*0.4)/9
-                else:
-                    p = (remaining*0.3)/4
-                    c = (remaining*0.4)/4
-                    f = (remaining*0.3)/9
-            else:
-                p = (k*0.3)/4
-                c = (k*0.4)/4
-                f = (k*0.3)/9
-
-            return round(p,1), round(c,1), round(f,1), k
-
-        raise ValueError("Au moins un paramètre doit être fourni")
+        values = {
+            name: float(v) if v not in [None, ""] else None
+            for name, v in (("protein", protein), ("carbs", carbs), ("fats", fats))
+        }
+        k = float(kcal) if kcal not in [None, ""] else None
     except Exception as e:
         raise ValueError(f"Erreur de calcul: {e}")
 
-
-def generate_nutrition_plan(file, protein, carbs, fats, kcal, diet_type, model, meals):
+    missing = [name for name, v in values.items() if v is None]
+    if k is None:
+        if len(missing) == len(values):
+            raise ValueError("Au moins un paramètre doit être fourni")
+        for name in missing:
+            values[name] = 0.0
+        k = sum(values[name] * MACRO_SPLIT[name][1] for name in values)
+    elif missing:
+        known = sum(v * MACRO_SPLIT[name][1] for name, v in values.items() if v is not None)
+        remaining = max(0.0, k - known)
+        total_share = sum(MACRO_SPLIT[name][0] for name in missing)
+        for name in missing:
+            share, kcal_per_gram = MACRO_SPLIT[name]
+            values[name] = remaining * share / total_share / kcal_per_gram
+
+    return round(values["protein"], 1), round(values["carbs"], 1), round(values["fats"], 1), round(k, 1)
+
+
+def generate_nutrition_plan_stream(file, protein, carbs, fats, kcal, diet_type, model, meals):
+    """Génère le plan nutritionnel en streaming (handler Gradio générateur)."""
     start = time.time()
     log("🔄 Début génération plan nutritionnel…")
 
-    if stop_event.is_set():
-        return "❌ Opération annulée."
+    if current_cancel().is_set():
+        yield "❌ Opération annulée."
+        return
 
     # Validation du fichier
     if file is None:
-        return "❌ Veuillez télécharger un fichier."
+        yield "❌ Veuillez télécharger un fichier."
+        return
     path = getattr(file, "name", None)
     if not path:
-        return "❌ Fichier non valide."
+        yield "❌ Fichier non valide."
+        return
 
-    # Conversion des inputs
+    # Conversion des inputs (macros ou calories manquantes déduites des autres valeurs)
     try:
-        protein = float(protein) if protein not in [None, ""] else 0
-        carbs   = float(carbs)   if carbs   not in [None, ""] else 0
-        fats    = float(fats)    if fats    not in [None, ""] else 0
-        kcal    = float(kcal)    if kcal    not in [None, ""] else (protein*4 + carbs*4 + fats*9)
-    except:
-        return "❌ Valeurs nutritionnelles incorrectes."
+        protein, carbs, fats, kcal = calculate_missing_macros(protein, carbs, fats, kcal)
+        if kcal <= 0:
+            raise ValueError("objectif calorique nul")
+    except ValueError as e:
+        yield f"❌ Valeurs nutritionnelles incorrectes ({e})."
+        return
 
     try:
         meals = int(meals)
         if meals <= 0:
             raise ValueError()
     except:
-        return "❌ Nombre de repas invalide."
+        yield "❌ Nombre de repas invalide."
+        return
 
-    # Chargement des données aliments
+    # Chargement des données aliments (table analysée une seule fois, puis en cache)
+    if not path.endswith((".csv", ".json", ".xlsx")):
+        yield "❌ Format de fichier non supporté."
+        return
     try:
-        if path.endswith(".csv"):
-            df = load_csv_safely(path)
-        elif path.endswith(".json"):
-            df = clean_nutrition_data(path)
-        elif path.endswith(".xlsx"):
-            df = pd.read_excel(path)
-        else:
-            return "❌ Format de fichier non supporté."
+        store = load_food_store(path)
     except Exception as e:
-        return f"❌ Erreur lecture fichier : {e}"
-
-    records = df.head(20).to_dict("records")
-    log(f"✅ {len(records)} aliments chargés.")
-
-    # Construction du prompt
-    prompt = (
-        f"Tu es un assistant expert en nutrition. Génère un plan alimentaire sur 7 jours, "
-        f"{meals} repas/jour, en respectant ces macros quotidiennes :\n"
-        f"- {kcal:.0f} kcal\n"
-        f"- {protein:.1f} g protéines ({protein/meals:.1f}g/repas)\n"
-        f"- {carbs:.1f} g glucides ({carbs/meals:.1f}g/repas)\n"
-        f"- {fats:.1f} g lipides ({fats/meals:.1f}g/repas)\n\n"
-        "Utilise uniquement ces aliments (quantité en g) :\n" +
-        json.dumps(records, indent=2) +
-        "\n\nAffiche seulement un tableau sans explications, au format markdown."
-    )
-
-    response = requests.post(
-        OLLAMA_URL,
-        json={"model": model, "prompt": prompt, "stream": False}
-    )
-    if response.status_code != 200:
-        return f"❌ Erreur API nutrition ({response.status_code}) : {response.text}"
-
-    result = response.json().get("response", "").strip()
+        yield f"❌ Erreur lecture fichier : {e}"
+        return
+
+    # Calcul local des portions : glouton + moindres carrés non négatifs sur la matrice d'aliments
+    plan = plan_week(store, protein, carbs, fats, kcal, meals, diet_type)
+    if not any(portions for day in plan for portions in day):
+        yield f"❌ Aucun aliment compatible avec le régime {diet_type}."
+        return
+    daily_target = np.array([kcal, protein, carbs, fats])
+    table = plan_to_markdown(store, plan, daily_target)
+    log(f"✅ Portions calculées en {time.time() - start:.2f}s.")
+    yield table
+
+    # Le LLM ne fait que commenter le plan calculé (prompt court, pas d'arithmétique)
+    average = np.mean([sum(meal_totals(store, p) for p in day) for day in plan], axis=0)
+    foods = sorted({store.names[i] for day in plan for portions in day for i, _ in portions})
+
+    def comment_prompt(names):
+        return (
+            f"Tu es un assistant expert en nutrition. Voici un plan alimentaire de 7 jours "
+            f"({meals} repas/jour, régime {diet_type}) déjà calculé.\n"
+            f"Cible quotidienne : {kcal:.0f} kcal, {protein:.0f} g protéines, {carbs:.0f} g glucides, {fats:.0f} g lipides.\n"
+            f"Moyenne obtenue : {average[0]:.0f} kcal, {average[1]:.0f} g protéines, "
+            f"{average[2]:.0f} g glucides, {average[3]:.0f} g lipides.\n"
+            f"Aliments utilisés : {', '.join(names)}.\n\n"
+            "En 3 à 5 phrases, commente l'équilibre de ce plan et donne un conseil de préparation. "
+            "Ne recalcule pas les quantités."
+        )
+
+    # Liste d'aliments raccourcie si le prompt dépasse le contexte du modèle
+    prompt = comment_prompt(foods)
+    shown = len(foods)
+    while shown > 1 and not budget.fits(prompt, model, "Ollama (local)", COMMENT_OUTPUT_TOKENS):
+        shown //= 2
+        prompt = comment_prompt(foods[:shown] + [f"et {len(foods) - shown} autres"])
+    budget.PromptPlan("single_shot", budget.get_context_window(model, "Ollama (local)"),
+                      count_tokens(prompt), 1).log("Commentaire du plan")
+    result = table + "\n\n### Commentaire\n"
+    for piece in query_llm_stream(prompt, model, "Ollama (local)", ""):
+        result += piece
+        yield result
     duration = time.time() - start
     log(f"✅ Plan généré en {duration:.2f}s.")
-    return result
+
+
+def generate_nutrition_plan(file, protein, carbs, fats, kcal, diet_type, model, meals):
+    """Génère le plan nutritionnel et retourne le tableau complet."""
+    result = ""
+    for result in generate_nutrition_plan_stream(file, protein, carbs, fats, kcal, diet_type, model, meals):
+        pass
+    return result.strip()
@@ -0,0 +1,130 @@
+# ocr.py
+
+import io
+import os
+import asyncio
+import hashlib
+import metrics
+from logging_utils import log, current_cancel
+from doc_cache import document_cache
+from pdf_extract import iter_pdf_pages
+from pipeline import get_concurrency
+from async_llm import aquery_llm_vision, map_ordered_async
+
+# === Configuration OCR des pages scannées ===
+# OCR_BACKEND : "vision" (modèle vision du fournisseur), "tesseract" (pytesseract local) ou "none"
+OCR_BACKEND = os.getenv("OCR_BACKEND", "vision").lower()
+VISION_MODEL = os.getenv("VISION_MODEL", "llama3.2-vision")
+VISION_PROVIDER = os.getenv("VISION_PROVIDER", "Ollama (local)")
+VISION_API_KEY = os.getenv("VISION_API_KEY", "")
+TESSERACT_LANG = os.getenv("TESSERACT_LANG", "fra")
+# Une page dont le texte extrait fait moins de OCR_MIN_CHARS caractères est considérée comme scannée
+OCR_MIN_CHARS = int(os.getenv("OCR_MIN_CHARS", "25"))
+# Rendu des pages : résolution, plus grand côté envoyé (px), qualité JPEG
+OCR_DPI = int(os.getenv("OCR_DPI", "150"))
+OCR_MAX_SIDE = int(os.getenv("OCR_MAX_SIDE", "1600"))
+OCR_JPEG_QUALITY = int(os.getenv("OCR_JPEG_QUALITY", "80"))
+# Pages transcrites simultanément (0 : plafond de concurrence du fournisseur vision)
+OCR_CONCURRENCY = int(os.getenv("OCR_CONCURRENCY", "0"))
+# Dossier des binaires poppler (Windows), sinon recherchés dans le PATH
+POPPLER_PATH = os.getenv("POPPLER_PATH") or None
+
+OCR_PROMPT = (
+    "Transcris fidèlement tout le texte de cette page de document scanné, dans l'ordre de lecture. "
+    "Conserve les titres et les numéros d'articles. Réponds uniquement par le texte transcrit."
+)
+
+
+def is_enabled() -> bool:
+    return OCR_BACKEND in ("vision", "tesseract")
+
+
+def needs_ocr(text: str) -> bool:
+    """Page sans couche texte exploitable (scan, image)."""
+    return len(text.strip()) < OCR_MIN_CHARS
+
+
+def render_page(file_path: str, index: int) -> bytes:
+    """Rend une seule page en JPEG niveaux de gris, réduite à OCR_MAX_SIDE pixels au plus."""
+    from pdf2image import convert_from_path
+
+    image = convert_from_path(
+        file_path, dpi=OCR_DPI, first_page=index + 1, last_page=index + 1,
+        grayscale=True, poppler_path=POPPLER_PATH,
+    )[0]
+    image.thumbnail((OCR_MAX_SIDE, OCR_MAX_SIDE))
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=OCR_JPEG_QUALITY, optimize=True)
+    return buffer.getvalue()
+
+
+def _tesseract(image_bytes: bytes) -> str:
+    try:
+        import pytesseract
+        from PIL import Image
+    except ImportError as e:
+        raise RuntimeError("OCR_BACKEND=tesseract nécessite le paquet pytesseract") from e
+    return pytesseract.image_to_string(Image.open(io.BytesIO(image_bytes)), lang=TESSERACT_LANG)
+
+
+async def _recognize(image_bytes: bytes) -> str:
+    if OCR_BACKEND == "tesseract":
+        return await asyncio.to_thread(_tesseract, image_bytes)
+    text = await aquery_llm_vision(OCR_PROMPT, image_bytes, VISION_MODEL, VISION_PROVIDER, VISION_API_KEY)
+    if text.startswith(("❌", "⚠️")):
+        raise RuntimeError(text)
+    return text
+
+
+async def ocr_page(file_path: str, index: int) -> str:
+    """
+    Texte d'une page scannée : rendu, puis transcription mise en cache par hash de l'image
+    (une même page présente dans plusieurs fichiers n'est transcrite qu'une fois).
+    Retourne "" en cas d'échec.
+    """
+    with metrics.span("ocr", backend=OCR_BACKEND, page=index + 1) as attrs:
+        try:
+            image = await asyncio.to_thread(render_page, file_path, index)
+            page_hash = hashlib.sha256(image).hexdigest()
+            key = document_cache.make_key(
+                "ocr", page_hash, backend=OCR_BACKEND,
+                model=VISION_MODEL if OCR_BACKEND == "vision" else TESSERACT_LANG,
+            )
+            text = await asyncio.to_thread(document_cache.get_json, key)
+            if text is None:
+                text = (await _recognize(image)).strip()
+                if text:
+                    await asyncio.to_thread(document_cache.put_json, key, text)
+            attrs.update(image_bytes=len(image), chars=len(text))
+            return text
+        except Exception as e:
+            log(f"⚠️ OCR de la page {index + 1} impossible : {e}")
+            return ""
+
+
+def iter_pages_with_ocr(file_path: str, cancel=None):
+    """
+    iter_pdf_pages complété par l'OCR : seules les pages sans texte sont rendues puis
+    transcrites, par lots de concurrence bornée ; les pages restent dans l'ordre.
+    """
+    cancel = cancel or current_cancel()
+    pages = iter_pdf_pages(file_path, cancel)
+    if not is_enabled():
+        yield from pages
+        return
+
+    scanned = []
+
+    async def page_text(item):
+        index, text = item
+        if not needs_ocr(text):
+            return text
+        scanned.append(index)
+        return await ocr_page(file_path, index) or text
+
+    workers = OCR_CONCURRENCY or get_concurrency(VISION_PROVIDER)
+    try:
+        yield from map_ordered_async(enumerate(pages), page_text, workers, cancel)
+    finally:
+        if scanned:
+            log(f"🖼️ {len(scanned)} page(s) sans texte transcrite(s) par OCR ({OCR_BACKEND}).")
@@ -0,0 +1,191 @@
+# ollama_pool.py
+
+import os
+import time
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+import requests
+import http_client
+from logging_utils import log
+
+# Serveurs Ollama disponibles, séparés par des virgules
+OLLAMA_HOSTS = [
+    h.strip().rstrip("/")
+    for h in os.getenv("OLLAMA_HOSTS", "http://localhost:11434").split(",")
+    if h.strip()
+]
+# Intervalle entre deux sondes /api/tags de chaque serveur (secondes)
+HEALTH_INTERVAL = float(os.getenv("OLLAMA_HEALTH_INTERVAL", "15"))
+# Écart de charge toléré pour rester sur un serveur qui a déjà le modèle en mémoire
+AFFINITY_SLACK = int(os.getenv("OLLAMA_AFFINITY_SLACK", "2"))
+# Nombre de modèles récemment servis mémorisés par serveur
+WARM_MODELS = 3
+
+OLLAMA_PROVIDER = "Ollama (local)"
+
+
+class OllamaEndpoint:
+    """État d'un serveur Ollama : santé, requêtes en cours, modèles disponibles et chauds."""
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+        self.healthy = True
+        self.outstanding = 0
+        self.models = None  # noms renvoyés par /api/tags (None tant que non sondé)
+        self.warm = []  # modèles servis récemment, du plus ancien au plus récent
+        self.last_error = None
+        self.failed_at = 0.0
+
+    def url_for(self, url: str) -> str:
+        """Réécrit une URL Ollama logique (ex. OLLAMA_URL) vers ce serveur."""
+        parts = urlsplit(url)
+        return f"{self.base_url}{parts.path}" + (f"?{parts.query}" if parts.query else "")
+
+
+class OllamaPool:
+    """
+    Répartiteur de charge entre serveurs Ollama : moins de requêtes en cours d'abord,
+    affinité de modèle (évite les rechargements), bascule automatique en cas de panne.
+    """
+
+    def __init__(self, hosts: list):
+        self.endpoints = [OllamaEndpoint(h) for h in hosts]
+        self._lock = threading.Lock()
+        self._checker = None
+
+    # --- Santé ---
+    def probe(self, endpoint: OllamaEndpoint) -> bool:
+        """Sonde /api/tags d'un serveur et met à jour son état."""
+        try:
+            res = http_client.probe(f"{endpoint.base_url}/api/tags")
+            ok = res.status_code == 200
+            models = [m["name"] for m in res.json().get("models", [])] if ok else None
+        except Exception as e:
+            ok, models = False, None
+            endpoint.last_error = str(e)
+        with self._lock:
+            if ok:
+                endpoint.models = models
+                if not endpoint.healthy:
+                    log(f"🟢 Serveur Ollama {endpoint.base_url} de nouveau disponible.")
+            elif endpoint.healthy:
+                log(f"🔴 Serveur Ollama {endpoint.base_url} indisponible.")
+                endpoint.failed_at = time.time()
+            endpoint.healthy = ok
+        return ok
+
+    def check_all(self) -> int:
+        """Sonde tous les serveurs et retourne le nombre de serveurs disponibles."""
+        return sum(self.probe(e) for e in self.endpoints)
+
+    def _health_loop(self) -> None:
+        while True:
+            time.sleep(HEALTH_INTERVAL)
+            self.check_all()
+
+    def start_health_checks(self) -> None:
+        """Démarre (une seule fois) le thread de sondes périodiques."""
+        with self._lock:
+            if self._checker is None:
+                self._checker = threading.Thread(target=self._health_loop, name="ollama-health", daemon=True)
+                self._checker.start()
+
+    def mark_down(self, endpoint: OllamaEndpoint, error: Exception) -> None:
+        """Marque un serveur indisponible après une erreur de connexion (sonde passive)."""
+        with self._lock:
+            if endpoint.healthy:
+                log(f"🔴 Serveur Ollama {endpoint.base_url} indisponible : {error}")
+            endpoint.healthy = False
+            endpoint.last_error = str(error)
+            endpoint.failed_at = time.time()
+
+    def healthy_count(self) -> int:
+        with self._lock:
+            return sum(1 for e in self.endpoints if e.healthy)
+
+    def available_models(self) -> list:
+        """Union des modèles des serveurs disponibles."""
+        with self._lock:
+            names = set()
+            for e in self.endpoints:
+                if e.healthy and e.models:
+                    names.update(e.models)
+        return sorted(names)
+
+    # --- Routage ---
+    def candidates(self, model: str = None) -> list:
+        """
+        Serveurs à essayer dans l'ordre : serveurs sains qui proposent le modèle, triés par
+        charge (avec préférence pour un serveur où le modèle est chaud), puis les autres
+        serveurs sains, puis les serveurs en panne en dernier recours.
+        """
+        self.start_health_checks()
+        with self._lock:
+            healthy = [e for e in self.endpoints if e.healthy]
+            with_model = [e for e in healthy if model is None or e.models is None or model in e.models]
+            primary = with_model or healthy
+            ordered = sorted(primary, key=lambda e: e.outstanding)
+            if model and ordered:
+                least = ordered[0].outstanding
+                warm = [e for e in ordered if model in e.warm and e.outstanding <= least + AFFINITY_SLACK]
+                if warm:
+                    ordered.remove(warm[0])
+                    ordered.insert(0, warm[0])
+            rest = sorted((e for e in healthy if e not in primary), key=lambda e: e.outstanding)
+            down = sorted((e for e in self.endpoints if not e.healthy), key=lambda e: e.failed_at)
+            return ordered + rest + down
+
+    @contextmanager
+    def track(self, endpoint: OllamaEndpoint, model: str = None):
+        """Compte une requête en cours sur un serveur et mémorise le modèle servi."""
+        with self._lock:
+            endpoint.outstanding += 1
+        try:
+            yield endpoint
+        finally:
+            with self._lock:
+                endpoint.outstanding -= 1
+                if model:
+                    if model in endpoint.warm:
+                        endpoint.warm.remove(model)
+                    endpoint.warm.append(model)
+                    del endpoint.warm[:-WARM_MODELS]
+
+    def post(self, url: str, model: str = None, **kwargs) -> requests.Response:
+        """POST vers le meilleur serveur, avec bascule sur le suivant en cas d'erreur réseau."""
+        last_error = None
+        for endpoint in self.candidates(model):
+            with self.track(endpoint, model):
+                try:
+                    return http_client.post(endpoint.url_for(url), OLLAMA_PROVIDER,
+                                            limit_key=endpoint.base_url, **kwargs)
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    self.mark_down(endpoint, e)
+                    last_error = e
+        raise last_error or RuntimeError("Aucun serveur Ollama configuré")
+
+    @contextmanager
+    def stream(self, url: str, model: str = None, **kwargs):
+        """Requête en streaming vers le meilleur serveur (bascule possible avant la réponse)."""
+        last_error = None
+        for endpoint in self.candidates(model):
+            with self.track(endpoint, model):
+                try:
+                    ctx = http_client.stream(endpoint.url_for(url), OLLAMA_PROVIDER,
+                                             limit_key=endpoint.base_url, **kwargs)
+                    response = ctx.__enter__()
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    self.mark_down(endpoint, e)
+                    last_error = e
+                    continue
+                try:
+                    yield response
+                finally:
+                    ctx.__exit__(None, None, None)
+                return
+        raise last_error or RuntimeError("Aucun serveur Ollama configuré")
+
+
+# Instance partagée par toute l'application
+pool = OllamaPool(OLLAMA_HOSTS)
@@ -0,0 +1,106 @@
+# pdf_extract.py
+
+import os
+import time
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from PyPDF2 import PdfReader
+import metrics
+from logging_utils import log, current_cancel
+
+# Nombre de pages traitées par tâche du pool (chaque tâche rouvre le PDF)
+PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "8"))
+# En dessous de ce nombre de pages, l'extraction reste dans le processus courant
+PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "16"))
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    """Pool de processus partagé, créé au premier PDF volumineux."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=PDF_WORKERS)
+        return _pool
+
+
+def _reset_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def extract_page_range(file_path: str, first: int, last: int) -> list:
+    """Extrait le texte des pages [first, last[ (exécuté dans un processus du pool)."""
+    reader = PdfReader(file_path)
+    return [(reader.pages[i].extract_text() or "") for i in range(first, last)]
+
+
+def iter_pdf_pages(file_path: str, cancel=None):
+    """
+    Générateur qui renvoie le texte de chaque page, dans l'ordre, dès qu'il est disponible.
+    Les pages sont extraites en parallèle par plages dans un pool de processus ;
+    l'itération s'arrête si `cancel` (par défaut le jeton de la tâche courante) est levé.
+    """
+    cancel = cancel or current_cancel()
+    start = time.time()
+    # Span détaché : le générateur est consommé au fil de l'eau, entre deux yield
+    extraction = metrics.Span("pdf_extraction")
+    reader = PdfReader(file_path)
+    n_pages = len(reader.pages)
+    produced = 0
+
+    try:
+        if n_pages < PARALLEL_MIN_PAGES or PDF_WORKERS <= 1:
+            for page in reader.pages:
+                if cancel.is_set():
+                    log("🛑 Extraction PDF interrompue.")
+                    return
+                produced += 1
+                yield page.extract_text() or ""
+            return
+
+        del reader  # chaque processus rouvre le fichier
+        pool = _get_pool()
+        ranges = [(i, min(i + PAGES_PER_TASK, n_pages)) for i in range(0, n_pages, PAGES_PER_TASK)]
+        # On limite les tâches en vol pour borner la mémoire et pouvoir annuler rapidement
+        max_in_flight = PDF_WORKERS * 2
+        pending = []
+        next_range = 0
+        try:
+            while next_range < len(ranges) or pending:
+                while next_range < len(ranges) and len(pending) < max_in_flight:
+                    first, last = ranges[next_range]
+                    pending.append(pool.submit(extract_page_range, file_path, first, last))
+                    next_range += 1
+                future = pending.pop(0)
+                while True:
+                    if cancel.is_set():
+                        log("🛑 Extraction PDF interrompue.")
+                        return
+                    try:
+                        pages = future.result(timeout=0.2)
+                        break
+                    except FutureTimeout:
+                        continue
+                for text in pages:
+                    produced += 1
+                    yield text
+        except BrokenProcessPool:
+            _reset_pool()
+            raise
+        finally:
+            for f in pending:
+                f.cancel()
+    finally:
+        elapsed = time.time() - start
+        rate = produced / elapsed if elapsed > 0 else 0.0
+        log(f"📄 {produced}/{n_pages} pages extraites en {elapsed:.2f}s ({rate:.1f} pages/s).")
+        extraction.attributes.update(pages=produced, total_pages=n_pages)
+        extraction.end("ok" if produced == n_pages else "partial")
@@ -0,0 +1,162 @@
+# pipeline.py
+
+import os
+import queue
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from logging_utils import log, current_cancel
+from chunking import count_tokens
+import ollama_pool
+
+# Nombre d'appels LLM simultanés par fournisseur (surchargeable par variable d'env) ;
+# pour Ollama, par serveur disponible du pool
+PROVIDER_CONCURRENCY = {
+    "Ollama (local)": int(os.getenv("OLLAMA_CONCURRENCY", "4")),
+    "OpenAI": int(os.getenv("OPENAI_CONCURRENCY", "8")),
+    "Anthropic": int(os.getenv("ANTHROPIC_CONCURRENCY", "4")),
+    "Perplexity": int(os.getenv("PERPLEXITY_CONCURRENCY", "4")),
+}
+DEFAULT_CONCURRENCY = 4
+# Taille des files entre étapes : borne la mémoire et applique la contre-pression
+QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "16"))
+
+_DONE = object()
+
+
+class _Failure:
+    """Exception levée dans une étape amont, transmise via la file."""
+
+    def __init__(self, error: Exception):
+        self.error = error
+
+
+def get_concurrency(provider: str) -> int:
+    """
+    Retourne le nombre d'appels simultanés autorisés pour un fournisseur ; pour Ollama,
+    il croît avec le nombre de serveurs disponibles (répartis par ollama_pool).
+    """
+    concurrency = max(1, PROVIDER_CONCURRENCY.get(provider, DEFAULT_CONCURRENCY))
+    if provider == ollama_pool.OLLAMA_PROVIDER:
+        concurrency *= max(1, ollama_pool.pool.healthy_count())
+    return concurrency
+
+
+def _put(q: queue.Queue, item, *events) -> bool:
+    """Dépose un élément dans la file tant qu'aucun des événements d'arrêt n'est levé."""
+    while not any(e.is_set() for e in events):
+        try:
+            q.put(item, timeout=0.2)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def stream(source, cancel=None, maxsize: int = QUEUE_SIZE):
+    """
+    Exécute l'itérable `source` dans un thread dédié et renvoie ses éléments via une
+    file bornée : l'étape amont avance pendant que l'aval consomme.
+    """
+    cancel = cancel or current_cancel()
+    q = queue.Queue(maxsize=maxsize)
+    closed = threading.Event()  # levé quand le consommateur abandonne le flux
+
+    def producer():
+        iterator = iter(source)
+        try:
+            for item in iterator:
+                if not _put(q, item, cancel, closed):
+                    return
+        except Exception as e:
+            _put(q, _Failure(e), cancel, closed)
+        finally:
+            close = getattr(iterator, "close", None)
+            if close:
+                close()
+            _put(q, _DONE, cancel, closed)
+
+    # Le thread hérite du contexte (jeton d'annulation de la tâche courante)
+    threading.Thread(target=contextvars.copy_context().run, args=(producer,), name="pipeline-stage", daemon=True).start()
+    try:
+        while not cancel.is_set():
+            try:
+                item = q.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            if item is _DONE:
+                return
+            if isinstance(item, _Failure):
+                raise item.error
+            yield item
+    finally:
+        closed.set()
+
+
+def map_ordered(items, fn, workers: int, cancel=None):
+    """
+    Applique `fn` à chaque élément dans un pool de `workers` threads, au fil de l'eau,
+    et renvoie les résultats dans l'ordre d'entrée (réassemblage ordonné).
+    """
+    cancel = cancel or current_cancel()
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        try:
+            for item in items:
+                if cancel.is_set():
+                    break
+                pending.append(executor.submit(contextvars.copy_context().run, fn, item))
+                # Contre-pression : au plus 2 tâches en attente par worker
+                while pending and (len(pending) >= workers * 2 or pending[0].done()):
+                    yield pending.popleft().result()
+            while pending and not cancel.is_set():
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def _pack_groups(texts: list, max_tokens: int) -> list:
+    """Regroupe des textes consécutifs en lots d'environ max_tokens tokens (2 textes minimum par lot)."""
+    groups, current, current_tokens = [], [], 0
+    for text in texts:
+        n = count_tokens(text)
+        if current and current_tokens + n > max_tokens and len(current) >= 2:
+            groups.append(current)
+            current, current_tokens = [], 0
+        current.append(text)
+        current_tokens += n
+    if current:
+        groups.append(current)
+    return groups
+
+
+def tree_reduce(summaries: list, merge_fn, workers: int, max_tokens: int,
+                cancel=None, mapper=map_ordered) -> list:
+    """
+    Réduction hiérarchique : tant que les résumés dépassent max_tokens (ce qu'un appel peut
+    recevoir, voir budget.plan_analysis), ils sont fusionnés par groupes consécutifs (en
+    parallèle, ordre préservé) via merge_fn(texte) -> résumé.
+    Une fusion en échec (réponse "❌"/"⚠️") n'est pas transmise : le groupe garde ses
+    résumés d'origine ; si toutes les fusions d'un niveau échouent, RuntimeError est levée.
+    `mapper` permet de remplacer le pool de threads (ex. async_llm.map_ordered_async).
+    """
+    cancel = cancel or current_cancel()
+    level = 0
+    while len(summaries) > 1 and sum(count_tokens(s) for s in summaries) > max_tokens:
+        if cancel.is_set():
+            break
+        level += 1
+        groups = _pack_groups(summaries, max_tokens)
+        log(f"🌳 Réduction niveau {level} : {len(summaries)} résumés → {len(groups)} groupes.")
+        merged = list(mapper(["\n\n".join(g) for g in groups], merge_fn, workers, cancel))
+        if cancel.is_set():
+            break
+        failed = [m for m in merged if m.startswith(("❌", "⚠️"))]
+        if len(failed) == len(groups):
+            raise RuntimeError(f"Fusion des résumés impossible : {failed[0]}")
+        if failed:
+            log(f"⚠️ Réduction niveau {level} : {len(failed)} fusion(s) en échec, résumés d'origine conservés.")
+        summaries = [s for group, m in zip(groups, merged) for s in (group if m in failed else [m])]
+    return summaries
@@ -0,0 +1,145 @@
+# rerank.py
+
+import os
+import re
+import math
+import time
+import metrics
+from logging_utils import log
+from chunking import count_tokens
+from pipeline import get_concurrency
+from async_llm import aquery_llm, map_ordered_async
+
+# === Configuration du reranking ===
+# RERANK_BACKEND : "none" (désactivé), "cross-encoder" (sentence-transformers, CPU) ou "ollama" (petit modèle)
+RERANK_BACKEND = os.getenv("RERANK_BACKEND", "none").lower()
+RERANK_MODEL = os.getenv(
+    "RERANK_MODEL",
+    "qwen2.5:0.5b" if RERANK_BACKEND == "ollama" else "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1",
+)
+# Candidats issus de la recherche soumis au reranking
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "20"))
+# Extraits notés par appel (cross-encoder : taille de lot ; Ollama : extraits par prompt)
+RERANK_BATCH = int(os.getenv("RERANK_BATCH", "5"))
+# Budget de tokens des extraits envoyés au modèle principal
+RERANK_TOKEN_BUDGET = int(os.getenv("RERANK_TOKEN_BUDGET", "1500"))
+# Arrêt anticipé : extraits dont le score est sous cette fraction du meilleur score écartés
+RERANK_MIN_RELATIVE_SCORE = float(os.getenv("RERANK_MIN_RELATIVE_SCORE", "0.3"))
+
+_SCORE_RE = re.compile(r"\[(\d+)\]\s*[:=-]?\s*(\d+(?:[.,]\d+)?)")
+_cross_encoder = None
+
+
+def is_enabled() -> bool:
+    return RERANK_BACKEND in ("cross-encoder", "ollama")
+
+
+def _get_cross_encoder():
+    """Charge (une seule fois) le cross-encoder local."""
+    global _cross_encoder
+    if _cross_encoder is None:
+        try:
+            from sentence_transformers import CrossEncoder
+        except ImportError as e:
+            raise RuntimeError("RERANK_BACKEND=cross-encoder nécessite le paquet sentence-transformers") from e
+        log(f"📦 Chargement du cross-encoder {RERANK_MODEL}...")
+        _cross_encoder = CrossEncoder(RERANK_MODEL, device="cpu")
+    return _cross_encoder
+
+
+def _cross_encoder_scores(question: str, passages: list) -> list:
+    model = _get_cross_encoder()
+    logits = model.predict([(question, p) for p in passages], batch_size=RERANK_BATCH)
+    # Logits ramenés dans [0, 1] : le seuil relatif au meilleur score garde un sens
+    return [1.0 / (1.0 + math.exp(-float(s))) for s in logits]
+
+
+def _rerank_prompt(question: str, passages: list) -> str:
+    listing = "\n\n".join(f"[{i + 1}] {p}" for i, p in enumerate(passages))
+    return (
+        "Note la pertinence de chaque extrait pour répondre à la question, de 0 (hors sujet) "
+        "à 10 (répond directement). Réponds uniquement par une ligne par extrait, au format "
+        "\"[numéro] note\".\n\n"
+        f"Question : {question}\n\n{listing}"
+    )
+
+
+def _parse_scores(text: str, count: int) -> list:
+    """
+    Notes d'un lot ; un extrait non noté garde une note neutre. Lève une RuntimeError si la
+    réponse est une erreur ou ne contient aucune note (l'appelant garde l'ordre de recherche).
+    """
+    if text.startswith(("❌", "⚠️")):
+        raise RuntimeError(text)
+    scores = [5.0] * count
+    parsed = 0
+    for number, score in _SCORE_RE.findall(text):
+        i = int(number) - 1
+        if 0 <= i < count:
+            scores[i] = min(10.0, float(score.replace(",", ".")))
+            parsed += 1
+    if not parsed:
+        raise RuntimeError(f"réponse sans note exploitable : {text[:80]!r}")
+    return scores
+
+
+def _ollama_scores(question: str, passages: list) -> list:
+    batches = [passages[i:i + RERANK_BATCH] for i in range(0, len(passages), RERANK_BATCH)]
+
+    async def score(batch):
+        answer = await aquery_llm(_rerank_prompt(question, batch), RERANK_MODEL, "Ollama (local)", "")
+        return _parse_scores(answer, len(batch))
+
+    scores = []
+    for batch_scores in map_ordered_async(batches, score, get_concurrency("Ollama (local)")):
+        scores.extend(batch_scores)
+    return scores
+
+
+def select_within_budget(passages: list, scores: list, budget: int = RERANK_TOKEN_BUDGET,
+                         min_relative: float = RERANK_MIN_RELATIVE_SCORE) -> list:
+    """
+    Indices des extraits retenus : par score décroissant, tant que le budget de tokens
+    n'est pas dépassé, en s'arrêtant dès que le score tombe trop loin du meilleur.
+    """
+    order = sorted(range(len(passages)), key=lambda i: -scores[i])
+    if not order:
+        return []
+    best, worst = scores[order[0]], min(scores)
+    # Scores tous égaux (ou meilleur score nul) : pas de seuil, seul le budget s'applique
+    cutoff = min_relative * best if best > worst and best > 0 else None
+    selected, used = [], 0
+    for i in order:
+        if selected and cutoff is not None and scores[i] < cutoff:
+            break
+        tokens = count_tokens(passages[i])
+        if selected and used + tokens > budget:
+            continue
+        selected.append(i)
+        used += tokens
+    return selected
+
+
+def rerank(question: str, passages: list, budget: int = RERANK_TOKEN_BUDGET) -> list:
+    """
+    Renote les extraits candidats avec le backend configuré et retourne les indices du plus
+    petit ensemble pertinent qui tient dans le budget. En cas d'échec, l'ordre initial est gardé.
+    """
+    if not passages:
+        return []
+    start = time.time()
+    with metrics.span("rerank", backend=RERANK_BACKEND, candidates=len(passages)) as attrs:
+        # Sans backend (ou en cas d'échec) : ordre de recherche, seul le budget s'applique
+        scores, min_relative = [float(len(passages) - i) for i in range(len(passages))], 0.0
+        try:
+            if RERANK_BACKEND == "cross-encoder":
+                scores, min_relative = _cross_encoder_scores(question, passages), RERANK_MIN_RELATIVE_SCORE
+            elif RERANK_BACKEND == "ollama":
+                scores, min_relative = _ollama_scores(question, passages), RERANK_MIN_RELATIVE_SCORE
+        except Exception as e:
+            log(f"⚠️ Reranking indisponible, ordre de recherche conservé : {e}")
+        selected = select_within_budget(passages, scores, budget, min_relative)
+        attrs["selected"] = len(selected)
+    log(f"🎯 Reranking ({RERANK_BACKEND}) : {len(selected)}/{len(passages)} extraits retenus "
+        f"en {time.time() - start:.2f}s.")
+    return selected
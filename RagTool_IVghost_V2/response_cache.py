@@ -0,0 +1,151 @@
+# response_cache.py
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+import metrics
+from logging_utils import log
+
+# === Configuration du cache des réponses LLM ===
+# LLM_CACHE=0 désactive complètement le cache (bypass global)
+ENABLED = os.getenv("LLM_CACHE", "1").lower() not in ("0", "false", "no")
+DB_PATH = os.getenv(
+    "LLM_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".llm_cache.sqlite"),
+)
+TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_MB", "256")) * 1024 * 1024
+MEMORY_ITEMS = int(os.getenv("LLM_CACHE_MEMORY_ITEMS", "512"))
+
+
+def make_key(provider: str, url: str, payload: dict) -> str:
+    """Clé déterministe : fournisseur, endpoint et payload (modèle, prompt, paramètres d'échantillonnage)."""
+    params = {k: v for k, v in payload.items() if k not in ("stream", "keep_alive")}
+    raw = json.dumps({"provider": provider, "url": url, "payload": params}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def is_cacheable(result: str) -> bool:
+    """Les messages d'erreur/avertissement de llm_client ne sont jamais mis en cache."""
+    return bool(result) and not result.startswith(("❌", "⚠️"))
+
+
+class ResponseCache:
+    """Cache à deux niveaux : LRU en mémoire puis SQLite sur disque, avec TTL et taille max."""
+
+    def __init__(self, path: str = DB_PATH, ttl: float = TTL_SECONDS, max_bytes: int = MAX_BYTES,
+                 memory_items: int = MEMORY_ITEMS):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.memory_items = memory_items
+        self.memory = OrderedDict()  # {clé: (valeur, date de création)}
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = None
+
+    def _conn(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT, created REAL, accessed REAL, size INTEGER)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_accessed ON responses(accessed)")
+        return self._db
+
+    def _remember(self, key: str, value: str, created: float) -> None:
+        self.memory[key] = (value, created)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_items:
+            self.memory.popitem(last=False)
+
+    def get(self, key: str):
+        """Retourne la réponse en cache ou None (entrée absente ou expirée)."""
+        now = time.time()
+        with self._lock:
+            entry = self.memory.get(key)
+            if entry is not None and now - entry[1] <= self.ttl:
+                self.memory.move_to_end(key)
+                self.memory_hits += 1
+                metrics.count_cache("llm", True)
+                return entry[0]
+            try:
+                db = self._conn()
+                row = db.execute("SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+                if row is not None and now - row[1] <= self.ttl:
+                    db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+                    db.commit()
+                    self._remember(key, row[0], row[1])
+                    self.disk_hits += 1
+                    metrics.count_cache("llm", True)
+                    return row[0]
+            except sqlite3.Error as e:
+                log(f"⚠️ Cache LLM illisible : {e}")
+            self.misses += 1
+            metrics.count_cache("llm", False)
+            return None
+
+    def put(self, key: str, value: str) -> None:
+        """Enregistre une réponse dans les deux niveaux et applique la limite de taille."""
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            self._remember(key, value, now)
+            try:
+                db = self._conn()
+                db.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, created, accessed, size) VALUES (?, ?, ?, ?, ?)",
+                    (key, value, now, now, size),
+                )
+                self._evict(db, now)
+                db.commit()
+            except sqlite3.Error as e:
+                log(f"⚠️ Écriture cache LLM impossible : {e}")
+
+    def _evict(self, db: sqlite3.Connection, now: float) -> None:
+        """Supprime les entrées expirées puis les moins récemment utilisées (lock tenu)."""
+        db.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in db.execute("SELECT key, size FROM responses ORDER BY accessed").fetchall():
+            if total <= self.max_bytes:
+                break
+            db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self.memory.pop(key, None)
+            total -= size
+
+    def stats(self) -> dict:
+        """Compteurs du cache : hits mémoire/disque, misses, entrées et octets sur disque."""
+        with self._lock:
+            try:
+                entries, size = self._conn().execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+                ).fetchone()
+            except sqlite3.Error:
+                entries, size = 0, 0
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "entries": entries,
+                "bytes": size,
+            }
+
+
+# Instance partagée par toute l'application
+response_cache = ResponseCache()
+
+
+def log_stats() -> None:
+    """Journalise l'état du cache des réponses LLM."""
+    s = response_cache.stats()
+    log(f"📦 Cache LLM : {s['memory_hits']} hits mémoire, {s['disk_hits']} hits disque, "
+        f"{s['misses']} misses, {s['entries']} entrées, {s['bytes'] / 1024 / 1024:.1f} Mo.")
@@ -0,0 +1,154 @@
+# retrieval.py
+
+import time
+import threading
+import numpy as np
+import metrics
+from logging_utils import log, current_cancel
+from llm_client import embed_texts
+from doc_cache import document_cache
+from lexical import BM25Index, rrf_fuse
+
+# Nombre d'extraits envoyés au LLM en mode question
+DEFAULT_TOP_K = 5
+# Au-delà de ce nombre de chunks, on utilise un index ANN (faiss) s'il est installé
+ANN_THRESHOLD = 20000
+# Candidats de chaque classement (lexical, vectoriel) avant fusion RRF
+FUSION_CANDIDATES = 50
+# Au-delà de ce nombre de chunks, seuls les meilleurs candidats BM25 sont embeddés à la requête
+PREFILTER_THRESHOLD = 5000
+PREFILTER_CANDIDATES = 200
+
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    """Normalise les lignes d'une matrice (norme L2) pour le calcul du cosinus."""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class VectorIndex:
+    """Index vectoriel en mémoire : matrice NumPy normalisée + recherche cosinus top-k."""
+
+    def __init__(self, chunks: list, embeddings):
+        self.chunks = list(chunks)
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        if matrix.ndim != 2 or matrix.shape[0] != len(self.chunks):
+            raise ValueError("Dimensions des embeddings incohérentes avec les chunks")
+        self.matrix = _normalize(matrix)
+        self._ann = None
+        if faiss is not None and len(self.chunks) >= ANN_THRESHOLD:
+            # Graphe HNSW sur produit scalaire (= cosinus car vecteurs normalisés)
+            self._ann = faiss.IndexHNSWFlat(self.matrix.shape[1], 32, faiss.METRIC_INNER_PRODUCT)
+            self._ann.add(self.matrix)
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    def search(self, query_vector, top_k: int = DEFAULT_TOP_K) -> list:
+        """Retourne les (indice, score) des top_k chunks les plus proches, triés par score."""
+        if not self.chunks:
+            return []
+        top_k = min(top_k, len(self.chunks))
+        query = _normalize(np.asarray(query_vector, dtype=np.float32).reshape(1, -1))
+
+        if self._ann is not None:
+            scores, ids = self._ann.search(query, top_k)
+            return [(int(i), float(s)) for i, s in zip(ids[0], scores[0]) if i >= 0]
+
+        scores = self.matrix @ query[0]
+        if top_k < len(scores):
+            candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+        else:
+            candidates = np.arange(len(scores))
+        ordered = candidates[np.argsort(-scores[candidates])]
+        return [(int(i), float(scores[i])) for i in ordered]
+
+
+def build_index(chunks: list, embeddings=None) -> VectorIndex:
+    """Construit l'index vectoriel, en calculant les embeddings s'ils ne sont pas fournis."""
+    start = time.time()
+    with metrics.span("indexing", chunks=len(chunks)):
+        if embeddings is None:
+            embeddings = embed_texts(chunks)
+        index = VectorIndex(chunks, embeddings)
+    log(f"🧭 Index vectoriel construit : {len(index)} chunks en {time.time() - start:.2f}s.")
+    return index
+
+
+class HybridIndex:
+    """
+    Index lexical BM25 + index vectoriel. Sans index vectoriel (très gros corpus),
+    la recherche vectorielle se limite aux meilleurs candidats BM25, embeddés à la volée
+    une seule fois (embeddings par chunk conservés en mémoire et, avec `cache_key`, sur disque).
+    """
+
+    def __init__(self, chunks: list, lexical: BM25Index, vector: VectorIndex = None, cache_key: str = None):
+        self.chunks = list(chunks)
+        self.lexical = lexical
+        self.vector = vector
+        self.cache_key = cache_key
+        self._vectors = None  # {indice de chunk: embedding}, chargé au premier besoin
+        self._lock = threading.Lock()
+
+    def _chunk_vectors(self, ids: list) -> np.ndarray:
+        """Embeddings des chunks `ids` ; seuls ceux jamais calculés sont envoyés au modèle."""
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = {}
+                arrays = document_cache.get_arrays(self.cache_key) if self.cache_key else None
+                if arrays is not None:
+                    self._vectors = dict(zip(arrays["ids"].tolist(), arrays["vectors"]))
+            missing = [i for i in ids if i not in self._vectors]
+        if missing:
+            vectors = embed_texts([self.chunks[i] for i in missing])
+            with self._lock:
+                self._vectors.update(zip(missing, np.asarray(vectors, dtype=np.float32)))
+                known = sorted(self._vectors)
+                arrays = {"ids": np.asarray(known, dtype=np.int64),
+                          "vectors": np.stack([self._vectors[i] for i in known])}
+            if self.cache_key and not current_cancel().is_set():
+                document_cache.put_arrays(self.cache_key, arrays)
+        with self._lock:
+            return np.stack([self._vectors[i] for i in ids])
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    def search(self, question: str, top_k: int = DEFAULT_TOP_K) -> list:
+        """(indice, score RRF) des top_k chunks, par fusion des rangs lexicaux et vectoriels."""
+        lexical_hits = self.lexical.search(question, max(FUSION_CANDIDATES, PREFILTER_CANDIDATES))
+        if self.vector is not None:
+            vector_hits = self.vector.search(embed_texts([question])[0], FUSION_CANDIDATES)
+        else:
+            candidates = [i for i, _ in lexical_hits[:PREFILTER_CANDIDATES]]
+            if not candidates:
+                # Aucun terme commun avec le document (paraphrase) : passe vectorielle complète,
+                # coûteuse une seule fois puisque les embeddings des chunks sont conservés
+                log(f"⚠️ Aucun candidat BM25 : recherche vectorielle sur les {len(self.chunks)} chunks.")
+                candidates = list(range(len(self.chunks)))
+            if not candidates:
+                return []
+            local = VectorIndex([self.chunks[i] for i in candidates], self._chunk_vectors(candidates))
+            vector_hits = [(candidates[j], s) for j, s in local.search(embed_texts([question])[0], FUSION_CANDIDATES)]
+        return rrf_fuse([lexical_hits[:FUSION_CANDIDATES], vector_hits], top_k)
+
+
+def search(index, question: str, top_k: int = DEFAULT_TOP_K) -> list:
+    """(indice, score) des chunks les plus pertinents, par pertinence décroissante."""
+    with metrics.span("retrieval", source="document", chunks=len(index), top_k=top_k):
+        if isinstance(index, HybridIndex):
+            return index.search(question, top_k)
+        return index.search(embed_texts([question])[0], top_k)
+
+
+def retrieve(index, question: str, top_k: int = DEFAULT_TOP_K) -> list:
+    """Retourne les chunks les plus pertinents pour la question, dans l'ordre du document."""
+    hits = search(index, question, top_k)
+    log(f"🔎 {len(hits)} extraits retenus (scores : {', '.join(f'{s:.2f}' for _, s in hits)}).")
+    return [index.chunks[i] for i, _ in sorted(hits)]
@@ -0,0 +1,201 @@
+# scheduler.py
+
+import os
+import time
+import uuid
+import threading
+import contextvars
+import metrics
+from logging_utils import log, CancelToken, cancel_scope
+
+# Nombre de tâches exécutées simultanément (les appels LLM restent plafonnés par fournisseur)
+SCHEDULER_WORKERS = int(os.getenv("SCHEDULER_WORKERS", "4"))
+# Priorités : plus la valeur est petite, plus la tâche passe tôt
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 10
+
+# Tâche en cours d'exécution (utilisateur courant pour les sessions LLM)
+_current_job = contextvars.ContextVar("current_job", default=None)
+
+
+def current_user() -> str:
+    """Utilisateur (session Gradio) de la tâche courante, "anonyme" hors planificateur."""
+    job = _current_job.get()
+    return job.user if job else "anonyme"
+
+
+class Job:
+    """Tâche planifiée : générateur exécuté par un worker, dernier état publié pour l'interface."""
+
+    def __init__(self, fn, args: tuple, user: str, priority: int, name: str):
+        self.id = uuid.uuid4().hex[:8]
+        self.fn = fn
+        self.args = args
+        self.user = user
+        self.priority = priority
+        self.name = name
+        self.token = CancelToken()
+        self.status = "queued"  # queued, running, done, cancelled, error
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.latest = None
+        self.version = 0
+        self._changed = threading.Condition()
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("done", "cancelled", "error")
+
+    def publish(self, value=None, status: str = None) -> None:
+        with self._changed:
+            if value is not None:
+                self.latest = value
+            if status:
+                self.status = status
+            self.version += 1
+            self._changed.notify_all()
+
+    def wait_update(self, version: int, timeout: float = 1.0) -> int:
+        """Attend une version plus récente que `version` (ou le timeout) et la retourne."""
+        with self._changed:
+            self._changed.wait_for(lambda: self.version != version, timeout)
+            return self.version
+
+
+class Scheduler:
+    """
+    File de tâches avec priorités et équité entre utilisateurs : parmi les tâches en attente
+    de priorité la plus forte, on sert l'utilisateur qui a le moins de tâches en cours,
+    puis celui servi le moins récemment, puis la tâche la plus ancienne. Chaque tâche a son propre jeton d'annulation.
+    """
+
+    def __init__(self, workers: int = SCHEDULER_WORKERS):
+        self.workers = workers
+        self._queued = []
+        self._running = {}  # {id: Job}
+        self._jobs = {}  # toutes les tâches non terminées
+        self._last_served = {}  # {utilisateur: date du dernier démarrage}
+        self._lock = threading.Condition()
+        self._threads = []
+
+    def _start_workers(self) -> None:
+        if not self._threads:
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f"scheduler-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, fn, *args, user: str = "anonyme", priority: int = PRIORITY_INTERACTIVE,
+               name: str = None) -> Job:
+        """Planifie fn(*args) (fonction génératrice) et retourne la tâche."""
+        job = Job(fn, args, user, priority, name or fn.__name__)
+        with self._lock:
+            self._start_workers()
+            self._queued.append(job)
+            self._jobs[job.id] = job
+            self._lock.notify()
+        log(f"📥 Tâche {job.id} ({job.name}, priorité {priority}) soumise par {user[:8]}.")
+        return job
+
+    def position(self, job: Job) -> int:
+        """Rang de la tâche dans la file (0 si elle n'est plus en attente)."""
+        with self._lock:
+            ordered = sorted(self._queued, key=self._rank)
+            return ordered.index(job) + 1 if job in ordered else 0
+
+    def _rank(self, job: Job) -> tuple:
+        running = sum(1 for j in self._running.values() if j.user == job.user)
+        return job.priority, running, self._last_served.get(job.user, 0.0), job.created
+
+    def _next_job(self) -> Job:
+        with self._lock:
+            while not self._queued:
+                self._lock.wait()
+            job = min(self._queued, key=self._rank)
+            self._queued.remove(job)
+            self._running[job.id] = job
+            self._last_served[job.user] = time.time()
+            return job
+
+    def _worker(self) -> None:
+        while True:
+            job = self._next_job()
+            self._run(job)
+            with self._lock:
+                self._running.pop(job.id, None)
+                self._jobs.pop(job.id, None)
+
+    def _run(self, job: Job) -> None:
+        if job.token.is_set():
+            job.publish("❌ Opération annulée.", "cancelled")
+            return
+        job.started = time.time()
+        job.publish(status="running")
+        wait = job.started - job.created
+        reset = _current_job.set(job)
+        try:
+            # Le jeton de la tâche devient le jeton courant : extraction, pipeline et appels LLM l'observent.
+            # Le span "job" est la racine de la trace de la tâche.
+            with cancel_scope(job.token), metrics.span("job", name=job.name, priority=job.priority,
+                                                       scheduler_wait_s=round(wait, 4)):
+                for value in job.fn(*job.args):
+                    job.publish(value)
+                    if job.token.is_set():
+                        break
+            if job.token.is_set():
+                job.publish("❌ Opération annulée.", "cancelled")
+            else:
+                job.publish(status="done")
+        except Exception as e:
+            log(f"❌ Tâche {job.id} en erreur : {e}")
+            job.publish(f"❌ Erreur : {e}", "error")
+        finally:
+            _current_job.reset(reset)
+            job.finished = time.time()
+            log(f"📤 Tâche {job.id} {job.status} (attente {wait:.2f}s, exécution {job.finished - job.started:.2f}s).")
+
+    def cancel(self, job_id: str) -> bool:
+        """Annule une tâche (en attente : retirée de la file ; en cours : jeton levé)."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return False
+            job.token.set()
+            if job in self._queued:
+                self._queued.remove(job)
+                self._jobs.pop(job.id, None)
+                job.publish("❌ Opération annulée.", "cancelled")
+        log(f"🛑 Tâche {job_id} annulée.")
+        return True
+
+    def cancel_user(self, user: str) -> int:
+        """Annule toutes les tâches d'un utilisateur ; retourne leur nombre."""
+        with self._lock:
+            ids = [j.id for j in self._jobs.values() if j.user == user]
+        return sum(self.cancel(i) for i in ids)
+
+    def jobs(self, user: str = None) -> list:
+        with self._lock:
+            return [j for j in self._jobs.values() if user is None or j.user == user]
+
+
+# Instance partagée par toute l'application
+scheduler = Scheduler()
+
+
+def follow(job: Job, poll: float = 1.0):
+    """
+    Générateur (bloquant) des états publiés par une tâche, jusqu'à sa fin ;
+    affiche la position dans la file tant qu'elle n'a pas démarré.
+    """
+    version = 0
+    while True:
+        if job.status == "queued":
+            yield f"⏳ En file d'attente (position {scheduler.position(job)})..."
+        version = job.wait_update(version, poll)
+        if job.latest is not None and job.status != "queued":
+            yield job.latest
+        if job.done:
+            return
+
@@ -0,0 +1,89 @@
+# startup.py
+
+import os
+import sys
+import time
+import importlib.abc
+from logging_utils import log
+
+# STARTUP_REPORT=1 : détail des temps d'import des modules au démarrage
+STARTUP_REPORT = os.getenv("STARTUP_REPORT", "0").lower() in ("1", "true", "yes")
+REPORT_TOP = 15
+# Bibliothèques lourdes dont on vérifie qu'elles ne sont pas chargées au démarrage
+HEAVY_MODULES = ("torch", "sentence_transformers", "faiss", "pandas", "numpy", "PyPDF2", "docx", "openpyxl")
+
+_started = time.perf_counter()
+_last_mark = _started
+_phases = []  # [(phase, secondes)]
+_import_times = {}  # {module de premier niveau: secondes, imports imbriqués compris}
+
+
+class _TimedLoader(importlib.abc.Loader):
+    """Enveloppe un loader pour chronométrer l'exécution du module, puis se retire."""
+
+    def __init__(self, loader, name: str):
+        self.loader = loader
+        self.name = name
+
+    def create_module(self, spec):
+        return self.loader.create_module(spec)
+
+    def exec_module(self, module):
+        start = time.perf_counter()
+        try:
+            self.loader.exec_module(module)
+        finally:
+            _import_times[self.name] = time.perf_counter() - start
+            module.__loader__ = self.loader
+            if getattr(module, "__spec__", None) is not None:
+                module.__spec__.loader = self.loader
+
+    def __getattr__(self, attr):
+        return getattr(self.loader, attr)
+
+
+class _ImportTimer(importlib.abc.MetaPathFinder):
+    """Chronomètre les modules de premier niveau importés après son installation."""
+
+    def find_spec(self, name, path, target=None):
+        if "." in name or name in _import_times:
+            return None
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(name, path, target)
+            if spec is not None:
+                break
+        else:
+            return None
+        # Loaders partagés (modules intégrés, gelés) : pas de chronométrage
+        if spec.loader is None or isinstance(spec.loader, type) or not hasattr(spec.loader, "exec_module"):
+            return spec
+        spec.loader = _TimedLoader(spec.loader, name)
+        return spec
+
+
+def install_import_timer() -> None:
+    """Active le chronométrage des imports si STARTUP_REPORT est défini."""
+    if STARTUP_REPORT and not any(isinstance(f, _ImportTimer) for f in sys.meta_path):
+        sys.meta_path.insert(0, _ImportTimer())
+
+
+def mark(phase: str) -> None:
+    """Clôt une phase du démarrage (imports, construction de l'interface...)."""
+    global _last_mark
+    now = time.perf_counter()
+    _phases.append((phase, now - _last_mark))
+    _last_mark = now
+
+
+def report() -> None:
+    """Journalise la durée des phases, les bibliothèques lourdes chargées et, en détail, les imports."""
+    phases = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in _phases)
+    log(f"🚀 Démarrage en {time.perf_counter() - _started:.2f}s ({phases}).")
+    loaded = [m for m in HEAVY_MODULES if m in sys.modules]
+    if loaded:
+        log(f"📦 Bibliothèques lourdes déjà chargées : {', '.join(loaded)}")
+    if _import_times:
+        slowest = sorted(_import_times.items(), key=lambda kv: -kv[1])[:REPORT_TOP]
+        log("⏱️ Imports les plus lents (cumulés) : " + ", ".join(f"{m} {s:.2f}s" for m, s in slowest))
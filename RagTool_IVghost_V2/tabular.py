@@ -0,0 +1,213 @@
+# tabular.py
+
+import io
+import os
+import csv
+import codecs
+import pandas as pd
+from logging_utils import log, current_cancel
+
+# Taille de l'échantillon lu pour détecter encodage et séparateur (octets)
+SNIFF_BYTES = 64 * 1024
+# Lignes lues par bloc (mémoire bornée quel que soit la taille du fichier)
+CHUNK_ROWS = int(os.getenv("TABLE_CHUNK_ROWS", "50000"))
+# Lignes par groupe de lignes rendu en texte pour le LLM
+ROW_GROUP_ROWS = 100
+# Nombre maximal de lignes rendues en texte dans extract_content (le reste est résumé)
+MAX_TEXT_ROWS = int(os.getenv("TABLE_MAX_TEXT_ROWS", "1000"))
+# Valeurs les plus fréquentes conservées par colonne texte
+TOP_VALUES = 5
+
+_ENCODINGS = ("utf-8-sig", "cp1252", "ISO-8859-1")
+_DELIMITERS = ",;\t|"
+
+
+def sniff_csv(file_path: str) -> tuple:
+    """Détecte (encodage, séparateur) à partir d'un échantillon du début du fichier."""
+    with open(file_path, "rb") as f:
+        sample = f.read(SNIFF_BYTES)
+
+    text = None
+    for encoding in _ENCODINGS:
+        try:
+            # Décodeur incrémental : un caractère multi-octets coupé en fin d'échantillon n'est pas une erreur
+            text = codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+            break
+        except UnicodeDecodeError:
+            continue
+    if text is None:
+        encoding, text = "ISO-8859-1", sample.decode("ISO-8859-1")
+
+    try:
+        sep = csv.Sniffer().sniff(text[:SNIFF_BYTES // 4], delimiters=_DELIMITERS).delimiter
+    except csv.Error:
+        header = text.splitlines()[0] if text else ""
+        sep = max(_DELIMITERS, key=header.count)
+    return encoding, sep
+
+
+def iter_csv_chunks(file_path: str, chunk_rows: int = CHUNK_ROWS):
+    """
+    Lit un CSV par blocs de DataFrames avec le parseur C (types inférés par bloc).
+    L'encodage est deviné sur le début du fichier : si un octet invalide apparaît plus
+    loin (export Excel en Latin-1), la lecture reprend avec l'encodage suivant de
+    _ENCODINGS, sans renvoyer à nouveau les lignes déjà lues.
+    """
+    encoding, sep = sniff_csv(file_path)
+    log(f"📊 CSV : séparateur {sep!r}, encodage {encoding}.")
+    candidates = _ENCODINGS[_ENCODINGS.index(encoding):]
+    done = 0  # lignes déjà renvoyées
+    for attempt, encoding in enumerate(candidates):
+        skip = done
+        try:
+            # Le premier tampon est décodé dès l'ouverture du lecteur
+            reader = pd.read_csv(
+                file_path, sep=sep, encoding=encoding, engine="c",
+                chunksize=chunk_rows, on_bad_lines="warn", low_memory=False,
+            )
+            with reader:
+                for chunk in reader:
+                    if current_cancel().is_set():
+                        log("🛑 Lecture CSV interrompue.")
+                        return
+                    if skip:
+                        chunk, skip = chunk.iloc[skip:], max(0, skip - len(chunk))
+                        if chunk.empty:
+                            continue
+                    done += len(chunk)
+                    yield chunk
+            return
+        except UnicodeDecodeError as e:
+            if attempt == len(candidates) - 1:
+                raise
+            log(f"⚠️ CSV : octet invalide en {encoding} après {done} lignes ({e.reason}), "
+                f"reprise en {candidates[attempt + 1]}.")
+
+
+def iter_excel_chunks(file_path: str, chunk_rows: int = CHUNK_ROWS):
+    """Lit la première feuille d'un classeur XLSX par blocs (openpyxl en lecture seule)."""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [str(c) if c is not None else f"Unnamed: {i}" for i, c in enumerate(header)]
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= chunk_rows:
+                if current_cancel().is_set():
+                    log("🛑 Lecture Excel interrompue.")
+                    return
+                yield pd.DataFrame(batch, columns=columns).infer_objects()
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=columns).infer_objects()
+    finally:
+        workbook.close()
+
+
+def iter_table_chunks(file_path: str, chunk_rows: int = CHUNK_ROWS):
+    """Blocs de DataFrames d'un fichier CSV ou XLSX."""
+    if file_path.lower().endswith(".xlsx"):
+        return iter_excel_chunks(file_path, chunk_rows)
+    return iter_csv_chunks(file_path, chunk_rows)
+
+
+def to_number(series: pd.Series) -> pd.Series:
+    """
+    Conversion vectorisée d'une colonne en float : virgule décimale, espaces,
+    "< 0,5" (seuil de détection) et "traces" gérés ; valeurs illisibles -> 0.
+    """
+    if pd.api.types.is_numeric_dtype(series):
+        return series.astype(float).fillna(0.0)
+    text = (
+        series.astype(str).str.strip().str.lower()
+        .str.replace(",", ".", regex=False)
+        .str.replace(r"^<\s*", "", regex=True)
+        .str.replace(r"\s+", "", regex=True)
+        .str.replace("traces", "0", regex=False)
+    )
+    return pd.to_numeric(text, errors="coerce").fillna(0.0)
+
+
+class TableSummary:
+    """Schéma et statistiques d'une table, accumulés bloc par bloc (mémoire constante)."""
+
+    def __init__(self):
+        self.rows = 0
+        self.columns = {}  # {colonne: statistiques}
+
+    def update(self, df: pd.DataFrame) -> None:
+        self.rows += len(df)
+        for name in df.columns:
+            series = df[name]
+            stats = self.columns.setdefault(name, {"dtype": str(series.dtype), "nulls": 0, "top": {}})
+            stats["nulls"] += int(series.isna().sum())
+            values = series.dropna()
+            if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+                if values.empty:
+                    continue
+                stats["min"] = min(stats.get("min", values.min()), values.min())
+                stats["max"] = max(stats.get("max", values.max()), values.max())
+                stats["sum"] = stats.get("sum", 0) + float(values.sum())
+                stats["count"] = stats.get("count", 0) + len(values)
+            else:
+                stats["dtype"] = "texte" if stats["dtype"] == "object" else stats["dtype"]
+                top = stats["top"]
+                for value, n in values.astype(str).value_counts().head(TOP_VALUES * 4).items():
+                    top[value] = top.get(value, 0) + int(n)
+                # Borne la mémoire : on ne garde que les valeurs les plus fréquentes
+                if len(top) > TOP_VALUES * 20:
+                    stats["top"] = dict(sorted(top.items(), key=lambda kv: -kv[1])[:TOP_VALUES * 4])
+
+    def to_text(self) -> str:
+        """Résumé compact du schéma (une ligne par colonne), destiné au prompt."""
+        lines = [f"Table de {self.rows} lignes et {len(self.columns)} colonnes :"]
+        for name, s in self.columns.items():
+            desc = f"- {name} ({s['dtype']}, {s['nulls']} vides)"
+            if "count" in s:
+                desc += f" : min {s['min']:g}, max {s['max']:g}, moyenne {s['sum'] / s['count']:g}"
+            elif s["top"]:
+                top = sorted(s["top"].items(), key=lambda kv: -kv[1])[:TOP_VALUES]
+                desc += " : " + ", ".join(f"{v} ({n})" for v, n in top)
+            lines.append(desc)
+        return "\n".join(lines)
+
+
+def iter_row_groups(chunks, rows: int = ROW_GROUP_ROWS):
+    """Rend un flux de DataFrames en groupes de lignes CSV, chacun avec son en-tête."""
+    for df in chunks:
+        for start in range(0, len(df), rows):
+            group = df.iloc[start:start + rows]
+            buffer = io.StringIO()
+            group.to_csv(buffer, index=False)
+            yield f"[Lignes {group.index[0] + 1}-{group.index[-1] + 1}]\n{buffer.getvalue().rstrip()}"
+
+
+def table_to_text(file_path: str, max_rows: int = MAX_TEXT_ROWS) -> str:
+    """
+    Représentation textuelle bornée d'une table : résumé du schéma et des statistiques
+    (calculé sur toutes les lignes), suivi des `max_rows` premières lignes en groupes.
+    """
+    summary = TableSummary()
+    groups = []
+    rendered = 0
+    offset = 0
+    for df in iter_table_chunks(file_path):
+        summary.update(df)
+        df.index = range(offset, offset + len(df))
+        offset += len(df)
+        if rendered < max_rows:
+            head = df.iloc[:max_rows - rendered]
+            groups.extend(iter_row_groups([head]))
+            rendered += len(head)
+
+    parts = [summary.to_text()] + groups
+    if summary.rows > rendered:
+        parts.append(f"[{summary.rows - rendered} lignes supplémentaires non reproduites]")
+    log(f"📊 Table résumée : {summary.rows} lignes, {rendered} reproduites.")
+    return "\n\n".join(parts)
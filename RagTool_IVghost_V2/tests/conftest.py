@@ -0,0 +1,11 @@
+# conftest.py
+
+import os
+import sys
+import tempfile
+
+# Les modules de l'application sont à plat dans le dossier parent
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Caches disque isolés : les tests ne touchent pas au cache de l'application
+os.environ.setdefault("RAG_CACHE_DIR", tempfile.mkdtemp(prefix="rag_cache_"))
+os.environ.setdefault("LLM_CACHE_PATH", os.path.join(tempfile.mkdtemp(prefix="llm_cache_"), "responses.sqlite"))
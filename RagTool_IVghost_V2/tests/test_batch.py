@@ -0,0 +1,55 @@
+# test_batch.py
+
+import os
+import json
+
+import batch
+
+
+def _write_docs(root, names):
+    for name in names:
+        path = root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(f"contenu de {name}", encoding="utf-8")
+
+
+def test_find_documents_filters_extensions(tmp_path):
+    _write_docs(tmp_path, ["b.pdf", "a.CSV", "notes.txt", "sous/c.docx"])
+    found = [os.path.relpath(p, tmp_path) for p in batch.find_documents(str(tmp_path))]
+    assert sorted(found) == sorted(["a.CSV", "b.pdf", os.path.join("sous", "c.docx")])
+
+
+def test_checkpoint_keeps_only_successes(tmp_path):
+    output = tmp_path / "resultats.jsonl"
+    output.write_text(
+        json.dumps({"hash": "h1", "status": "ok"}) + "\n"
+        + json.dumps({"hash": "h2", "status": "error"}) + "\n"
+        + '{"hash": "h3", "sta',  # dernière ligne tronquée par un arrêt brutal
+        encoding="utf-8",
+    )
+    assert batch.load_checkpoint(str(output)) == {"h1"}
+    assert batch.load_checkpoint(str(tmp_path / "absent.jsonl")) == set()
+
+
+def test_rerun_retries_failed_documents_only(tmp_path, monkeypatch):
+    docs = tmp_path / "docs"
+    _write_docs(docs, ["ok.pdf", "ko.pdf"])
+    output = tmp_path / "resultats.jsonl"
+    processed = []
+
+    def analyze_file(path, content_hash, provider, model, api_key, workers):
+        processed.append(os.path.basename(path))
+        if path.endswith("ko.pdf") and processed.count("ko.pdf") == 1:
+            raise RuntimeError("1/3 section(s) non résumée(s)")
+        return {"path": path, "hash": content_hash, "status": "ok", "chunks": 1,
+                "input_tokens": 10, "output_tokens": 5, "seconds": 0.1, "summary": "s"}
+
+    monkeypatch.setattr(batch, "analyze_file", analyze_file)
+    first = batch.run_batch(str(docs), str(output), "Ollama (local)", "m", workers=1)
+    assert (first["ok"], first["errors"]) == (1, 1)
+
+    second = batch.run_batch(str(docs), str(output), "Ollama (local)", "m", workers=1)
+    assert (second["ok"], second["errors"]) == (1, 0)
+    assert sorted(processed) == ["ko.pdf", "ko.pdf", "ok.pdf"]
+    statuses = [json.loads(line)["status"] for line in output.read_text(encoding="utf-8").splitlines()]
+    assert sorted(statuses) == ["error", "ok", "ok"]
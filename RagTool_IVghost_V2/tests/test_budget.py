@@ -0,0 +1,57 @@
+# test_budget.py
+
+import pytest
+
+import budget
+from budget import MAX_TOP_K, plan_analysis, plan_question
+
+OLLAMA = "Ollama (local)"
+
+
+@pytest.fixture
+def ollama_context(monkeypatch):
+    """Fenêtre de contexte d'un modèle Ollama fictif, sans requête /api/show."""
+    def set_context(tokens: int, model: str = "m"):
+        monkeypatch.setitem(budget._context_windows, (OLLAMA, model), tokens)
+        return model
+    return set_context
+
+
+def test_small_document_single_shot():
+    plan = plan_question("Qui paie ?", 2000, 400, "gpt", "OpenAI")
+    assert plan.strategy == "single_shot"
+    assert plan.calls == 1
+
+
+def test_large_window_does_not_send_whole_document():
+    # 60 000 tokens tiennent dans 128k, mais coûtent bien plus que MAX_TOP_K extraits
+    plan = plan_question("Qui paie ?", 60000, 400, "gpt", "OpenAI")
+    assert plan.strategy == "top_k"
+    assert plan.top_k == MAX_TOP_K
+    assert plan.input_tokens < 60000
+
+
+def test_top_k_limited_by_small_context(ollama_context):
+    model = ollama_context(4096)
+    plan = plan_question("Qui paie ?", 20000, 400, model, OLLAMA)
+    assert plan.strategy == "top_k"
+    assert plan.top_k * 400 + budget.ANSWER_OUTPUT_TOKENS <= 4096
+
+
+def test_analysis_single_shot_when_document_fits(ollama_context):
+    model = ollama_context(8192)
+    assert plan_analysis("Résume :", 500, model, OLLAMA, document_tokens=3000).strategy == "single_shot"
+
+
+def test_analysis_map_reduce_call_estimate(ollama_context):
+    model = ollama_context(4096)
+    plan = plan_analysis("Résume :", 500, model, OLLAMA, document_tokens=20000)
+    assert plan.strategy == "map_reduce"
+    assert plan.chunk_tokens < 4096
+    assert plan.calls == -(-20000 // plan.chunk_tokens) + 1
+
+
+def test_analysis_unknown_size_is_map_reduce(ollama_context):
+    model = ollama_context(4096)
+    plan = plan_analysis("Résume :", 500, model, OLLAMA)
+    assert (plan.strategy, plan.calls) == ("map_reduce", 0)
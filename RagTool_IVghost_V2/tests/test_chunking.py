@@ -0,0 +1,53 @@
+# test_chunking.py
+
+from chunking import count_tokens, iter_blocks, iter_token_chunks
+
+SENTENCES = " ".join(f"Phrase numéro {k} décrivant une clause précise du contrat." for k in range(14))
+
+
+def test_chunks_respect_budget():
+    text = "\n\n".join([SENTENCES] * 6)
+    chunks = list(iter_token_chunks([text], max_tokens=200, overlap=40))
+    assert len(chunks) > 1
+    assert all(count_tokens(c) <= 200 for c in chunks)
+
+
+def test_overlap_shared_between_consecutive_chunks():
+    # Paragraphes plus longs que le recouvrement : la fin du précédent est reprise
+    text = "\n\n".join([SENTENCES] * 3)
+    chunks = list(iter_token_chunks([text], max_tokens=400, overlap=60))
+    assert len(chunks) > 1
+    for previous, following in zip(chunks, chunks[1:]):
+        head = following.split("\n")[0]
+        assert head and head in previous
+        assert count_tokens(head) <= 60
+
+
+def test_no_overlap_by_default():
+    paragraphs = [f"Paragraphe {k} : " + SENTENCES for k in range(4)]
+    chunks = list(iter_token_chunks(["\n\n".join(paragraphs)], max_tokens=200))
+    assert not any(chunks[i + 1].split("\n")[0] in chunks[i] for i in range(len(chunks) - 1))
+
+
+def test_heading_starts_new_chunk():
+    text = f"Article 1 Objet\n{SENTENCES}\n\nArticle 2 Durée\n{SENTENCES}"
+    chunks = list(iter_token_chunks([text], max_tokens=300, min_fill=0.3))
+    assert [c.split("\n")[0] for c in chunks] == ["Article 1 Objet", "Article 2 Durée"]
+
+
+def test_blocks_streamed_without_blank_lines():
+    # Texte PyPDF2 typique : aucune ligne vide, le paragraphe ne doit pas couvrir tout le document
+    consumed = []
+
+    def pages():
+        for i in range(50):
+            consumed.append(i)
+            yield "\n".join(f"Ligne {i}-{j} du contrat avec des obligations pour les parties." for j in range(20))
+
+    next(iter_token_chunks(pages(), max_tokens=400))
+    assert len(consumed) < 5
+
+
+def test_paragraph_spans_pages_without_budget():
+    blocks = list(iter_blocks(["début d'une phrase", "suite sur la page suivante"]))
+    assert blocks == [("début d'une phrase suite sur la page suivante", False)]
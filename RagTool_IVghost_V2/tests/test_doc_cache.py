@@ -0,0 +1,75 @@
+# test_doc_cache.py
+
+import os
+
+import numpy as np
+
+import doc_cache
+from doc_cache import DocumentCache, cached, file_hash, text_hash
+
+
+def test_key_depends_on_params():
+    key = DocumentCache.make_key("chunks", "abc", size=400)
+    assert key.startswith("chunks-")
+    assert key == DocumentCache.make_key("chunks", "abc", size=400)
+    assert key != DocumentCache.make_key("chunks", "abc", size=800)
+
+
+def test_json_and_array_roundtrip(tmp_path):
+    cache = DocumentCache(str(tmp_path))
+    cache.put_json("text-1", {"pages": ["é", "b"]})
+    cache.put_array("embeddings-2", [[1, 2], [3, 4]])
+    cache.put_arrays("chunk_vectors-3", {"ids": np.array([7, 9]), "vectors": np.ones((2, 3))})
+
+    assert cache.get_json("text-1") == {"pages": ["é", "b"]}
+    assert cache.get_array("embeddings-2").dtype == np.float32
+    arrays = cache.get_arrays("chunk_vectors-3")
+    assert arrays["ids"].tolist() == [7, 9]
+    assert cache.get_json("absent-4") is None
+    assert (cache.hits, cache.misses) == (3, 1)
+
+
+def test_entries_survive_restart(tmp_path):
+    DocumentCache(str(tmp_path)).put_json("text-1", "contenu")
+    reopened = DocumentCache(str(tmp_path))
+    assert reopened.get_json("text-1") == "contenu"
+    assert reopened.stats()["entries"] == 1
+
+
+def test_lru_eviction(tmp_path):
+    cache = DocumentCache(str(tmp_path), max_bytes=2500)
+    for i, key in enumerate(("text-a", "text-b", "text-c")):
+        cache.put_json(key, "x" * 1000)
+        os.utime(cache._path(key, ".json"), (1000 + i, 1000 + i))
+    assert cache.stats()["entries"] == 2  # "text-a" évincée à la troisième écriture
+
+    cache.get_json("text-b")  # "text-b" redevient la plus récente
+    cache.put_json("text-d", "x" * 1000)
+    assert cache.get_json("text-b") is not None
+    assert cache.get_json("text-c") is None
+    assert cache.stats()["bytes"] <= 2500
+
+
+def test_cached_computes_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(doc_cache, "document_cache", DocumentCache(str(tmp_path)))
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return "texte extrait"
+
+    assert cached("text", "h1", compute, extractor="pdf") == "texte extrait"
+    assert cached("text", "h1", compute, extractor="pdf") == "texte extrait"
+    assert len(calls) == 1
+
+
+def test_cached_skips_empty_results(tmp_path, monkeypatch):
+    monkeypatch.setattr(doc_cache, "document_cache", DocumentCache(str(tmp_path)))
+    assert cached("text", "h2", lambda: "") == ""
+    assert doc_cache.document_cache.stats()["entries"] == 0
+
+
+def test_hashes(tmp_path):
+    path = tmp_path / "a.txt"
+    path.write_bytes("contrat".encode("utf-8"))
+    assert file_hash(str(path)) == text_hash("contrat")
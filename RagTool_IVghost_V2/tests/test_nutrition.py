@@ -0,0 +1,43 @@
+# test_nutrition.py
+
+import pytest
+
+from nutrition import calculate_missing_macros
+
+
+def test_user_values_are_kept():
+    p, c, f, k = calculate_missing_macros(None, 100, None, 2000)
+    assert c == 100
+    assert k == 2000
+    assert p * 4 + c * 4 + f * 9 == pytest.approx(2000, abs=1)
+
+
+def test_kcal_computed_from_partial_macros():
+    assert calculate_missing_macros(120, 100, None, None) == (120, 100, 0, 880)
+
+
+def test_kcal_computed_from_all_macros():
+    assert calculate_missing_macros("150", "200", "70", "") == (150, 200, 70, 2030)
+
+
+def test_single_missing_macro_takes_remainder():
+    assert calculate_missing_macros(150, 200, None, 2030) == (150, 200, 70, 2030)
+
+
+def test_kcal_only_uses_default_split():
+    p, c, f, k = calculate_missing_macros(None, None, None, 2000)
+    assert (p, c, f, k) == (150, 200, pytest.approx(66.7), 2000)
+
+
+def test_all_macros_and_kcal_unchanged():
+    assert calculate_missing_macros(100, 100, 100, 3000) == (100, 100, 100, 3000)
+
+
+def test_nothing_provided():
+    with pytest.raises(ValueError):
+        calculate_missing_macros(None, "", None, None)
+
+
+def test_invalid_number():
+    with pytest.raises(ValueError):
+        calculate_missing_macros("beaucoup", None, None, None)
@@ -0,0 +1,48 @@
+# test_pipeline.py
+
+import re
+
+import pytest
+
+from chunking import count_tokens
+from pipeline import map_ordered, tree_reduce
+
+SUMMARY = "Obligation de livraison sous trente jours, pénalités de retard. " * 10
+
+
+def merge(text: str) -> str:
+    """Fusion factice qui compte les résumés d'origine couverts."""
+    leaves = text.count(SUMMARY) + sum(int(n) for n in re.findall(r"fusion de (\d+)", text))
+    return f"fusion de {leaves} résumés"
+
+
+def test_map_ordered_keeps_input_order():
+    assert list(map_ordered(range(20), lambda x: x * x, workers=4)) == [x * x for x in range(20)]
+
+
+def test_tree_reduce_fits_budget():
+    summaries = [SUMMARY] * 12
+    max_tokens = 4 * count_tokens(SUMMARY)
+    reduced = tree_reduce(summaries, merge, workers=2, max_tokens=max_tokens)
+    assert sum(count_tokens(s) for s in reduced) <= max_tokens
+    assert sum(int(s.split()[2]) for s in reduced) == 12
+
+
+def test_tree_reduce_noop_when_within_budget():
+    assert tree_reduce([SUMMARY, SUMMARY], merge, workers=2, max_tokens=10_000) == [SUMMARY, SUMMARY]
+
+
+def test_failed_merge_keeps_original_summaries():
+    calls = []
+
+    def flaky(text):
+        calls.append(text)
+        return "❌ Erreur API (500)" if len(calls) == 1 else merge(text)
+
+    reduced = tree_reduce([SUMMARY] * 6, flaky, workers=1, max_tokens=2 * count_tokens(SUMMARY))
+    assert not any(s.startswith("❌") for s in reduced)
+
+
+def test_all_merges_failing_raises():
+    with pytest.raises(RuntimeError):
+        tree_reduce([SUMMARY] * 4, lambda text: "❌ Erreur", workers=1, max_tokens=count_tokens(SUMMARY))
@@ -0,0 +1,47 @@
+# test_tabular.py
+
+import pandas as pd
+
+import tabular
+from tabular import TableSummary, iter_csv_chunks, sniff_csv, to_number
+
+
+def test_sniff_semicolon_cp1252(tmp_path):
+    path = tmp_path / "aliments.csv"
+    path.write_bytes("nom;kcal\ncrème;120\npâtes;350\n".encode("cp1252"))
+    assert sniff_csv(str(path)) == ("cp1252", ";")
+
+
+def test_sniff_utf8_comma(tmp_path):
+    path = tmp_path / "aliments.csv"
+    path.write_text("nom,kcal\ncrème,120\n", encoding="utf-8")
+    assert sniff_csv(str(path)) == ("utf-8-sig", ",")
+
+
+def test_latin1_after_sample_is_read(tmp_path, monkeypatch):
+    # Début ASCII (encodage deviné : UTF-8), puis un "è" Latin-1 au-delà de l'échantillon
+    monkeypatch.setattr(tabular, "SNIFF_BYTES", 64)
+    rows = [f"aliment{i};{i}" for i in range(50)] + ["crème brûlée;300", "fin;1"]
+    path = tmp_path / "export.csv"
+    path.write_bytes(("nom;kcal\n" + "\n".join(rows) + "\n").encode("latin-1"))
+
+    chunks = list(iter_csv_chunks(str(path), chunk_rows=10))
+    df = pd.concat(chunks, ignore_index=True)
+    assert len(df) == 52
+    assert df["nom"].tolist()[:2] == ["aliment0", "aliment1"]
+    assert df["nom"].tolist()[-2:] == ["crème brûlée", "fin"]
+
+
+def test_to_number_french_formats():
+    series = pd.Series(["1,5", "< 0,5", "traces", "1 200", "n/a", None])
+    assert to_number(series).tolist() == [1.5, 0.5, 0.0, 1200.0, 0.0, 0.0]
+
+
+def test_table_summary_accumulates_chunks():
+    summary = TableSummary()
+    summary.update(pd.DataFrame({"kcal": [100, 300], "nom": ["a", "b"]}))
+    summary.update(pd.DataFrame({"kcal": [200, None], "nom": ["a", None]}))
+    stats = summary.columns["kcal"]
+    assert summary.rows == 4
+    assert (stats["min"], stats["max"], stats["count"], stats["nulls"]) == (100, 300, 3, 1)
+    assert summary.columns["nom"]["top"] == {"a": 2, "b": 1}
@@ -1,26 +1,91 @@
 # ui.py
 
+import asyncio
+import importlib
 import gradio as gr
-import requests
-from llm_client import OLLAMA_MODELS_URL
-from file_utils import extract_content  # si besoin
-from document import analyze_document
-from nutrition import generate_nutrition_plan
+from ollama_pool import pool
+from scheduler import scheduler, follow, PRIORITY_INTERACTIVE, PRIORITY_BULK
+
+def lazy_handler(module: str, name: str):
+    """
+    Handler importé au premier appel : les modules du pipeline (PDF, pandas, NumPy,
+    embeddings...) ne sont pas chargés au démarrage de l'interface.
+    """
+    def handler(*args):
+        return getattr(importlib.import_module(module), name)(*args)
+    handler.__name__ = name
+    return handler
+
+analyze_document_stream = lazy_handler("document", "analyze_document_stream")
+generate_nutrition_plan_stream = lazy_handler("nutrition", "generate_nutrition_plan_stream")
+kb_add_files = lazy_handler("knowledge_base", "kb_add_files")
+kb_remove = lazy_handler("knowledge_base", "kb_remove")
+kb_ask_stream = lazy_handler("knowledge_base", "kb_ask_stream")
+kb_document_choices = lazy_handler("knowledge_base", "kb_document_choices")
+preload_model = lazy_handler("llm_client", "preload_model")
 
 def check_connection():
-    try:
-        res = requests.get(OLLAMA_MODELS_URL, timeout=2)
-        return "🟢 Connecté à Ollama" if res.status_code == 200 else "🔴 Ollama non disponible"
-    except Exception as e:
-        return f"🔴 Ollama non disponible ({e})"
+    up, total = pool.check_all(), len(pool.endpoints)
+    if not up:
+        errors = "; ".join(e.last_error for e in pool.endpoints if e.last_error)
+        return f"🔴 Ollama non disponible ({errors})" if errors else "🔴 Ollama non disponible"
+    return "🟢 Connecté à Ollama" + (f" ({up}/{total} serveurs)" if total > 1 else "")
 
 def get_available_models():
-    try:
-        res = requests.get(OLLAMA_MODELS_URL, timeout=2)
-        names = [m["name"] for m in res.json().get("models", [])]
-        return names or ["Aucun modèle disponible"]
-    except Exception as e:
-        return [f"Erreur de connexion: {e}"]
+    if not any(e.healthy and e.models is not None for e in pool.endpoints):
+        pool.check_all()
+    return pool.available_models() or ["Aucun modèle disponible"]
+
+async def load_connection_state():
+    """État d'Ollama et liste des modèles, chargés après l'affichage de l'interface."""
+    status, models = await asyncio.to_thread(lambda: (check_connection(), get_available_models()))
+    return status, gr.update(choices=models, value=None)
+
+async def preload_selected_model(model, provider):
+    """Charge le modèle choisi dès sa sélection (la première question ne paie pas le chargement)."""
+    if not model or model == "Aucun modèle disponible":
+        return ""
+    return await asyncio.to_thread(preload_model, model, provider)
+
+async def load_kb_documents():
+    return gr.update(choices=await asyncio.to_thread(kb_document_choices), value=None)
+
+def as_async_handler(handler, priority=PRIORITY_INTERACTIVE):
+    """
+    Soumet un handler générateur au planificateur et relaie ses états : la boucle Gradio
+    n'est jamais bloquée, les sessions sont servies équitablement et la tâche est annulée
+    si l'utilisateur se déconnecte. `priority` peut être une fonction des arguments.
+    """
+    async def wrapped(request: gr.Request, *args):
+        level = priority(*args) if callable(priority) else priority
+        user = getattr(request, "session_hash", None) or "anonyme"
+        job = scheduler.submit(handler, *args, user=user, priority=level)
+        updates = follow(job)
+        done = object()
+        try:
+            while True:
+                item = await asyncio.to_thread(next, updates, done)
+                if item is done:
+                    return
+                yield item
+        finally:
+            if not job.done:
+                scheduler.cancel(job.id)
+    wrapped.__name__ = handler.__name__
+    return wrapped
+
+def stop_session(request: gr.Request):
+    """Annule les tâches (en attente ou en cours) de la session."""
+    count = scheduler.cancel_user(getattr(request, "session_hash", None) or "anonyme")
+    return f"🛑 {count} opération(s) annulée(s)." if count else "Aucune opération en cours."
+
+def as_kb_handler(handler):
+    """Exécute une action sur la base dans un thread et rafraîchit la liste des documents."""
+    async def wrapped(*args):
+        status, choices = await asyncio.to_thread(handler, *args)
+        return status, gr.update(choices=choices, value=None)
+    wrapped.__name__ = handler.__name__
+    return wrapped
 
 def build_general_assistant_tab():
     with gr.Tab("💬 Assistant Général"):
@@ -32,11 +97,33 @@ def build_general_assistant_tab():
             full_analysis.change(lambda chk: gr.update(visible=not chk), inputs=full_analysis, outputs=question_input)
         output = gr.Textbox(label="Réponse", lines=10, interactive=False)
         gr.Button("🔍 Analyser").click(
-            analyze_document,
+            # L'analyse juridique complète est un travail de fond : elle passe après les questions
+            as_async_handler(analyze_document_stream,
+                             lambda file, question, model, full, *rest: PRIORITY_BULK if full else PRIORITY_INTERACTIVE),
             inputs=[doc_input, question_input, model_selector, full_analysis, llm_provider, api_key_input],
             outputs=output
         )
 
+        with gr.Accordion("📚 Base de connaissances (tous les documents)", open=False):
+            with gr.Row():
+                kb_files = gr.File(label="Documents à ajouter", file_count="multiple")
+                with gr.Column():
+                    kb_documents = gr.Dropdown(label="Documents de la base", choices=[], interactive=True)
+                    kb_status = gr.Markdown()
+            with gr.Row():
+                add_button = gr.Button("➕ Ajouter à la base")
+                remove_button = gr.Button("🗑️ Retirer le document")
+            add_button.click(as_kb_handler(kb_add_files), inputs=kb_files, outputs=[kb_status, kb_documents])
+            remove_button.click(as_kb_handler(kb_remove), inputs=kb_documents, outputs=[kb_status, kb_documents])
+            kb_question = gr.Textbox(label="Question sur l'ensemble des documents", lines=2)
+            kb_output = gr.Textbox(label="Réponse", lines=10, interactive=False)
+            gr.Button("🔎 Interroger la base").click(
+                as_async_handler(kb_ask_stream),
+                inputs=[kb_question, model_selector, llm_provider, api_key_input],
+                outputs=kb_output
+            )
+    return kb_documents
+
 def build_nutrition_tab():
     with gr.Tab("🍎 Assistant Nutrition"):
         gr.Markdown("## Générateur de plan nutritionnel")
@@ -51,7 +138,7 @@ def build_nutrition_tab():
         diet_type = gr.Dropdown(label="Type de régime", choices=["Standard","Végétarien","Vegan","Cétogène"], value="Standard")
         nutrition_output = gr.Markdown()
         gr.Button("🚀 Générer").click(
-            generate_nutrition_plan,
+            as_async_handler(generate_nutrition_plan_stream),
             inputs=[file_input, protein_input, carbs_input, fats_input, kcal_input, diet_type, model_selector, meals_input],
             outputs=nutrition_output
         )
@@ -59,18 +146,24 @@ def build_nutrition_tab():
 def build_ui():
     with gr.Blocks(title="IvGhost RAG tool", theme=gr.themes.Soft()) as app:
         gr.Markdown("# RAG AI Tool")
-        status = gr.Markdown(value=check_connection(), elem_id="status")
+        # Sondes réseau et listes chargées après l'affichage (app.load) : démarrage non bloquant
+        status = gr.Markdown(value="⏳ Connexion à Ollama en cours...", elem_id="status")
         gr.Button("🔄 Vérifier connexion").click(lambda: check_connection(), outputs=status)
 
         global model_selector, llm_provider, api_key_input
-        model_selector = gr.Dropdown(label="Modèle LLM", choices=get_available_models(), interactive=True)
+        model_selector = gr.Dropdown(label="Modèle LLM", choices=[], interactive=True)
         llm_provider   = gr.Dropdown(label="Fournisseur IA", choices=["Ollama (local)","OpenAI","Anthropic","Perplexity"], value="Ollama (local)", interactive=True)
         api_key_input  = gr.Textbox(label="🔑 Clé API (si externe)", type="password", interactive=True)
 
-        gr.Button("🛑 Stop").click(lambda: None)  # à relier stop_operations si importé
+        stop_status = gr.Markdown()
+        gr.Button("🛑 Stop").click(stop_session, outputs=stop_status)
+        model_selector.change(preload_selected_model, inputs=[model_selector, llm_provider], outputs=stop_status)
 
         with gr.Tabs():
-            build_general_assistant_tab()
+            kb_documents = build_general_assistant_tab()
             build_nutrition_tab()
 
+        app.load(load_connection_state, outputs=[status, model_selector])
+        app.load(load_kb_documents, outputs=kb_documents)
+
     return app
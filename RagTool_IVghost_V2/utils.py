@@ -1,24 +1,24 @@
 import os
-from PyPDF2 import PdfReader
+import metrics
+from ocr import iter_pages_with_ocr
+from chunking import iter_token_chunks
 
 def extract_text_from_pdf(file_path: str) -> str:
-    """Extrait le texte d'un PDF page par page."""
+    """Extrait le texte d'un PDF page par page (pages extraites en parallèle, pages scannées via OCR)."""
     if not file_path.lower().endswith('.pdf'):
         raise ValueError("Fichier non supporté pour extract_text_from_pdf")
     
-    reader = PdfReader(file_path)
-    text = []
-    for page in reader.pages:
-        page_text = page.extract_text() or ""
-        text.append(page_text)
-    return "\n".join(text)
+    return "\n".join(iter_pages_with_ocr(file_path))
 
 
-def chunk_text(text: str, max_tokens: int = 800) -> list:
-    """Découpe un texte en 'chunks' d'environ max_tokens mots."""
-    words = text.split()
-    chunks = []
-    for i in range(0, len(words), max_tokens):
-        chunk = " ".join(words[i:i + max_tokens])
-        chunks.append(chunk)
+def chunk_text(text: str, max_tokens: int = 800, overlap: int = 0) -> list:
+    """Découpe un texte en chunks d'au plus max_tokens tokens, aux frontières de structure."""
+    with metrics.span("chunking", max_tokens=max_tokens, chars=len(text)) as attrs:
+        chunks = list(iter_token_chunks([text], max_tokens=max_tokens, overlap=overlap))
+        attrs["chunks"] = len(chunks)
     return chunks
+
+
+def iter_chunks(pages, max_tokens: int = 800, overlap: int = 0):
+    """Découpe un flux de pages en chunks d'au plus max_tokens tokens, au fil de l'eau."""
+    return iter_token_chunks(pages, max_tokens=max_tokens, overlap=overlap)